@@ -0,0 +1,214 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[1]:
+
+
+# Import necessary libraries
+import os
+import numpy as np
+import pandas as pd
+import customfunctions
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+
+# In[2]:
+
+
+# Timescales calculated for every station, in output order
+batch_timescales = ['year', 'month', 'decad', 'pentad']
+
+# Columns of the long-format tables
+batch_columns = ['station', 'timescale', 'statistic', 'year', 'month', 'period', 'depth', 'value']
+
+
+# In[3]:
+
+
+def long_format(table, station_name, timescale, statistic):
+    """Function that reshapes a table of period values (as returned by
+    customfunctions.period_mean) into long format with one row per period and
+    depth.
+
+        Parameters
+        ----------
+        table : dataframe
+            Dataframe indexed by year (and month and period) with a column for each depth.
+
+        station_name : str
+            Name of the station the values belong to.
+
+        timescale : str
+            Timescale of the periods ('year', 'month', 'decad' or 'pentad').
+
+        statistic : str
+            Name of the values (e.g. 'mean' or 'zscore').
+
+
+        Returns
+        ------
+        long_df : dataframe
+            Dataframe with station, timescale, statistic, year, month, period,
+            depth and value columns, ordered by period and then depth.
+    """
+
+    depths = list(table.columns)
+    index = table.index
+    names = list(index.names)
+
+    def level(position):
+        if position < len(names):
+            return np.repeat(index.get_level_values(position).astype(object), len(depths))
+        return np.full(len(index) * len(depths), None, dtype=object)
+
+    long_df = pd.DataFrame({'station': station_name,
+                            'timescale': timescale,
+                            'statistic': statistic,
+                            'year': np.repeat(index.get_level_values(0).to_numpy(dtype=int), len(depths)),
+                            'month': level(1),
+                            'period': level(2),
+                            'depth': np.tile(np.array(depths, dtype=object), len(index)),
+                            'value': table.to_numpy(dtype=float).ravel()},
+                           columns=batch_columns)
+
+    return long_df
+
+
+# In[4]:
+
+
+def station_suite(dataframe, station_name, years=None, timescales=batch_timescales):
+    """Function that runs the full analysis for one station: the annual,
+    monthly (month of year), decad and pentad means and their z-scores,
+    returned as one long-format table.  Z-scores are always standardized
+    against every year on record; "years" only selects the rows returned.
+
+        Parameters
+        ----------
+        dataframe : dataframe
+            Input dataframe containing raw soil moisture data.
+
+        station_name : str
+            Name of the station.
+
+        years : list, optional
+            Years to return.  Defaults to every year.
+
+        timescales : list, optional
+            Timescales to calculate.
+
+
+        Returns
+        ------
+        suite_df : dataframe
+            Long-format dataframe (see long_format) of the means and z-scores.
+    """
+
+    tables = []
+
+    for timescale in timescales:
+        sm_period_mean = customfunctions.period_mean(dataframe, timescale)
+        sm_period_zscore = customfunctions.zscore_period_means(sm_period_mean)
+
+        for statistic, table in (('mean', sm_period_mean), ('zscore', sm_period_zscore)):
+            if years is not None:
+                table = table[table.index.get_level_values(0).isin(years)]
+            tables.append(long_format(table, station_name, timescale, statistic))
+
+    return pd.concat(tables, ignore_index=True)
+
+
+def _run_station(dataframe, station_name, years, timescales):
+    # Worker process entry point; pandas objects are pickled to and from the pool
+    return station_suite(dataframe, station_name, years, timescales)
+
+
+# In[5]:
+
+
+def run_batch(dictionary, station_names=None, years=None, timescales=batch_timescales,
+              max_workers=None, progress=True):
+    """Function that runs station_suite for many stations in parallel on a pool
+    of processes (one station per task, so the run scales with the number of
+    cores) and combines the results into one long-format table.  Rows are
+    always ordered by station (in the order given), so the output does not
+    depend on which station finishes first.  A station that fails to load or
+    calculate is reported and skipped without stopping the other stations.
+
+        Parameters
+        ----------
+        dictionary : dictionary
+            Dictionary (or StationRegistry) of station dataframes.
+
+        station_names : list, optional
+            Stations to run.  Defaults to every station in the dictionary.
+
+        years : list, optional
+            Years to return.  Defaults to every year.
+
+        timescales : list, optional
+            Timescales to calculate.
+
+        max_workers : int, optional
+            Number of worker processes.  Defaults to the number of cores.
+
+        progress : bool or function, optional
+            Print a line as each station finishes, or a function called with
+            (stations done, total stations, station name).
+
+
+        Returns
+        ------
+        batch_df : dataframe
+            Long-format dataframe of every station's means and z-scores.
+
+        failures : dictionary
+            Dictionary of the exception raised for each station that failed.
+    """
+
+    if station_names is None:
+        station_names = list(dictionary)
+
+    if progress is True:
+        progress = lambda done, total, station_name: print(done, '/', total, ':', station_name, 'finished')
+
+    # Stations in a registry are downloaded together rather than one at a time
+    if hasattr(dictionary, 'load'):
+        dictionary.load(station_names)
+
+    results = {}
+    failures = {}
+
+    with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count()) as executor:
+        futures = {}
+
+        for station_name in station_names:
+            try:
+                station_dataframe = dictionary[station_name]
+            except Exception as error:
+                failures[station_name] = error
+                print(station_name, ': Download or import failed and was skipped -', error)
+                continue
+
+            future = executor.submit(_run_station, station_dataframe, station_name, years, list(timescales))
+            futures[future] = station_name
+
+        for done, future in enumerate(as_completed(futures), 1):
+            station_name = futures[future]
+
+            try:
+                results[station_name] = future.result()
+            except Exception as error:
+                failures[station_name] = error
+                print(station_name, ': Analysis failed and was skipped -', error)
+
+            if progress:
+                progress(done, len(futures), station_name)
+
+    tables = [results[station_name] for station_name in station_names if station_name in results]
+
+    if not tables:
+        return pd.DataFrame(columns=batch_columns), failures
+
+    return pd.concat(tables, ignore_index=True), failures
+
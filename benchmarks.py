@@ -0,0 +1,475 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[1]:
+
+
+# Import necessary libraries
+import io
+import os
+import json
+import time
+import platform
+import argparse
+import contextlib
+import subprocess
+import tracemalloc
+import numpy as np
+import pandas as pd
+import matplotlib.pyplot as plt
+import customfunctions
+import plotrender
+from scipy.signal import lfilter
+from imports import csv_to_df
+
+
+# In[2]:
+
+
+# Default location of the saved benchmark results
+default_results_dir = os.path.join(os.path.expanduser('~'), 'earth-analytics', 'data', 'soil-moisture-benchmarks')
+
+# Mean, seasonal amplitude (both in % soil moisture) and seasonal lag (days) of each depth;
+# deeper soil is wetter, varies less and lags behind the surface
+synthetic_depths = {'sm_5cm': (22.0, 8.0, 0),
+                    'sm_10cm': (24.0, 7.0, 5),
+                    'sm_20cm': (26.0, 5.5, 12),
+                    'sm_50cm': (28.0, 4.0, 25),
+                    'sm_100cm': (30.0, 2.5, 45)}
+
+# Functions that are benchmarked, with the arguments they are called with ("station", "year", 
+# "month" and "zscores" are replaced by the station dataframe, year, month and z-scores of each 
+# case, and "file" by an in-memory file)
+benchmark_functions = [('yearly_avg_sm', ('station',)),
+                       ('monthly_nan_analysis', ('station',)),
+                       ('yearly_mean_month', ('station', 'month')),
+                       ('monthly_mean', ('station', 'year')),
+                       ('monthly_mean_all_years', ('station',)),
+                       ('daily_avg', ('station', 'year')),
+                       ('daily_avg_all_years', ('station',)),
+                       ('decad_nan_analysis', ('station',)),
+                       ('decad_mean', ('station', 'year')),
+                       ('decad_zscore', ('station', 'year')),
+                       ('pentad_nan_analysis', ('station',)),
+                       ('pentad_mean', ('station', 'year')),
+                       ('pentad_zscore', ('station', 'year')),
+                       ('zscore_plot', ('zscores', 'Month', 'Benchmark', 'file')),
+                       ('monthly_mean_zscore', ('station', 'year'))]
+
+# Benchmark cases: (first year, last year, number of stations, missing value rate)
+default_cases = [(2011, 2020, 1, 0.02),
+                 (1997, 2020, 1, 0.02),
+                 (1997, 2020, 1, 0.25),
+                 (1997, 2020, 8, 0.02)]
+
+quick_cases = [(2016, 2020, 1, 0.02),
+               (2016, 2020, 2, 0.25)]
+
+# Plots checked by check_plot_reuse, with the function making the dataframe of each plot from a
+# station dataframe and a year
+plot_check_functions = {'yearly': lambda dataframe, year: customfunctions.yearly_avg_sm(dataframe),
+                        'monthly': lambda dataframe, year: customfunctions.monthly_mean(dataframe, year),
+                        'daily': lambda dataframe, year: customfunctions.daily_avg(dataframe, year),
+                        'zscore_year': lambda dataframe, year: customfunctions.period_zscore(dataframe, 'year'),
+                        'zscore_month': lambda dataframe, year: customfunctions.monthly_mean_zscore(dataframe, year)}
+
+
+# In[3]:
+
+
+def synthetic_csv(start_year=1997, end_year=2020, missing_rate=0.02, outages=6, outage_days=(5, 90),
+                  dropped_rate=0.01, start_date=None, seed=0):
+    """Function that generates the text of a realistic SCAN station csv file
+    (station, year, month, day, doy, ts_5cm, sm_2cm and sm_5cm to sm_100cm
+    columns) with a seasonal cycle at each depth, wetting events that soak in
+    and dry down, and configurable patterns of missing data.
+
+        Parameters
+        ----------
+        start_year : int, optional
+            First year of data.
+
+        end_year : int, optional
+            Last year of data.
+
+        missing_rate : float, optional
+            Fraction of single readings that are missing (NaN).
+
+        outages : int, optional
+            Number of sensor outages at each depth, when readings are NaN for a
+            run of days.
+
+        outage_days : tuple, optional
+            Shortest and longest outage in days.
+
+        dropped_rate : float, optional
+            Fraction of days with no row at all (station not reporting).
+
+        start_date : str, optional
+            Date the station was installed (e.g. '2003-06-15'); earlier days
+            have no rows.  Defaults to the start of "start_year".
+
+        seed : int, optional
+            Seed of the random number generator, so a case is generated identically
+            every time.
+
+
+        Returns
+        ------
+        csv_text : str
+            Text of the csv file.
+    """
+
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(start_date or str(start_year) + '-01-01', str(end_year) + '-12-31', freq='D')
+    doy = dates.dayofyear.to_numpy()
+
+    # Rain events add moisture that decays over about a week
+    rain = rng.exponential(6.0, len(dates)) * (rng.random(len(dates)) < 0.08)
+    wetting = lfilter([1.0], [1.0, -0.85], rain)
+
+    data = {'station': 9000 + seed, 'year': dates.year, 'month': dates.month, 'day': dates.day, 'doy': doy,
+            'ts_5cm': np.round(12 + 10 * np.sin(2 * np.pi * (doy - 110) / 365.25), 1),
+            'sm_2cm': np.nan}
+
+    for depth, (mean, amplitude, lag) in synthetic_depths.items():
+        seasonal = mean + amplitude * np.cos(2 * np.pi * (doy - 60 - lag) / 365.25)
+        soaked = np.roll(wetting, lag // 3) * amplitude / 8.0
+        values = np.clip(seasonal + soaked + rng.normal(0, 0.6, len(dates)), 2.0, 50.0)
+        values[rng.random(len(dates)) < missing_rate] = np.nan
+
+        for outage in range(outages):
+            first = rng.integers(0, len(dates))
+            values[first:first + rng.integers(outage_days[0], outage_days[1] + 1)] = np.nan
+
+        data[depth] = np.round(values, 2)
+
+    station_df = pd.DataFrame(data)
+    station_df = station_df[rng.random(len(station_df)) >= dropped_rate]
+
+    return station_df.to_csv(index=False)
+
+
+def synthetic_station(station_name='Synthetic #9000', **parameters):
+    """Function that generates a synthetic station dataframe with the same
+    columns and data types as one imported with url_to_df.  Any parameters of
+    synthetic_csv can be given.
+
+        Parameters
+        ----------
+        station_name : str, optional
+            Name of the synthetic station.
+
+
+        Returns
+        ------
+        output_dataframe : dataframe
+            Dataframe containing the synthetic station data.
+    """
+
+    return csv_to_df(io.StringIO(synthetic_csv(**parameters)), station_name)
+
+
+# In[4]:
+
+
+def time_function(function, station_dataframes, arguments, repeats=3):
+    """Function that times a function called once on every station dataframe
+    and measures the peak memory it allocates.  Cold runs call it on copies of
+    the station dataframes made just before each run, so the station index
+    (see stationindex.station_index) is built within the run, as it is the
+    first time a station is analysed.  Warm runs call it on the same station
+    dataframes after a first untimed call, so the index is reused.
+
+        Parameters
+        ----------
+        function : function
+            Function to benchmark.
+
+        station_dataframes : list
+            Station dataframes to call the function on.
+
+        arguments : function
+            Function returning the arguments of the call for a station dataframe.
+
+        repeats : int, optional
+            Number of timed cold and warm runs; the fastest and median are reported.
+
+
+        Returns
+        ------
+        result : dictionary
+            Fastest and median wall time in seconds and peak traced memory in bytes
+            of the cold runs, and the same for the warm runs (prefixed 'warm_').
+    """
+
+    result = {}
+
+    # Keep the missing data messages out of the report
+    with contextlib.redirect_stdout(io.StringIO()):
+        for prefix, cold in (('', True), ('warm_', False)):
+            if not cold:
+                for station_dataframe in station_dataframes:
+                    function(*arguments(station_dataframe))
+                plt.close('all')
+
+            times = []
+            for repeat in range(repeats):
+                run_dataframes = [station_dataframe.copy() for station_dataframe in station_dataframes] if cold \
+                    else station_dataframes
+                start = time.perf_counter()
+                for station_dataframe in run_dataframes:
+                    function(*arguments(station_dataframe))
+                times.append(time.perf_counter() - start)
+                plt.close('all')
+
+            # Memory is traced in a separate run, as tracing slows the calls down
+            run_dataframes = [station_dataframe.copy() for station_dataframe in station_dataframes] if cold \
+                else station_dataframes
+            tracemalloc.start()
+            for station_dataframe in run_dataframes:
+                function(*arguments(station_dataframe))
+            peak_bytes = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            plt.close('all')
+
+            result.update({prefix + 'seconds_min': min(times), prefix + 'seconds_median': float(np.median(times)),
+                           prefix + 'peak_bytes': peak_bytes})
+
+    return result
+
+
+def run_benchmarks(cases=default_cases, function_names=None, repeats=3, seed=0):
+    """Function that benchmarks the customfunctions analysis functions on
+    synthetic stations for every case of record length, station count and
+    missing data rate.
+
+        Parameters
+        ----------
+        cases : list, optional
+            List of (first year, last year, number of stations, missing value rate) tuples.
+
+        function_names : list, optional
+            Functions to benchmark.  Defaults to every function in benchmark_functions.
+
+        repeats : int, optional
+            Number of timed runs of each function and case.
+
+        seed : int, optional
+            Seed of the first synthetic station.
+
+
+        Returns
+        ------
+        results : dictionary
+            Dictionary with the 'environment' the benchmarks ran in and a list of
+            'results', one for each function and case.
+    """
+
+    plt.switch_backend('Agg')
+
+    results = []
+
+    for start_year, end_year, stations, missing_rate in cases:
+        station_dataframes = [synthetic_station('Synthetic #' + str(9000 + seed + number), start_year=start_year,
+                                                end_year=end_year, missing_rate=missing_rate, seed=seed + number)
+                              for number in range(stations)]
+        rows = sum(len(station_dataframe) for station_dataframe in station_dataframes)
+        year = (start_year + end_year) // 2
+        zscores = customfunctions.monthly_mean_zscore(station_dataframes[0], year)
+
+        for function_name, arguments in benchmark_functions:
+            if function_names is not None and function_name not in function_names:
+                continue
+
+            def call_arguments(station_dataframe, arguments=arguments):
+                values = {'station': station_dataframe, 'year': year, 'month': 'Jul', 'zscores': zscores}
+                return [io.BytesIO() if argument == 'file' else values.get(argument, argument)
+                        for argument in arguments]
+
+            measured = time_function(getattr(customfunctions, function_name), station_dataframes,
+                                     call_arguments, repeats)
+
+            results.append(dict({'function': function_name, 'case': _case_name(start_year, end_year, stations, missing_rate),
+                                 'years': end_year - start_year + 1, 'stations': stations,
+                                 'missing_rate': missing_rate, 'rows': rows}, **measured))
+
+    return {'environment': environment(), 'results': results}
+
+
+def _case_name(start_year, end_year, stations, missing_rate):
+    return '{}-{}_x{}_nan{:g}'.format(start_year, end_year, stations, missing_rate)
+
+
+def environment():
+    """Function that describes the code and software versions the benchmarks ran with."""
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+
+    return {'commit': commit, 'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+            'numpy': np.__version__, 'pandas': pd.__version__, 'machine': platform.machine(),
+            'processor': platform.processor(), 'cpus': os.cpu_count()}
+
+
+# In[5]:
+
+
+def save_results(results, path):
+    """Function that saves benchmark results to a json file."""
+
+    with open(path, 'w') as results_file:
+        json.dump(results, results_file, indent=1)
+
+
+def load_results(path):
+    """Function that loads benchmark results saved with save_results."""
+
+    with open(path) as results_file:
+        return json.load(results_file)
+
+
+def compare_results(baseline, current):
+    """Function that compares two sets of benchmark results (e.g. before and
+    after a change) function by function and case by case.
+
+        Parameters
+        ----------
+        baseline : dictionary
+            Benchmark results to compare against.
+
+        current : dictionary
+            New benchmark results.
+
+
+        Returns
+        ------
+        comparison : dataframe
+            Dataframe indexed by function and case showing the fastest cold and
+            warm times and peak memory of both runs and their ratio (above 1 is
+            slower or larger).  Warm values are NaN for results saved without them.
+    """
+
+    columns = ['function', 'case', 'seconds_min', 'peak_bytes', 'warm_seconds_min', 'warm_peak_bytes']
+    baseline_df = pd.DataFrame(baseline['results']).reindex(columns=columns).set_index(['function', 'case'])
+    current_df = pd.DataFrame(current['results']).reindex(columns=columns).set_index(['function', 'case'])
+
+    comparison = baseline_df.join(current_df, how='inner', lsuffix='_baseline', rsuffix='_current')
+    comparison['time_ratio'] = comparison['seconds_min_current'] / comparison['seconds_min_baseline']
+    comparison['memory_ratio'] = comparison['peak_bytes_current'] / comparison['peak_bytes_baseline']
+    comparison['warm_time_ratio'] = comparison['warm_seconds_min_current'] / comparison['warm_seconds_min_baseline']
+    comparison['warm_memory_ratio'] = comparison['warm_peak_bytes_current'] / comparison['warm_peak_bytes_baseline']
+
+    return comparison
+
+
+# In[6]:
+
+
+def check_plot_reuse(seed=0):
+    """Function that checks that plots rendered by plotrender.render on its
+    reused figures are pixel for pixel the same as plots rendered on new
+    figures.  Each plot type is drawn for a synthetic station and then for a
+    second station with a different record length and more missing data (and
+    again with no data at all), and the second plot is compared with the same
+    plot rendered after closing the reused figures.
+
+        Parameters
+        ----------
+        seed : int, optional
+            Seed of the first synthetic station.
+
+
+        Returns
+        ------
+        check_df : dataframe
+            Dataframe indexed by plot type and case showing whether the reused and
+            new figures gave the same image.
+    """
+
+    plt.switch_backend('Agg')
+
+    first_station = synthetic_station('Synthetic #' + str(9000 + seed), start_year=2011, end_year=2020,
+                                      missing_rate=0.02, seed=seed)
+    second_station = synthetic_station('Synthetic #' + str(9001 + seed), start_year=2016, end_year=2020,
+                                       missing_rate=0.25, seed=seed + 1)
+
+    checks = []
+
+    # Keep the missing data messages out of the report
+    with contextlib.redirect_stdout(io.StringIO()):
+        for plot_type, plot_function in plot_check_functions.items():
+            first = plot_function(first_station, 2018)
+            second = plot_function(second_station, 2018)
+
+            no_data = second.assign(**{depth: np.nan for depth in customfunctions.depth_plot_styles})
+
+            for case, dataframe in (('data', second), ('no data', no_data)):
+                plotrender.close_templates()
+                plotrender.render(plot_type, first, 'First station', io.BytesIO())
+                reused = io.BytesIO()
+                plotrender.render(plot_type, dataframe, 'Second station', reused)
+
+                plotrender.close_templates()
+                fresh = io.BytesIO()
+                plotrender.render(plot_type, dataframe, 'Second station', fresh)
+
+                checks.append({'plot_type': plot_type, 'case': case,
+                               'matches': reused.getvalue() == fresh.getvalue()})
+
+        plotrender.close_templates()
+
+    return pd.DataFrame(checks).set_index(['plot_type', 'case'])
+
+
+# In[7]:
+
+
+def main(arguments=None):
+    """Command line entry point, e.g.
+    python benchmarks.py --compare ~/earth-analytics/data/soil-moisture-benchmarks/old.json"""
+
+    parser = argparse.ArgumentParser(description='Benchmark the soil moisture functions on synthetic stations.')
+    parser.add_argument('--quick', action='store_true', help='run short records only')
+    parser.add_argument('--functions', nargs='+', help='functions to benchmark (default: every function)')
+    parser.add_argument('--repeats', type=int, default=3, help='number of timed runs')
+    parser.add_argument('--output', help='json file to save the results to '
+                                         '(default: a file named after the commit and time)')
+    parser.add_argument('--compare', help='json file of earlier results to compare against')
+    parser.add_argument('--check-plots', action='store_true',
+                        help='only check that reused plot figures give the same images as new ones')
+    arguments = parser.parse_args(arguments)
+
+    if arguments.check_plots:
+        print(check_plot_reuse())
+        return
+
+    results = run_benchmarks(quick_cases if arguments.quick else default_cases, arguments.functions,
+                             arguments.repeats)
+
+    output = arguments.output
+    if output is None:
+        os.makedirs(default_results_dir, exist_ok=True)
+        name = (results['environment']['commit'] or 'results') + '_' + results['environment']['time'].replace(':', '')
+        output = os.path.join(default_results_dir, name + '.json')
+
+    save_results(results, output)
+
+    with pd.option_context('display.max_rows', None, 'display.max_columns', None, 'display.width', 200):
+        print(pd.DataFrame(results['results']).set_index(['function', 'case'])[
+            ['rows', 'seconds_min', 'seconds_median', 'peak_bytes', 'warm_seconds_min', 'warm_seconds_median',
+             'warm_peak_bytes']])
+
+        if arguments.compare:
+            print(compare_results(load_results(arguments.compare), results)[
+                ['time_ratio', 'memory_ratio', 'warm_time_ratio', 'warm_memory_ratio']])
+
+    print('Results saved to', output)
+
+
+if __name__ == '__main__':
+    main()
+
@@ -0,0 +1,284 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[1]:
+
+
+# Import necessary libraries
+import json
+import numpy as np
+import pandas as pd
+import customfunctions
+
+
+# In[2]:
+
+
+class Climatology:
+    """Running climatology of period mean soil moisture for one station.  For
+    every period (e.g. ('Jul',) for a month or ('Jul', 'decad1') for a decad)
+    and depth it keeps the number of years, their mean and their sum of squared
+    differences from the mean (M2).  Adding a newly completed period updates
+    these in constant time with Welford's method, and climatologies built from
+    different stations or chunks of years are combined with Chan's method.
+    Standard deviations are population standard deviations (ddof=0), matching
+    the z-scores from customfunctions.
+
+        Parameters
+        ----------
+        timescale : str
+            Timescale of the periods ('year', 'month', 'decad' or 'pentad').
+
+        depths : list, optional
+            Names of the depth columns.  Defaults to customfunctions.depth_list_all.
+
+    """
+
+    def __init__(self, timescale, depths=customfunctions.depth_list_all):
+        self.timescale = timescale
+        self.depths = list(depths)
+        self.stats = {}
+
+    @classmethod
+    def from_dataframe(cls, dataframe, timescale, years=None):
+        """Function that builds a climatology from every year of a station dataframe.
+
+            Parameters
+            ----------
+            dataframe : dataframe
+                Input dataframe containing raw soil moisture data.
+
+            timescale : str
+                Timescale of the periods ('year', 'month', 'decad' or 'pentad').
+
+            years : list, optional
+                Years to include.  Defaults to every year on record.
+
+
+            Returns
+            ------
+            climatology : Climatology
+                Climatology of the station's period means.
+        """
+
+        return cls.from_period_means(customfunctions.period_mean(dataframe, timescale, years=years), timescale)
+
+    @classmethod
+    def from_period_means(cls, sm_period_mean, timescale):
+        """Function that builds a climatology from a table of period means, as
+        returned by customfunctions.period_mean, in one grouped calculation.
+
+            Parameters
+            ----------
+            sm_period_mean : dataframe
+                Dataframe of period means indexed by year (and month and period).
+
+            timescale : str
+                Timescale of the periods ('year', 'month', 'decad' or 'pentad').
+
+
+            Returns
+            ------
+            climatology : Climatology
+                Climatology of the period means.
+        """
+
+        climatology = cls(timescale, sm_period_mean.columns)
+        period_columns = list(sm_period_mean.index.names[1:])
+
+        if period_columns:
+            grouped = sm_period_mean.groupby(level=period_columns, sort=False)
+        else:
+            grouped = sm_period_mean.groupby(np.zeros(len(sm_period_mean), dtype=int))
+
+        count = grouped.count()
+        mean = grouped.mean().fillna(0)
+        m2 = grouped.var(ddof=0).fillna(0) * count
+
+        for period in count.index:
+            key = (period if isinstance(period, tuple) else (period,)) if period_columns else ()
+            climatology.stats[key] = np.array([count.loc[period].to_numpy(dtype=float),
+                                               mean.loc[period].to_numpy(dtype=float),
+                                               m2.loc[period].to_numpy(dtype=float)])
+
+        return climatology
+
+    def update(self, period, values):
+        """Function that adds one completed period mean for each depth to the
+        climatology and returns its anomaly against the updated climatology.
+
+            Parameters
+            ----------
+            period : tuple
+                Period the values belong to, e.g. ('Jul', 'decad1').  Use () for
+                the 'year' timescale.
+
+            values : list or Series
+                Period mean soil moisture for each depth (NaN values are ignored).
+
+
+            Returns
+            ------
+            anomaly : Series
+                Z-score of the values for each depth.
+        """
+
+        values = self._values(values)
+        count, mean, m2 = self.stats.get(tuple(period), np.zeros((3, len(self.depths))))
+
+        valid = ~np.isnan(values)
+        new_count = count + valid
+        delta = np.where(valid, values - mean, 0.0)
+        new_mean = mean + np.divide(delta, new_count, out=np.zeros_like(delta), where=new_count > 0)
+        new_m2 = m2 + delta * np.where(valid, values - new_mean, 0.0)
+
+        self.stats[tuple(period)] = np.array([new_count, new_mean, new_m2])
+
+        return self.zscore(period, values)
+
+    def add_period(self, period_dataframe, year, month=None, period_label=None):
+        """Function that calculates the mean of a newly completed period from its
+        daily rows (with the coverage rules of customfunctions.period_mean), adds
+        it to the climatology and returns its anomaly.
+
+            Parameters
+            ----------
+            period_dataframe : dataframe
+                Raw soil moisture rows of the completed period.
+
+            year : int
+                Year of the period.
+
+            month : str, optional
+                3-letter month name of the period (not needed for the 'year' timescale).
+
+            period_label : str, optional
+                Decad or pentad label of the period (e.g. 'decad1').
+
+
+            Returns
+            ------
+            anomaly : Series
+                Z-score of the period mean for each depth.
+        """
+
+        months = None if month is None else [month]
+        sm_period_mean = customfunctions.period_mean(period_dataframe, self.timescale, years=[year], months=months)
+
+        if period_label is not None:
+            sm_period_mean = sm_period_mean.xs(period_label, level=2, drop_level=False)
+
+        period = tuple(key for key in (month, period_label) if key is not None)
+
+        return self.update(period, sm_period_mean.iloc[0][self.depths])
+
+    def zscore(self, period, values):
+        """Function that returns the anomaly of period mean values for each depth
+        against the climatology, without changing it.
+
+            Parameters
+            ----------
+            period : tuple
+                Period the values belong to.
+
+            values : list, array or Series
+                Period mean soil moisture for each depth, or an array with one row
+                of depth values per year.
+
+
+            Returns
+            ------
+            anomaly : Series or array
+                Z-score of the values for each depth.
+        """
+
+        values = self._values(values)
+        count, mean, m2 = self.stats.get(tuple(period), np.full((3, len(self.depths)), np.nan))
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            std = np.sqrt(m2 / count)
+            anomaly = (values - mean) / std
+
+        if anomaly.ndim == 1:
+            return pd.Series(anomaly, index=self.depths)
+
+        return anomaly
+
+    def merge(self, other):
+        """Function that combines this climatology with another one covering
+        different years (or stations) and returns the combined climatology.
+
+            Parameters
+            ----------
+            other : Climatology
+                Climatology to combine with.
+
+
+            Returns
+            ------
+            climatology : Climatology
+                Combined climatology; neither input is changed.
+        """
+
+        if other.timescale != self.timescale or other.depths != self.depths:
+            raise ValueError('Only climatologies with the same timescale and depths can be merged')
+
+        climatology = Climatology(self.timescale, self.depths)
+        climatology.stats = {period: stats.copy() for period, stats in self.stats.items()}
+
+        for period, (count_b, mean_b, m2_b) in other.stats.items():
+            if period not in climatology.stats:
+                climatology.stats[period] = np.array([count_b, mean_b, m2_b])
+                continue
+
+            count_a, mean_a, m2_a = climatology.stats[period]
+            count = count_a + count_b
+            delta = mean_b - mean_a
+
+            with np.errstate(divide='ignore', invalid='ignore'):
+                mean = np.where(count > 0, mean_a + delta * count_b / count, 0.0)
+                m2 = np.where(count > 0, m2_a + m2_b + delta ** 2 * count_a * count_b / count, 0.0)
+
+            climatology.stats[period] = np.array([count, mean, m2])
+
+        return climatology
+
+    def to_frame(self):
+        """Function that returns the count, mean and standard deviation of every
+        period and depth as a dataframe indexed by period."""
+
+        rows = {}
+        for period, (count, mean, m2) in self.stats.items():
+            with np.errstate(divide='ignore', invalid='ignore'):
+                std = np.sqrt(m2 / count)
+            rows[period] = np.concatenate([count, np.where(count > 0, mean, np.nan), std])
+
+        columns = pd.MultiIndex.from_product([['count', 'mean', 'std'], self.depths])
+
+        return pd.DataFrame.from_dict(rows, orient='index', columns=columns)
+
+    def save(self, path):
+        """Function that saves the climatology to a json file."""
+
+        with open(path, 'w') as climatology_file:
+            json.dump({'timescale': self.timescale, 'depths': self.depths,
+                       'stats': [[list(period), stats.tolist()] for period, stats in self.stats.items()]},
+                      climatology_file)
+
+    @classmethod
+    def load(cls, path):
+        """Function that loads a climatology saved with save."""
+
+        with open(path) as climatology_file:
+            saved = json.load(climatology_file)
+
+        climatology = cls(saved['timescale'], saved['depths'])
+        climatology.stats = {tuple(period): np.array(stats) for period, stats in saved['stats']}
+
+        return climatology
+
+    def _values(self, values):
+        if isinstance(values, pd.Series):
+            values = values.reindex(self.depths)
+
+        return np.asarray(values, dtype=float)
@@ -0,0 +1,257 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[1]:
+
+
+# Import necessary libraries
+import numpy as np
+import pandas as pd
+import customfunctions
+import rolling
+from instrumentation import instrumented
+
+
+# In[2]:
+
+
+# Minimum number of days two series must both have data on for their correlation to be calculated
+default_min_periods = 30
+
+# Largest lag (in days) calculated directly with one matrix product per lag; longer
+# lag ranges use FFTs (see lagged_correlation)
+direct_max_lag = 64
+
+
+# In[3]:
+
+
+@instrumented
+def station_cube(dictionary, station_names=None, depths=customfunctions.depth_list_all):
+    """Function that aligns the daily soil moisture of many stations on one
+    common calendar (see rolling.daily_matrix) as a dense station x day x depth
+    array, with NaN where a station has no data.
+
+        Parameters
+        ----------
+        dictionary : dictionary
+            Dictionary of station dataframes (e.g. imports.soil_moisture_dict).
+
+        station_names : list, optional
+            Stations to include.  Defaults to every station in the dictionary.
+
+        depths : list, optional
+            Depth columns to include.  Defaults to customfunctions.depth_list_all.
+
+
+        Returns
+        ------
+        cube : array
+            Array of soil moisture with shape (station, day, depth).
+
+        dates : DatetimeIndex
+            Date of each day of the array.
+
+        station_names : list
+            Name of each station of the array.
+    """
+
+    if station_names is None:
+        station_names = list(dictionary)
+
+    daily_df = rolling.daily_matrix(dictionary, station_names, depths)
+    matrix = daily_df.to_numpy()
+
+    cube = matrix.reshape(len(matrix), len(station_names), len(depths)).transpose(1, 0, 2)
+
+    return cube, daily_df.index, list(station_names)
+
+
+def _series(daily_df):
+    # Values centred on each column's mean, with NaN set to 0, and where the values are valid
+    values = daily_df.to_numpy(dtype='float64')
+    valid = ~np.isnan(values)
+
+    centre = np.zeros(values.shape[1])
+    has_data = valid.any(axis=0)
+    centre[has_data] = np.nanmean(values[:, has_data], axis=0)
+
+    return np.where(valid, values - centre, 0.0), valid.astype('float64')
+
+
+def correlation_from_sums(count, sum_a, sum_b, squares_a, squares_b, products, min_periods):
+    """Function that returns the Pearson correlation of pairs of series from
+    their sums over the days on which both have data: the number of days, the
+    sums of each series and of its squares, and the sum of their products.
+    Correlations from fewer than "min_periods" days are set as NaN."""
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        covariance = products - sum_a * sum_b / count
+        variance_a = np.maximum(squares_a - sum_a ** 2 / count, 0)
+        variance_b = np.maximum(squares_b - sum_b ** 2 / count, 0)
+        correlation = covariance / np.sqrt(variance_a * variance_b)
+
+    return np.where(np.round(count) >= min_periods, np.clip(correlation, -1, 1), np.nan)
+
+
+# In[4]:
+
+
+@instrumented
+def correlation_matrix(daily_df, min_periods=default_min_periods):
+    """Function that calculates the correlation between every pair of columns
+    (e.g. every station and depth of rolling.daily_matrix, or their anomalies
+    from rolling.rolling_anomaly) over the days on which both have data.  All
+    pairs are calculated together with matrix products rather than pair by pair.
+
+        Parameters
+        ----------
+        daily_df : dataframe
+            Dataframe of soil moisture on a continuous daily calendar.
+
+        min_periods : int, optional
+            Minimum number of days with data in both columns.  Defaults to
+            "default_min_periods".
+
+
+        Returns
+        ------
+        correlation_df : dataframe
+            Dataframe indexed by column with a column for each column of "daily_df"
+            showing their correlation.
+
+    """
+
+    values, valid = _series(daily_df)
+
+    count = valid.T @ valid
+    sums = values.T @ valid
+    squares = (values ** 2).T @ valid
+
+    correlation = correlation_from_sums(count, sums, sums.T, squares, squares.T, values.T @ values, min_periods)
+
+    return pd.DataFrame(correlation, index=daily_df.columns, columns=daily_df.columns)
+
+
+def _direct_sums(values, valid, lag):
+    # Sums over the days t on which series a has data at t and series b at t + lag
+    length = len(values) - lag
+    values_a, valid_a, values_b, valid_b = values[:length], valid[:length], values[lag:], valid[lag:]
+
+    return (valid_a.T @ valid_b, values_a.T @ valid_b, valid_a.T @ values_b,
+            (values_a ** 2).T @ valid_b, valid_a.T @ values_b ** 2, values_a.T @ values_b)
+
+
+def _fft_sums(values, valid, max_lag):
+    # The same sums for every lag from 0 to max_lag, from cross-correlations calculated with FFTs
+    size = 1 << int(np.ceil(np.log2(len(values) + max_lag)))
+
+    spectra_values = np.fft.rfft(values, size, axis=0).T
+    spectra_valid = np.fft.rfft(valid, size, axis=0).T
+    spectra_squares = np.fft.rfft(values ** 2, size, axis=0).T
+
+    sums = np.zeros((6, max_lag + 1, values.shape[1], values.shape[1]))
+
+    # One series a at a time against every series b, so memory stays linear in the number of series
+    for column in range(values.shape[1]):
+        pairs = [(spectra_valid, spectra_valid), (spectra_values, spectra_valid), (spectra_valid, spectra_values),
+                 (spectra_squares, spectra_valid), (spectra_valid, spectra_squares), (spectra_values, spectra_values)]
+
+        for number, (spectra_a, spectra_b) in enumerate(pairs):
+            cross = np.fft.irfft(np.conj(spectra_a[column]) * spectra_b, size, axis=1)
+            sums[number, :, column, :] = cross[:, :max_lag + 1].T
+
+    return sums
+
+
+@instrumented
+def lagged_correlation(daily_df, max_lag, min_periods=default_min_periods, method='auto'):
+    """Function that calculates the correlation between every pair of columns of
+    a daily dataframe (see correlation_matrix) with the second column shifted by
+    every lag from -"max_lag" to "max_lag" days.  The correlation at lag k of
+    columns a and b is the correlation of a on day t with b on day t + k, so a
+    positive lag means b follows a.  Short lag ranges are calculated with one
+    matrix product per lag; long lag ranges with FFTs, whose cost barely grows
+    with the number of lags.
+
+        Parameters
+        ----------
+        daily_df : dataframe
+            Dataframe of soil moisture on a continuous daily calendar.
+
+        max_lag : int
+            Largest lag in days.
+
+        min_periods : int, optional
+            Minimum number of days with data in both columns.  Defaults to
+            "default_min_periods".
+
+        method : str, optional
+            'direct', 'fft' or 'auto' (FFTs when "max_lag" is more than
+            "direct_max_lag").
+
+
+        Returns
+        ------
+        lagged_df : dataframe
+            Dataframe indexed by lag with a column for each pair of columns of
+            "daily_df" (first column, then second column) showing their correlation.
+
+    """
+
+    values, valid = _series(daily_df)
+    max_lag = min(max_lag, max(len(values) - 1, 0))
+
+    if method == 'auto':
+        method = 'direct' if max_lag <= direct_max_lag else 'fft'
+
+    if method == 'fft':
+        sums = _fft_sums(values, valid, max_lag)
+    else:
+        sums = np.array([_direct_sums(values, valid, lag) for lag in range(max_lag + 1)]).transpose(1, 0, 2, 3)
+
+    count, sum_a, sum_b, squares_a, squares_b, products = sums
+    positive = correlation_from_sums(count, sum_a, sum_b, squares_a, squares_b, products, min_periods)
+
+    # The correlation of a with b at lag -k is the correlation of b with a at lag k
+    negative = positive[:0:-1].transpose(0, 2, 1)
+    correlation = np.concatenate([negative, positive])
+
+    pairs = pd.MultiIndex.from_tuples([(*_key(first), *_key(second)) for first in daily_df.columns
+                                       for second in daily_df.columns])
+    if isinstance(daily_df.columns, pd.MultiIndex):
+        pairs.names = [name + '_a' for name in daily_df.columns.names] + [name + '_b' for name in daily_df.columns.names]
+
+    return pd.DataFrame(correlation.reshape(len(correlation), -1),
+                        index=pd.Index(np.arange(-max_lag, max_lag + 1), name='lag'), columns=pairs)
+
+
+def _key(column):
+    return column if isinstance(column, tuple) else (column,)
+
+
+def strongest_lag(lagged_df):
+    """Function that returns the lag with the strongest (largest absolute)
+    correlation for each pair of columns of lagged_correlation, and that correlation.
+
+        Parameters
+        ----------
+        lagged_df : dataframe
+            Dataframe of lagged correlations (see lagged_correlation).
+
+
+        Returns
+        ------
+        strongest_df : dataframe
+            Dataframe indexed by pair showing the lag and correlation.
+    """
+
+    values = lagged_df.to_numpy()
+    has_value = ~np.isnan(values).all(axis=0)
+
+    position = np.zeros(values.shape[1], dtype='int64')
+    position[has_value] = np.nanargmax(np.abs(values[:, has_value]), axis=0)
+
+    return pd.DataFrame({'lag': np.where(has_value, lagged_df.index.to_numpy()[position], np.nan),
+                         'correlation': np.where(has_value, values[position, np.arange(values.shape[1])], np.nan)},
+                        index=lagged_df.columns)
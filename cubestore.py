@@ -0,0 +1,229 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[1]:
+
+
+# Import necessary libraries
+import os
+import json
+import shutil
+import numpy as np
+import pandas as pd
+import customfunctions
+import rolling
+from instrumentation import instrumented
+
+
+# In[2]:
+
+
+# Default location of the station x day x depth cube
+default_cube_dir = os.path.join(os.path.expanduser('~'), 'earth-analytics', 'data', 'soil-moisture-cube')
+
+# Version of the cube layout; increase this whenever build_cube changes so old cubes are not opened
+cube_version = 1
+
+
+# In[3]:
+
+
+@instrumented
+def build_cube(dictionary, path=default_cube_dir, station_names=None, depths=customfunctions.depth_list_all):
+    """Function that saves the daily soil moisture of many stations as one dense
+    float32 array on disk, with shape (station, day, depth), on a calendar from
+    the first to the last day of any station and NaN where a station has no
+    data.  Stations are written one at a time, so only one station needs to be
+    in memory.  The array is saved as a NumPy .npy file next to a meta.json file
+    holding its stations, first day and depths; any existing cube is replaced.
+
+        Parameters
+        ----------
+        dictionary : dictionary
+            Dictionary of station dataframes (e.g. imports.soil_moisture_dict).
+
+        path : str, optional
+            Directory to save the cube to.  Defaults to "default_cube_dir".
+
+        station_names : list, optional
+            Stations to include.  Defaults to every station in the dictionary.
+
+        depths : list, optional
+            Depth columns to include.  Defaults to customfunctions.depth_list_all.
+
+
+        Returns
+        ------
+        store : CubeStore
+            The saved cube, opened for reading.
+    """
+
+    if station_names is None:
+        station_names = list(dictionary)
+
+    # The calendar covers every station, found before any data is written
+    first_day, last_day = None, None
+    for station_name in station_names:
+        days, valid = rolling.day_numbers(dictionary[station_name])
+        days = days[valid]
+        if len(days):
+            first_day = days.min() if first_day is None else min(first_day, days.min())
+            last_day = days.max() if last_day is None else max(last_day, days.max())
+
+    if first_day is None:
+        first_day, last_day = 0, -1
+
+    temp_path = path + '.part-' + str(os.getpid())
+    shutil.rmtree(temp_path, ignore_errors=True)
+    os.makedirs(temp_path)
+
+    cube = np.lib.format.open_memmap(os.path.join(temp_path, 'cube.npy'), mode='w+', dtype='float32',
+                                     shape=(len(station_names), int(last_day - first_day + 1), len(depths)))
+
+    for number, station_name in enumerate(station_names):
+        station_dataframe = dictionary[station_name]
+        days, valid = rolling.day_numbers(station_dataframe)
+
+        cube[number] = np.nan
+        cube[number, days[valid] - first_day] = np.column_stack(
+            [station_dataframe[depth].to_numpy(dtype='float32')[valid] for depth in depths])
+
+    cube.flush()
+    del cube
+
+    meta = {'version': cube_version, 'stations': list(station_names), 'depths': list(depths),
+            'first_day': str(np.datetime64(int(first_day), 'D')), 'days': int(last_day - first_day + 1)}
+
+    with open(os.path.join(temp_path, 'meta.json'), 'w') as meta_file:
+        json.dump(meta, meta_file, indent=1)
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(temp_path, path)
+
+    return CubeStore(path)
+
+
+# In[4]:
+
+
+class CubeStore:
+    """Read-only access to a cube saved with build_cube.  The array is memory
+    mapped, so opening it reads nothing but its coordinates, selections are
+    views of the file rather than copies, and every process that opens the same
+    cube shares the same pages of memory.  A CubeStore can be sent to worker
+    processes (only its path is pickled; each worker maps the file again).
+
+        Parameters
+        ----------
+        path : str, optional
+            Directory the cube was saved to.  Defaults to "default_cube_dir".
+
+    """
+
+    def __init__(self, path=default_cube_dir):
+        self.path = path
+
+        with open(os.path.join(path, 'meta.json')) as meta_file:
+            meta = json.load(meta_file)
+
+        if meta['version'] != cube_version:
+            raise ValueError('The cube in ' + path + ' was built by a different version; run build_cube again')
+
+        self.stations = meta['stations']
+        self.depths = meta['depths']
+        self.dates = pd.date_range(meta['first_day'], periods=meta['days'], freq='D', name='date')
+        self.cube = np.load(os.path.join(path, 'cube.npy'), mmap_mode='r')
+
+        self._station_positions = {station_name: number for number, station_name in enumerate(self.stations)}
+
+    def __getstate__(self):
+        return {'path': self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'])
+
+    def __repr__(self):
+        return 'CubeStore({!r}: {} stations x {} days x {} depths)'.format(self.path, *self.cube.shape)
+
+    def station_positions(self, station_names):
+        """Function that returns the position of each station in the cube."""
+
+        return [self._station_positions[station_name] for station_name in station_names]
+
+    def day_slice(self, start=None, stop=None):
+        """Function that returns the slice of days from "start" to "stop"
+        (inclusive dates, e.g. '2010-01-01'); either can be left out."""
+
+        first = 0 if start is None else self.dates.searchsorted(pd.Timestamp(start), side='left')
+        last = len(self.dates) if stop is None else self.dates.searchsorted(pd.Timestamp(stop), side='right')
+
+        return slice(int(first), int(last))
+
+    def select(self, station_names=None, start=None, stop=None, depths=None):
+        """Function that returns part of the cube, for some stations, days and
+        depths.  The result is a view of the file (no data is copied or read
+        until it is used) unless the stations or depths asked for are not next
+        to each other in the cube, in which case only the part asked for is copied.
+
+            Parameters
+            ----------
+            station_names : list, optional
+                Stations to select.  Defaults to every station.
+
+            start, stop : str or date, optional
+                First and last day to select.  Default to the whole calendar.
+
+            depths : list, optional
+                Depths to select.  Defaults to every depth.
+
+
+            Returns
+            ------
+            values : array
+                Array with shape (station, day, depth).
+
+            dates : DatetimeIndex
+                Date of each selected day.
+        """
+
+        days = self.day_slice(start, stop)
+        values = self.cube[:, days]
+
+        if station_names is not None:
+            values = values[_positions(self.station_positions(station_names))]
+
+        if depths is not None:
+            values = values[:, :, _positions([self.depths.index(depth) for depth in depths])]
+
+        return values, self.dates[days]
+
+    def station_frame(self, station_name, start=None, stop=None):
+        """Function that returns one station's daily soil moisture as a dataframe
+        indexed by date with a column for each depth (see rolling.daily_series)."""
+
+        values, dates = self.select([station_name], start, stop)
+
+        return pd.DataFrame(values[0], index=dates, columns=self.depths)
+
+    def daily_matrix(self, station_names=None, start=None, stop=None):
+        """Function that returns the daily soil moisture of several stations as a
+        dataframe indexed by date with a (station, depth) column for each station
+        and depth, as rolling.daily_matrix does, for use with rolling.py and
+        crossstation.py."""
+
+        if station_names is None:
+            station_names = self.stations
+
+        values, dates = self.select(station_names, start, stop)
+        matrix = np.asarray(values).transpose(1, 0, 2).reshape(len(dates), -1)
+        columns = pd.MultiIndex.from_product([list(station_names), self.depths], names=['station', 'depth'])
+
+        return pd.DataFrame(matrix, index=dates, columns=columns)
+
+
+def _positions(positions):
+    # A run of neighbouring positions is selected with a slice, which keeps a view of the file
+    if len(positions) and list(positions) == list(range(positions[0], positions[0] + len(positions))):
+        return slice(positions[0], positions[0] + len(positions))
+
+    return positions
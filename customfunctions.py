@@ -14,95 +14,202 @@ import earthpy.plot as ep
 from scipy import stats
 from scipy.stats import zscore
 import numpy as np
+from instrumentation import instrumented
+from stationindex import station_index
 
 
 # In[2]:
 
 
-# This list should be updated every year; these are the years the code will examine!
-years_list_all = (1997, 1998, 1999, 2000, 2001, 2002, 2003, 2004, 2005, 
-                  2006, 2007, 2008, 2009, 2010, 2011, 2012, 2013, 
-                  2014, 2015, 2016, 2017, 2018, 2019, 2020)
-
 month_list_all = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
 
+decad_list_all = ('decad0', 'decad1', 'decad2')
+
+pentad_list_all = ('pentad0', 'pentad1', 'pentad2', 'pentad3', 'pentad4', 'pentad5')
+
+depth_list_all = ('sm_5cm', 'sm_10cm', 'sm_20cm', 'sm_50cm', 'sm_100cm')
+
+# Grouping columns, minimum number of days (exclusive) and maximum number of NaN values 
+# (exclusive) needed for a mean to be calculated on each timescale
+timescale_rules = {'year': (['year'], 275, 90),
+                   'month': (['year', 'month'], 15, 16),
+                   'decad': (['year', 'month', 'decad'], 5, 6),
+                   'pentad': (['year', 'month', 'pentad'], 2, 3)}
+
+# Bits of the quality flags given to each period and depth (see quality_table); a mean
+# is only calculated for a period and depth with no flag set
+quality_flags = {'no_data': 1, 'few_days': 2, 'too_many_nan': 4}
+
 
 # In[3]:
 
 
-def plot_yearly_avg_sm(dataframe, figure_title):
-    """Function that takes an input station name and plots the yearly 
-    average soil moisture values for each depth (5cm, 10cm, 20cm, 50cm, 100cm).  
-    Please note that for this function to run, a dataframe of yearly average soil 
-    moisture for each depth must exist under the name "yearly_avg_sm"
+# Line color and legend label of each depth in the soil moisture plots
+depth_plot_styles = {'sm_5cm': ('blue', '5cm'),
+                     'sm_10cm': ('red', '10cm'),
+                     'sm_20cm': ('green', '20cm'),
+                     'sm_50cm': ('purple', '50cm'),
+                     'sm_100cm': ('orange', '100cm')}
+
+
+def _fit_limits(ax, x_positions):
+    # Limits are fitted to the current data on every draw, so a reused figure never keeps
+    # those of an earlier plot; with no values to fit, the x values are shown with a y range
+    # of -1 to 1 (or both axes from 0 to 1 if there are no x values either)
+    ax.set_autoscale_on(True)
+    ax.relim()
+
+    if not np.isfinite(ax.dataLim.get_points()).all():
+        x_positions = np.asarray(x_positions, dtype=float)
+        x_positions = x_positions[np.isfinite(x_positions)]
+        ax.update_datalim(np.column_stack([np.repeat(x_positions, 2),
+                                           np.tile([-1.0, 1.0], len(x_positions))]))
+
+    if np.isfinite(ax.dataLim.get_points()).all():
+        ax.autoscale_view()
+    else:
+        ax.set_xlim(0, 1)
+        ax.set_ylim(0, 1)
+
+
+def depth_line_figure(suptitle, xlabel):
+    """Function that creates an empty figure for plotting mean soil moisture 
+    at each depth as lines.  The lines are added by draw_depth_lines, so the 
+    same figure can be drawn again for other stations or years.
 
         Parameters
         ----------
-        station_name : str
-            Description...
+        suptitle : str
+            Title shown above the plot (e.g. "Yearly Mean Soil Moisture").
+
+        xlabel : str
+            Label of the x axis.
 
 
         Returns
         ------
-        No physical return.  Will output a plot of yearly average soil moisture 
-        at each depth for the station specified.
+        figure : dictionary
+            Dictionary holding the matplotlib figure ('fig'), axes ('ax') and 
+            depth lines ('lines', None until first drawn).
 
     """
-
-    filler_yearly_avg_sm = yearly_avg_sm(dataframe)
     
     # Create figure and plot space
     fig, ax = plt.subplots(figsize=(20, 10))
+    
+    fig.suptitle(suptitle, fontsize=20)
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel("Soil Moisture %")
+    
+    return {'fig': fig, 'ax': ax, 'lines': None}
+
+
+def draw_depth_lines(figure, dataframe, figure_title):
+    """Function that draws mean soil moisture at each depth on a figure from 
+    depth_line_figure.  If the figure was drawn before, the existing lines are 
+    given the new values instead of being created again.  The axis limits are 
+    fitted to the new values on every draw.
+
+        Parameters
+        ----------
+        figure : dictionary
+            Figure from depth_line_figure.
+
+        dataframe : dataframe
+            Dataframe with a column of mean soil moisture for each depth, indexed 
+            by the values of the x axis.
+
+        figure_title : str
+            Title of the plot (e.g. the station name).
+
+
+        Returns
+        ------
+        No physical return; the figure is updated.
 
-    # Subplot of daily mean discharge from Aug-Oct 2013 at various Colorado stream sites
-    ax.plot(filler_yearly_avg_sm.index.values,
-         filler_yearly_avg_sm['sm_5cm'],
-         color="blue",
-         marker='o',
-         label="5cm")
-    ax.plot(filler_yearly_avg_sm.index.values,
-         filler_yearly_avg_sm['sm_10cm'],
-         color="red",
-         marker='o', label="10cm")
-    ax.plot(filler_yearly_avg_sm.index.values,
-         filler_yearly_avg_sm['sm_20cm'],
-         color="green",
-         marker='o', label="20cm")
-    ax.plot(filler_yearly_avg_sm.index.values,
-         filler_yearly_avg_sm['sm_50cm'],
-         color="purple",
-         marker='o', label="50cm")
-    ax.plot(filler_yearly_avg_sm.index.values,
-         filler_yearly_avg_sm['sm_100cm'],
-         color="orange",
-         marker='o',
-         label="100cm")
-    
-    ax.legend()
-    ax.legend(title='Soil Moisture Depth of Measurement\n')
-    fig.suptitle("Yearly Mean Soil Moisture", fontsize=20)
+    """
+    
+    ax = figure['ax']
+    
+    if figure['lines'] is None:
+        figure['lines'] = [ax.plot(dataframe.index.values, dataframe[depth], color=color, 
+                                   marker='o', label=label)[0]
+                           for depth, (color, label) in depth_plot_styles.items()]
+        ax.legend(title='Soil Moisture Depth of Measurement\n')
+    else:
+        for line, depth in zip(figure['lines'], depth_plot_styles):
+            line.set_data(dataframe.index.values, dataframe[depth])
+    
+    _fit_limits(ax, figure['lines'][0].get_xydata()[:, 0])
+    
     ax.set_title(figure_title)
-    ax.set_xlabel("Year")
-    ax.set_ylabel("Soil Moisture %")
+
+
+def save_figure(fig, path):
+    """Function that saves a figure to a file, in the format given by the file 
+    extension (e.g. .png or .svg), and closes it."""
+    
+    fig.savefig(path)
+    plt.close(fig)
+
+
+@instrumented
+def plot_yearly_avg_sm(dataframe, figure_title, path=None):
+    """Function that takes an input dataframe of raw soil moisture data and plots 
+    the yearly average soil moisture values for each depth (5cm, 10cm, 20cm, 50cm, 
+    100cm), using yearly_avg_sm.
+
+        Parameters
+        ----------
+        dataframe : dataframe
+            Input dataframe containing raw soil moisture data.
+
+        figure_title : str
+            Title of the plot (e.g. the station name).
+
+        path : str, optional
+            File to save the plot to (e.g. .png or .svg) instead of displaying it.
+
+
+        Returns
+        ------
+        No physical return.  Will output a plot of yearly average soil moisture 
+        at each depth for the station specified.
+
+    """
+
+    filler_yearly_avg_sm = yearly_avg_sm(dataframe)
+    
+    figure = depth_line_figure("Yearly Mean Soil Moisture", "Year")
+    draw_depth_lines(figure, filler_yearly_avg_sm, figure_title)
+    
+    if path is not None:
+        save_figure(figure['fig'], path)
 
 
 # In[4]:
 
 
-def plot_monthly_avg_sm(dataframe, year, figure_title):
-    """Function that takes an input station name and plots the monthly 
-    average soil moisture values for each depth (5cm, 10cm, 20cm, 50cm, 100cm) 
-    for a specified year. Please note that for this function to run, a dataframe 
-    of monthly average soil moisture for each depth must exist under the name "monthly_mean"
+@instrumented
+def plot_monthly_avg_sm(dataframe, year, figure_title, path=None):
+    """Function that takes an input dataframe of raw soil moisture data and plots 
+    the monthly average soil moisture values for each depth (5cm, 10cm, 20cm, 
+    50cm, 100cm) for a specified year, using monthly_mean.
 
         Parameters
         ----------
-        station_name : str
-            Name of station you want plotted.
+        dataframe : dataframe
+            Input dataframe containing raw soil moisture data.
 
         year : int
             Integer value for the year desired.
 
+        figure_title : str
+            Title of the plot (e.g. the station name and year).
+
+        path : str, optional
+            File to save the plot to (e.g. .png or .svg) instead of displaying it.
+
 
         Returns
         ------
@@ -113,58 +220,36 @@ def plot_monthly_avg_sm(dataframe, year, figure_title):
     
     filler_monthly_avg_sm = monthly_mean(dataframe, year)
     
-    # Create figure and plot space
-    fig, ax = plt.subplots(figsize=(20, 10))
-
-    # Subplot of daily mean discharge from Aug-Oct 2013 at various Colorado stream sites
-    ax.plot(filler_monthly_avg_sm.index.values,
-         filler_monthly_avg_sm['sm_5cm'],
-         color="blue",
-         marker='o',
-         label="5cm")
-    ax.plot(filler_monthly_avg_sm.index.values,
-         filler_monthly_avg_sm['sm_10cm'],
-         color="red",
-         marker='o', label="10cm")
-    ax.plot(filler_monthly_avg_sm.index.values,
-         filler_monthly_avg_sm['sm_20cm'],
-         color="green",
-         marker='o', label="20cm")
-    ax.plot(filler_monthly_avg_sm.index.values,
-         filler_monthly_avg_sm['sm_50cm'],
-         color="purple",
-         marker='o', label="50cm")
-    ax.plot(filler_monthly_avg_sm.index.values,
-         filler_monthly_avg_sm['sm_100cm'],
-         color="orange",
-         marker='o',
-         label="100cm")
-    
-    ax.legend()
-    ax.legend(title='Soil Moisture Depth of Measurement\n')
-    fig.suptitle("Monthly Mean Soil Moisture", fontsize=20)
-    ax.set_title(figure_title)
-    ax.set_xlabel("Month")
-    ax.set_ylabel("Soil Moisture %")
+    figure = depth_line_figure("Monthly Mean Soil Moisture", "Month")
+    draw_depth_lines(figure, filler_monthly_avg_sm, figure_title)
+    
+    if path is not None:
+        save_figure(figure['fig'], path)
 
 
 # In[5]:
 
 
-def plot_daily_avg_sm(dataframe, year, figure_title):
-    """Function that takes an input station name and plots the daily 
-    average soil moisture values for each depth (5cm, 10cm, 20cm, 50cm, 100cm) 
-    for a specified year. Please note that for this function to run, a dataframe 
-    of daily average soil moisture for each depth must exist under the name "daily_avg"
+@instrumented
+def plot_daily_avg_sm(dataframe, year, figure_title, path=None):
+    """Function that takes an input dataframe of raw soil moisture data and plots 
+    the daily average soil moisture values for each depth (5cm, 10cm, 20cm, 50cm, 
+    100cm) for a specified year, using daily_avg.
 
         Parameters
         ----------
-        station_name : str
-            Name of station you want plotted.
+        dataframe : dataframe
+            Input dataframe containing raw soil moisture data.
 
         year : int
             Integer value for the year desired.
 
+        figure_title : str
+            Title of the plot (e.g. the station name and year).
+
+        path : str, optional
+            File to save the plot to (e.g. .png or .svg) instead of displaying it.
+
 
         Returns
         ------
@@ -175,44 +260,17 @@ def plot_daily_avg_sm(dataframe, year, figure_title):
     
     filler_daily_avg_sm = daily_avg(dataframe, year)
     
-    # Create figure and plot space
-    fig, ax = plt.subplots(figsize=(20, 10))
-
-    # Subplot of daily mean discharge from Aug-Oct 2013 at various Colorado stream sites
-    ax.plot(filler_daily_avg_sm.index.values,
-         filler_daily_avg_sm['sm_5cm'],
-         color="blue",
-         marker='o',
-         label="5cm")
-    ax.plot(filler_daily_avg_sm.index.values,
-         filler_daily_avg_sm['sm_10cm'],
-         color="red",
-         marker='o', label="10cm")
-    ax.plot(filler_daily_avg_sm.index.values,
-         filler_daily_avg_sm['sm_20cm'],
-         color="green",
-         marker='o', label="20cm")
-    ax.plot(filler_daily_avg_sm.index.values,
-         filler_daily_avg_sm['sm_50cm'],
-         color="purple",
-         marker='o', label="50cm")
-    ax.plot(filler_daily_avg_sm.index.values,
-         filler_daily_avg_sm['sm_100cm'],
-         color="orange",
-         marker='o',
-         label="100cm")
-    
-    ax.legend()
-    ax.legend(title='Soil Moisture Depth of Measurement\n')
-    fig.suptitle("Daily Mean Soil Moisture", fontsize=20)
-    ax.set_title(figure_title)
-    ax.set_xlabel("Julian Day")
-    ax.set_ylabel("Soil Moisture %")
+    figure = depth_line_figure("Daily Mean Soil Moisture", "Julian Day")
+    draw_depth_lines(figure, filler_daily_avg_sm, figure_title)
+    
+    if path is not None:
+        save_figure(figure['fig'], path)
 
 
 # In[6]:
 
 
+@instrumented
 def generate_hist(dataframe):
     dataframe.hist(column='sm_5cm', bins=50)
     dataframe.hist(column='sm_10cm', bins=50)
@@ -224,69 +282,272 @@ def generate_hist(dataframe):
 # In[7]:
 
 
-def yearly_nan_analysis(dataframe):
+@instrumented
+def period_mean(dataframe, timescale, years=None, months=None, 
+                min_days=None, max_nan=None, report_missing=False, depths=None):
+    """Function that takes an input dataframe of raw soil moisture data and 
+    calculates mean soil moisture for each depth on a specified timescale 
+    (year, month, decad or pentad) from the station's index of periods (see 
+    stationindex.py), whose rows are only read once per station.  A period 
+    mean is only calculated when the period contains more than "min_days" rows, 
+    and a depth is set as NaN when the period contains "max_nan" or more NaN values 
+    (see quality_table).  Any period without enough data is set as NaN.
+
+        Parameters
+        ----------
+        dataframe : dataframe
+            Input dataframe containing raw soil moisture data.
+
+        timescale : str
+            Timescale to average over; one of the keys of "timescale_rules" 
+            ('year', 'month', 'decad' or 'pentad').
+
+        years : list, optional
+            Years to include in the output.  Defaults to every year from the first 
+            to the last year with data.
+
+        months : list, optional
+            3-letter month names to include in the output.  Defaults to "month_list_all".
+
+        min_days : int, optional
+            Coverage threshold; a period must contain more than this number of rows.  
+            Defaults to the value in "timescale_rules".
+
+        max_nan : int, optional
+            A depth is set as NaN when a period contains this many NaN values or more.  
+            Defaults to the value in "timescale_rules".
+
+        report_missing : bool, optional
+            Print each period that did not contain enough data.
+
+        depths : list, optional
+            Columns to average (e.g. a root zone storage column, see rootzone.py).  
+            Defaults to "depth_list_all".
+
+
+        Returns
+        ------
+        sm_period_mean : dataframe
+            Dataframe indexed by year (and month and period, where applicable) 
+            showing mean soil moisture for each depth.
+
+    """
+    
+    depths = list(depth_list_all if depths is None else depths)
+    full_index, size, count, total, flags = _period_coverage(dataframe, timescale, years, months, 
+                                                             min_days, max_nan, depths)
     
-    column_names = ['sm_5cm', 'sm_10cm', 'sm_20cm', 'sm_50cm', 'sm_100cm']
+    # Only periods and depths with enough data and few enough NaN values give a mean
+    with np.errstate(invalid='ignore', divide='ignore'):
+        sm_period_mean = pd.DataFrame(np.where(flags == 0, total / count, np.nan), 
+                                      index=full_index, columns=depths)
     
-    for column in column_names:
+    if report_missing:
+        few_days = (flags[:, 0] & quality_flags['few_days']) > 0
         
-        if not dataframe[column].isna().sum() < 90:
-            dataframe[column] = dataframe[column].where(dataframe[column].isna(), np.nan)
+        for period in full_index[few_days]:
+            if timescale == 'year':
+                print(period, ': This year did not contain enough data and was set as NaN')
+            else:
+                print(period[1], period[0], *period[2:], ': Did not contain enough data and was set as NaN')
+    
+    return sm_period_mean
+
 
+def _period_coverage(dataframe, timescale, years, months, min_days, max_nan, depths):
+    group_columns, default_min_days, default_max_nan = timescale_rules[timescale]
+    
+    if min_days is None:
+        min_days = default_min_days
+    if max_nan is None:
+        max_nan = default_max_nan
+    
+    index = station_index(dataframe)
+    
+    # Every period that should appear in the output, whether or not it contains data
+    group_lists = {'year': index.record_years() if years is None else years,
+                   'month': month_list_all if months is None else months,
+                   'decad': decad_list_all,
+                   'pentad': pentad_list_all}
+    
+    if len(group_columns) == 1:
+        full_index = pd.Index(group_lists['year'], name='year')
+    else:
+        full_index = pd.MultiIndex.from_product(
+            [group_lists[column] for column in group_columns], names=group_columns)
+    
+    # Number of rows, and number and sum of valid (non-NaN) values of each depth, for 
+    # every period with data; the rows themselves are only read once per station
+    period_index, size, count, total = index.period_sums(dataframe, timescale, depths, years)
+    
+    # Periods that are absent from the data are given a final row with no rows or values
+    # (which also works when none of the periods asked for contain data)
+    positions = period_index.get_indexer(full_index)
+    positions[positions < 0] = len(size)
+
+    full_size = np.append(size, 0)[positions]
+    full_count = np.vstack([count, np.zeros((1, len(depths)), dtype=count.dtype)])[positions]
+    full_total = np.vstack([total, np.zeros((1, len(depths)))])[positions]
+    
+    flags = np.zeros(full_count.shape, dtype='uint8')
+    flags[full_count == 0] |= quality_flags['no_data']
+    flags[full_size <= min_days, :] |= quality_flags['few_days']
+    flags[full_size[:, np.newaxis] - full_count >= max_nan] |= quality_flags['too_many_nan']
     
-# In[8]:
+    return full_index, full_size, full_count, full_total, flags
 
 
-# Function that takes an input dataframe of soil moisture and outputs a dataframe of yearly average SM
-def yearly_avg_sm(soil_moisture_dataframe):
-    """Function that takes an input dataframe containing raw soil moisture data, 
-    and turns it into an output dataframe that contains data from the input 
-    dataframe grouped by year and averaged.  Note that for this function to work 
-    properly you need to include every year of data desired in the "years_list"
-    contained within the function.
+@instrumented
+def quality_table(dataframe, timescale, years=None, months=None, min_days=None, max_nan=None, 
+                  depths=None):
+    """Function that takes an input dataframe of raw soil moisture data and 
+    returns the data coverage of every period on a specified timescale: the 
+    number of days, the number of valid (non-NaN) values of each depth and a 
+    quality flag for each depth, whose bits (see "quality_flags") are set when 
+    the depth has no data, the period has too few days or the depth has too 
+    many NaN values.  The same coverage is used by period_mean, which only 
+    calculates a mean where the flag is 0.
 
         Parameters
         ----------
-        soil_moisture_dataframe : dataframe
-            Dataframe containing raw soil moisture data.
+        dataframe : dataframe
+            Input dataframe containing raw soil moisture data.
+
+        timescale : str
+            Timescale of the periods ('year', 'month', 'decad' or 'pentad').
+
+        years : list, optional
+            Years to include.  Defaults to every year from the first to the last 
+            year with data.
+
+        months : list, optional
+            3-letter month names to include.  Defaults to "month_list_all".
+
+        min_days : int, optional
+            A period must contain more than this number of rows.  Defaults to the 
+            value in "timescale_rules".
+
+        max_nan : int, optional
+            A depth is flagged when a period contains this many NaN values or more.  
+            Defaults to the value in "timescale_rules".
+
+        depths : list, optional
+            Columns to check.  Defaults to "depth_list_all".
 
 
         Returns
         ------
-        empty_dataframe : dataframe
-            Dataframe showing yearly average soil moisture for every year contained in the 
-            "years_list."
+        coverage_df : dataframe
+            Dataframe indexed by year (and month and period, where applicable) 
+            with a "days" column, and a "<depth>_valid" and "<depth>_flags" column 
+            for each depth.
 
     """
     
-    empty_dataframe = pd.DataFrame()
+    depths = list(depth_list_all if depths is None else depths)
+    full_index, size, count, total, flags = _period_coverage(dataframe, timescale, years, months, 
+                                                             min_days, max_nan, depths)
+    
+    coverage_df = pd.DataFrame({'days': size}, index=full_index)
+    
+    for column, depth in enumerate(depths):
+        coverage_df[depth + '_valid'] = count[:, column]
+    for column, depth in enumerate(depths):
+        coverage_df[depth + '_flags'] = flags[:, column]
+    
+    return coverage_df
+
+
+@instrumented
+def quality_report(dataframe, timescales=('year', 'month', 'decad', 'pentad')):
+    """Function that summarizes the data coverage of a station (see 
+    quality_table) for every year on record, by timescale and depth.
+
+        Parameters
+        ----------
+        dataframe : dataframe
+            Input dataframe containing raw soil moisture data.
 
-    years_list = years_list_all
+        timescales : list, optional
+            Timescales to summarize.  Defaults to every timescale.
+
+
+        Returns
+        ------
+        report_df : dataframe
+            Dataframe indexed by timescale and depth showing the number of periods, 
+            the number of periods with a mean, the number of periods with each 
+            quality flag set and the percentage of periods with a mean.
+
+    """
     
-    column_names = ['sm_5cm', 'sm_10cm', 'sm_20cm', 'sm_50cm', 'sm_100cm']
+    rows = []
+    
+    for timescale in timescales:
+        full_index, size, count, total, flags = _period_coverage(dataframe, timescale, None, None, 
+                                                                 None, None, list(depth_list_all))
+        
+        for column, depth in enumerate(depth_list_all):
+            row = {'timescale': timescale, 'depth': depth, 'periods': len(full_index), 
+                   'usable': int(np.sum(flags[:, column] == 0))}
+            for flag, bit in quality_flags.items():
+                row[flag] = int(np.sum((flags[:, column] & bit) > 0))
+            row['percent_usable'] = 100 * row['usable'] / row['periods'] if row['periods'] else np.nan
+            rows.append(row)
+    
+    report_df = pd.DataFrame(rows, columns=['timescale', 'depth', 'periods', 'usable', *quality_flags, 
+                                            'percent_usable'])
+    
+    return report_df.set_index(['timescale', 'depth'])
 
-    for year in years_list:
 
-        sm_year = soil_moisture_dataframe[soil_moisture_dataframe["year"] == year]
+# In[7]:
 
-        # Ensure that there is enough data for each year before mean is calculated
-        if sm_year['day'].size > 275:
-            
-            # Missing/NaN data cleaning
-            yearly_nan_analysis(sm_year)
-            
-            sm_year_mean = sm_year.groupby(
-                                    ["year"])[["sm_5cm", "sm_10cm", 
-                                               "sm_20cm", "sm_50cm", 
-                                               "sm_100cm"]].mean()
 
-            empty_dataframe = empty_dataframe.append(sm_year_mean)
+@instrumented
+def yearly_nan_analysis(dataframe):
+    """Function that returns the data coverage and quality flags of every 
+    year of a station (see quality_table).  The input dataframe is not changed.
 
-        else:
-            data = {'sm_5cm':[np.nan], 'sm_10cm':[np.nan], 'sm_20cm':[np.nan], 'sm_50cm':[np.nan], 'sm_100cm':[np.nan]}
-            filler_nan_df = pd.DataFrame(data, index=[year])
-            empty_dataframe = empty_dataframe.append(filler_nan_df)
-            print(year,': This year did not contain enough data and was set as NaN')
+        Parameters
+        ----------
+        dataframe : dataframe
+            Input dataframe containing raw soil moisture data.
+
+
+        Returns
+        ------
+        coverage_df : dataframe
+            Dataframe of the number of days, valid values and quality flags 
+            of each depth for every year.
+
+    """
+    
+    return quality_table(dataframe, 'year')
+
+
+# Function that takes an input dataframe of soil moisture and outputs a dataframe of yearly average SM
+@instrumented
+def yearly_avg_sm(soil_moisture_dataframe):
+    """Function that takes an input dataframe containing raw soil moisture data, 
+    and turns it into an output dataframe that contains data from the input 
+    dataframe grouped by year and averaged, for every year from the first to the 
+    last year with data.
+
+        Parameters
+        ----------
+        soil_moisture_dataframe : dataframe
+            Dataframe containing raw soil moisture data.
+
+
+        Returns
+        ------
+        empty_dataframe : dataframe
+            Dataframe showing yearly average soil moisture for every year on record.
+
+    """
+    
+    empty_dataframe = period_mean(soil_moisture_dataframe, 'year', report_missing=True)
             
     return empty_dataframe
 
@@ -294,21 +555,33 @@ def yearly_avg_sm(soil_moisture_dataframe):
 # In[9]:
 
 
-# Loop through each column to detect and replace columns with NaN values if NaN values exceed 50% of monthly data
+@instrumented
 def monthly_nan_analysis(dataframe):
+    """Function that returns the data coverage and quality flags of every 
+    month of a station (see quality_table).  The input dataframe is not changed.
+
+        Parameters
+        ----------
+        dataframe : dataframe
+            Input dataframe containing raw soil moisture data.
+
+
+        Returns
+        ------
+        coverage_df : dataframe
+            Dataframe of the number of days, valid values and quality flags 
+            of each depth for every month.
+
+    """
     
-    column_names = ['sm_5cm', 'sm_10cm', 'sm_20cm', 'sm_50cm', 'sm_100cm']
-    
-    for column in column_names:
-        
-        if not dataframe[column].isna().sum() < 16:
-            dataframe[column] = dataframe[column].where(dataframe[column].isna(), np.nan)
+    return quality_table(dataframe, 'month')
 
 
 # In[10]:
 
 
 # Function that takes an input SM dataframe and returns a dataframe displaying yearly average SM for a specified month
+@instrumented
 def yearly_mean_month(soil_moisture_dataframe, month_name):
     """Function that takes an input dataframe and specified month name 
     and returns a new dataframe that shows yearly average soil moisture 
@@ -331,40 +604,19 @@ def yearly_mean_month(soil_moisture_dataframe, month_name):
 
     """
     
-    empty_year_month_dataframe = pd.DataFrame()
-    
-    years_list = years_list_all
+    sm_year_month_mean = period_mean(soil_moisture_dataframe, 'month', 
+                                     months=[month_name], report_missing=True)
     
-    sm_month = soil_moisture_dataframe[soil_moisture_dataframe["month"] == month_name]
-    
-    # Ensure there is enough data for mean calculation
-    for year in years_list:
-        
-        sm_year_month = sm_month[sm_month["year"] == year]
-        
-        if sm_year_month['day'].size > 15:
-            
-            # Missing/NaN data cleaning
-            monthly_nan_analysis(sm_year_month)
-            
-            sm_year_month_mean = sm_year_month.groupby(
-                ["year"])[["sm_5cm", "sm_10cm", "sm_20cm", "sm_50cm", "sm_100cm"]].mean()
-            
-            empty_year_month_dataframe = empty_year_month_dataframe.append(sm_year_month_mean)
-            
-        else:
-            data = {'sm_5cm':[np.nan], 'sm_10cm':[np.nan], 'sm_20cm':[np.nan], 'sm_50cm':[np.nan], 'sm_100cm':[np.nan]}
-            filler_nan_df = pd.DataFrame(data, index=[year])
-            empty_year_month_dataframe = empty_year_month_dataframe.append(filler_nan_df)
-            print(month_name, year, ': Did not contain enough data and was set as NaN')
+    sm_year_month_mean = sm_year_month_mean.reset_index('month', drop=True)
 
-    return empty_year_month_dataframe
+    return sm_year_month_mean
 
 
 # In[11]:
 
 
 # Function to take an input SM dataframe and calculate monthly average SM for each depth across one specific year
+@instrumented
 def monthly_mean(soil_moisture_dataframe, year):
     """Function that takes an input dataframe of raw soil moisture data and a 
     specified year and returns an output dataframe showing monthly average soil 
@@ -387,32 +639,10 @@ def monthly_mean(soil_moisture_dataframe, year):
 
     """
     
-    station_sm_monthly_mean = pd.DataFrame()
-    
-    month_list = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+    station_sm_monthly_mean = period_mean(soil_moisture_dataframe, 'month', 
+                                          years=[year], report_missing=True)
     
-    # Select year of analysis
-    station_sm_year = soil_moisture_dataframe[soil_moisture_dataframe["year"] == year]
-
-    # Loop through each month of the year to examine NaN or missing values
-    for month in month_list:
-        
-        station_sm_year_month = station_sm_year[station_sm_year["month"] == month]
-        
-        if station_sm_year_month['day'].size > 15:
-            
-            monthly_nan_analysis(station_sm_year_month)
-    
-            station_sm_monthly_avg = station_sm_year_month.groupby(
-                ["month"])[["sm_5cm", "sm_10cm", "sm_20cm", "sm_50cm", "sm_100cm"]].mean()
-        
-            station_sm_monthly_mean = station_sm_monthly_mean.append(station_sm_monthly_avg)
-            
-        else:
-            data = {'sm_5cm':[np.nan], 'sm_10cm':[np.nan], 'sm_20cm':[np.nan], 'sm_50cm':[np.nan], 'sm_100cm':[np.nan]}
-            filler_nan_df = pd.DataFrame(data, index=[month])
-            station_sm_monthly_mean = station_sm_monthly_mean.append(filler_nan_df)
-            print(month, year, ': Did not contain enough data and was set as NaN')
+    station_sm_monthly_mean = station_sm_monthly_mean.reset_index('year', drop=True)
     
     return station_sm_monthly_mean
 
@@ -421,6 +651,7 @@ def monthly_mean(soil_moisture_dataframe, year):
 
 
 # Function that takes an input dataframe and calculates monthly mean SM across all years of data
+@instrumented
 def monthly_mean_all_years(soil_moisture_dataframe):
     """Function that takes an input dataframe of raw soil moisture data and 
     outputs a new dataframe that shows monthly mean soil moisture across all 
@@ -454,6 +685,7 @@ def monthly_mean_all_years(soil_moisture_dataframe):
 # In[13]:
 
 
+@instrumented
 def daily_avg(soil_moisture_dataframe, year):
     """Function that turns an input dataframe of raw soil moisture data 
     into a new dataframe showing daily average soil moisture across a 
@@ -476,8 +708,8 @@ def daily_avg(soil_moisture_dataframe, year):
             
     """
     
-    sm_daily_avg = soil_moisture_dataframe.set_index('doy')
-    sm_daily_avg_year = sm_daily_avg[sm_daily_avg["year"] == year]
+    year_rows = station_index(soil_moisture_dataframe).positions(year)
+    sm_daily_avg_year = soil_moisture_dataframe.iloc[year_rows].set_index('doy')
     
     return sm_daily_avg_year
 
@@ -485,6 +717,7 @@ def daily_avg(soil_moisture_dataframe, year):
 # In[14]:
 
 
+@instrumented
 def daily_avg_all_years(soil_moisture_dataframe):
     """Function that takes an input dataframe of raw soil moisture data 
     and turns it into a dataframe showing average soil moisture value for 
@@ -515,395 +748,427 @@ def daily_avg_all_years(soil_moisture_dataframe):
 # In[15]:
 
 
+@instrumented
 def decad_nan_analysis(dataframe):
+    """Function that returns the data coverage and quality flags of every 
+    decad of a station (see quality_table).  The input dataframe is not changed.
+
+        Parameters
+        ----------
+        dataframe : dataframe
+            Input dataframe containing raw soil moisture data.
+
+
+        Returns
+        ------
+        coverage_df : dataframe
+            Dataframe of the number of days, valid values and quality flags 
+            of each depth for every decad.
+
+    """
     
-    column_names = ['sm_5cm', 'sm_10cm', 'sm_20cm', 'sm_50cm', 'sm_100cm']
-    
-    for column in column_names:
-        
-        if not dataframe[column].isna().sum() < 6:
-            dataframe[column] = dataframe[column].where(dataframe[column].isna(), np.nan)
+    return quality_table(dataframe, 'decad')
 
 
 # In[15]:
 
 
+@instrumented
 def decad_mean(dataframe, year):
-    
-    month_list = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
-    dec_list = ['decad0', 'decad1', 'decad2']
-    
-    empty_year_dec_mean_df = pd.DataFrame()
-    
-    station_sm_year_dec = dataframe[dataframe['year'] == year]
-    
-    for month in month_list:
-        
-        station_sm_month_dec = station_sm_year_dec[station_sm_year_dec['month'] == month]
-    
-        for decad in dec_list:
-            
-            station_sm_year_month_dec = station_sm_month_dec[station_sm_month_dec['decad'] == decad]
-            
-            # Ensure each decad of each month has enough data to provide an accurate mean
-            if station_sm_year_month_dec['decad'].size > 5:
-            
-                # NaN analysis
-                decad_nan_analysis(station_sm_year_month_dec)
+    """Function that takes an input dataframe of raw soil moisture data and a 
+    specified year and returns an output dataframe showing mean soil moisture 
+    for each depth over every decad (~10 day period) of each month of that year.
 
-                # Calculate mean
-                filler_decad_mean_df = station_sm_year_month_dec.groupby(["month"])[["sm_5cm", "sm_10cm", 
-                                                                                "sm_20cm", "sm_50cm", 
-                                                                                "sm_100cm"]].mean()
+        Parameters
+        ----------
+        dataframe : dataframe
+            Input dataframe containing raw soil moisture data.
 
-                # Clean columns
-                filler_decad_mean_df = filler_decad_mean_df.reset_index()
-                filler_decad_mean_df.insert(0, "year", [year], True)
-                filler_decad_mean_df.insert(2, "decad", [decad], True)
+        year : int
+            Integer value for the year desired.
 
-                empty_year_dec_mean_df = empty_year_dec_mean_df.append(filler_decad_mean_df)
-                
-            # If a decad of a month does not contain enough data, append a row with only NaN values   
-            else:
-                data = {'year': [year], 'month':[month], 'decad':[decad], 'sm_5cm':[np.nan], 
-                        'sm_10cm':[np.nan], 'sm_20cm':[np.nan], 'sm_50cm':[np.nan], 'sm_100cm':[np.nan]}
-                
-                filler_nan_df = pd.DataFrame(data)
-                
-                empty_year_dec_mean_df = empty_year_dec_mean_df.append(filler_nan_df)
-                
-                #print(year, month, decad, ': Did not contain enough data and was set as NaN')
+
+        Returns
+        ------
+        year_decad_mean_df : dataframe
+            Dataframe with year, month and decad columns showing mean soil 
+            moisture for each depth.
+
+    """
     
-    # Column/Index management
-    #empty_year_dec_mean_df = empty_year_dec_mean_df.set_index('year')
+    year_decad_mean_df = period_mean(dataframe, 'decad', years=[year])
     
-    return empty_year_dec_mean_df
+    year_decad_mean_df = year_decad_mean_df.reset_index()
+    
+    return year_decad_mean_df
 
 
 # In[16]:
 
 
-def decad_zscore(dataframe, year):
+@instrumented
+def zscore_period_means(sm_period_mean):
+    """Function that takes a dataframe of period means from period_mean and 
+    standardizes each period against the same period across all years, 
+    ignoring any NaN values.
+
+        Parameters
+        ----------
+        sm_period_mean : dataframe
+            Dataframe of period means indexed by year (and month and period).
 
-    # Lists needed for loops
-    dec_list = ['decad0', 'decad1', 'decad2']
-    years_list_all = (1997, 1998, 1999, 2000, 2001, 2002, 2003, 2004, 2005, 
-                      2006, 2007, 2008, 2009, 2010, 2011, 2012, 2013, 
-                      2014, 2015, 2016, 2017, 2018, 2019, 2020)
-    month_list_all = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
 
-    # Create empty dataframes for temporary use in the function
-    empty_df1 = pd.DataFrame()
-    final_year_zscore_df = pd.DataFrame()
+        Returns
+        ------
+        zscore_df : dataframe
+            Dataframe with the same index showing the z-score of each period mean.
 
-    for month in month_list_all:
+    """
+    
+    period_columns = list(sm_period_mean.index.names[1:])
+    
+    # Yearly means are standardized across every year at once
+    if not period_columns:
+        return (sm_period_mean - sm_period_mean.mean()) / sm_period_mean.std(ddof=0)
+    
+    grouped_period = sm_period_mean.groupby(level=period_columns, sort=False)
+    zscore_df = (sm_period_mean - grouped_period.transform('mean')) / grouped_period.transform('std', ddof=0)
+    
+    return zscore_df
 
-        station_sm_month = dataframe[dataframe["month"] == month]
 
-        for decad in dec_list:
+@instrumented
+def period_zscore(dataframe, timescale, depths=None):
+    """Function that takes an input dataframe of raw soil moisture data and 
+    calculates the z-score of every yearly, monthly or sub-monthly period mean 
+    (year, month, decad or pentad) for every year on record.  Each period 
+    is standardized against the same period of the month across all years, so the 
+    climatology is only computed once for the whole anomaly history.
 
-            station_sm_month_dec = station_sm_month[station_sm_month['decad'] == decad]
+        Parameters
+        ----------
+        dataframe : dataframe
+            Input dataframe containing raw soil moisture data.
 
-            for item in years_list_all:
-                station_sm_month_dec_year = station_sm_month_dec[station_sm_month_dec["year"] == item]
+        timescale : str
+            Timescale to standardize ('year', 'month', 'decad' or 'pentad').
 
-                if station_sm_month_dec_year['year'].size > 5:
-                    
-                    # NaN analysis
-                    decad_nan_analysis(station_sm_month_dec_year)
+        depths : list, optional
+            Columns to standardize.  Defaults to "depth_list_all".
 
-                    filler_decad_mean_df = station_sm_month_dec_year.groupby(["month"])[["sm_5cm", "sm_10cm", 
-                                                                                            "sm_20cm", "sm_50cm", 
-                                                                                            "sm_100cm"]].mean()
-                    # Clean columns
-                    filler_decad_mean_df = filler_decad_mean_df.reset_index()
-                    filler_decad_mean_df.insert(0, "year", [item], True)
-                    filler_decad_mean_df.insert(2, "decad", [decad], True)
 
-                    empty_df1 = empty_df1.append(filler_decad_mean_df)
-                    
-                # If the year does not contain enough data to make calculations, set that year as NaN
-                else:
-                    data = {'year': [item], 'month':[month], 'decad':[decad], 'sm_5cm':[np.nan], 
-                                    'sm_10cm':[np.nan], 'sm_20cm':[np.nan], 'sm_50cm':[np.nan], 'sm_100cm':[np.nan]}
+        Returns
+        ------
+        zscore_df : dataframe
+            Dataframe indexed by year with month, period (if any) and z-score 
+            columns for each depth, ordered by year, month and period.
 
-                    filler_nan_df = pd.DataFrame(data)
+    """
+    
+    zscore_df = zscore_period_means(period_mean(dataframe, timescale, depths=depths))
+    
+    if zscore_df.index.nlevels > 1:
+        zscore_df = zscore_df.reset_index(level=list(zscore_df.index.names[1:]))
+    
+    return zscore_df
 
-                    empty_df1 = empty_df1.append(filler_nan_df)
 
-            # Z-Score analysis
-            empty_df1 = empty_df1.groupby(["year"])[["sm_5cm", "sm_10cm", "sm_20cm", "sm_50cm", "sm_100cm"]].mean()
-            empty_df1_zscore = empty_df1.apply(zscore, nan_policy='omit')
+# In[16]:
 
-            # Create new dataframe of calculated z-scores for desired year
-            zscore_month_dec_year = empty_df1_zscore[empty_df1_zscore.index.values == year]
-            zscore_month_dec_year.insert(0, "month", [month], True)
-            zscore_month_dec_year.insert(1, "decad", [decad], True)
 
-            final_year_zscore_df = final_year_zscore_df.append(zscore_month_dec_year)
+@instrumented
+def decad_zscore(dataframe, year=None):
+    """Function that takes an input dataframe of raw soil moisture data and a 
+    specified year and returns the z-score of each decad (~10 day period) mean 
+    soil moisture for that year, standardized against the same decad of every 
+    year on record.  If no year is specified, z-scores for every year 
+    are returned from the same climatology.
 
-    return final_year_zscore_df
+        Parameters
+        ----------
+        dataframe : dataframe
+            Input dataframe containing raw soil moisture data.
 
+        year : int, optional
+            Integer value for the year desired.  Defaults to every year.
 
-# In[16]:
 
+        Returns
+        ------
+        zscore_year_df : dataframe
+            Dataframe indexed by year showing the z-score of mean soil moisture 
+            for each decad of each month of the specified year (or of every year).
 
-def pentad_nan_analysis(dataframe):
+    """
     
-    column_names = ['sm_5cm', 'sm_10cm', 'sm_20cm', 'sm_50cm', 'sm_100cm']
+    zscore_df = period_zscore(dataframe, 'decad')
     
-    for column in column_names:
-        
-        if not dataframe[column].isna().sum() < 3:
-            dataframe[column] = dataframe[column].where(dataframe[column].isna(), np.nan)
+    if year is None:
+        return zscore_df
+    
+    zscore_year_df = zscore_df.loc[year:year]
+    
+    return zscore_year_df
 
 
 # In[16]:
 
 
-def pentad_mean(dataframe, year):
-    
-    month_list = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
-    pent_list = ['pentad0', 'pentad1', 'pentad2', 'pentad3', 'pentad4', 'pentad5']
-    
-    empty_year_pent_mean_df = pd.DataFrame()
-    
-    station_sm_year_pent = dataframe[dataframe['year'] == year]
-    
-    for month in month_list:
-        
-        station_sm_month_pent = station_sm_year_pent[station_sm_year_pent['month'] == month]
-    
-        for pentad in pent_list:
-            
-            station_sm_year_month_pent = station_sm_month_pent[station_sm_month_pent['pentad'] == pentad]
-            
-            # Ensure each pentad of each month has enough data to provide an accurate mean
-            if station_sm_year_month_pent['pentad'].size > 2:
-            
-                # NaN analysis
-                pentad_nan_analysis(station_sm_year_month_pent)
-
-                # Calculate mean
-                filler_pentad_mean_df = station_sm_year_month_pent.groupby(["month"])[["sm_5cm", "sm_10cm", 
-                                                                                "sm_20cm", "sm_50cm", 
-                                                                                "sm_100cm"]].mean()
+@instrumented
+def pentad_nan_analysis(dataframe):
+    """Function that returns the data coverage and quality flags of every 
+    pentad of a station (see quality_table).  The input dataframe is not changed.
 
-                # Clean columns
-                filler_pentad_mean_df = filler_pentad_mean_df.reset_index()
-                filler_pentad_mean_df.insert(0, "year", [year], True)
-                filler_pentad_mean_df.insert(2, "pentad", [pentad], True)
+        Parameters
+        ----------
+        dataframe : dataframe
+            Input dataframe containing raw soil moisture data.
 
-                empty_year_pent_mean_df = empty_year_pent_mean_df.append(filler_pentad_mean_df)
-                
-            # If a pentad of a month does not contain enough data, append a row with only NaN values   
-            else:
-                data = {'year': [year], 'month':[month], 'pentad':[pentad], 'sm_5cm':[np.nan], 
-                        'sm_10cm':[np.nan], 'sm_20cm':[np.nan], 'sm_50cm':[np.nan], 'sm_100cm':[np.nan]}
-                
-                filler_nan_pent_df = pd.DataFrame(data)
-                
-                empty_year_pent_mean_df = empty_year_pent_mean_df.append(filler_nan_pent_df)
-                
-                #print(year, month, pentad, ': Did not contain enough data and was set as NaN')
-    
-    # Column/Index management
-    #empty_year_pent_mean_df = empty_year_pent_mean_df.set_index('year')
-    
-    
-    return empty_year_pent_mean_df
 
+        Returns
+        ------
+        coverage_df : dataframe
+            Dataframe of the number of days, valid values and quality flags 
+            of each depth for every pentad.
 
-# In[17]:
+    """
+    
+    return quality_table(dataframe, 'pentad')
 
 
-def pentad_zscore(dataframe, year):
+# In[16]:
 
-    # Lists needed for loops
-    pent_list = ['pentad0', 'pentad1', 'pentad2', 'pentad3', 'pentad4', 'pentad5']
-    years_list_all = (1997, 1998, 1999, 2000, 2001, 2002, 2003, 2004, 2005, 
-                      2006, 2007, 2008, 2009, 2010, 2011, 2012, 2013, 
-                      2014, 2015, 2016, 2017, 2018, 2019, 2020)
-    month_list_all = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
 
-    # Create empty dataframes for temporary use in the function
-    empty_df2 = pd.DataFrame()
-    final_pent_year_zscore_df = pd.DataFrame()
+@instrumented
+def pentad_mean(dataframe, year):
+    """Function that takes an input dataframe of raw soil moisture data and a 
+    specified year and returns an output dataframe showing mean soil moisture 
+    for each depth over every pentad (~5 day period) of each month of that year.
 
-    for month in month_list_all:
+        Parameters
+        ----------
+        dataframe : dataframe
+            Input dataframe containing raw soil moisture data.
 
-        station_sm_month = dataframe[dataframe["month"] == month]
+        year : int
+            Integer value for the year desired.
 
-        for pentad in pent_list:
 
-            station_sm_month_pent = station_sm_month[station_sm_month['pentad'] == pentad]
+        Returns
+        ------
+        year_pentad_mean_df : dataframe
+            Dataframe with year, month and pentad columns showing mean soil 
+            moisture for each depth.
 
-            for item in years_list_all:
-                station_sm_month_pent_year = station_sm_month_pent[station_sm_month_pent["year"] == item]
+    """
+    
+    year_pentad_mean_df = period_mean(dataframe, 'pentad', years=[year])
+    
+    year_pentad_mean_df = year_pentad_mean_df.reset_index()
+    
+    return year_pentad_mean_df
 
-                if station_sm_month_pent_year['year'].size > 2:
-                    
-                    # NaN analysis
-                    pentad_nan_analysis(station_sm_month_pent_year)
 
-                    filler_pentad_mean_df = station_sm_month_pent_year.groupby(["month"])[["sm_5cm", "sm_10cm", 
-                                                                                            "sm_20cm", "sm_50cm", 
-                                                                                            "sm_100cm"]].mean()
-                    # Clean columns
-                    filler_pentad_mean_df = filler_pentad_mean_df.reset_index()
-                    filler_pentad_mean_df.insert(0, "year", [item], True)
-                    filler_pentad_mean_df.insert(2, "pentad", [pentad], True)
+# In[17]:
 
-                    empty_df2 = empty_df2.append(filler_pentad_mean_df)
-                    
-                # If the year does not contain enough data to make calculations, set that year as NaN
-                else:
-                    data = {'year': [item], 'month':[month], 'pentad':[pentad], 'sm_5cm':[np.nan], 
-                                    'sm_10cm':[np.nan], 'sm_20cm':[np.nan], 'sm_50cm':[np.nan], 'sm_100cm':[np.nan]}
 
-                    filler_nan_df = pd.DataFrame(data)
+@instrumented
+def pentad_zscore(dataframe, year=None):
+    """Function that takes an input dataframe of raw soil moisture data and a 
+    specified year and returns the z-score of each pentad (~5 day period) mean 
+    soil moisture for that year, standardized against the same pentad of every 
+    year on record.  If no year is specified, z-scores for every year 
+    are returned from the same climatology.
 
-                    empty_df2 = empty_df2.append(filler_nan_df)
+        Parameters
+        ----------
+        dataframe : dataframe
+            Input dataframe containing raw soil moisture data.
 
-            # Z-Score analysis
-            empty_df2 = empty_df2.groupby(["year"])[["sm_5cm", "sm_10cm", "sm_20cm", "sm_50cm", "sm_100cm"]].mean()
-            empty_df2_zscore = empty_df2.apply(zscore, nan_policy='omit')
+        year : int, optional
+            Integer value for the year desired.  Defaults to every year.
 
-            # Create new dataframe of calculated z-scores for desired year
-            zscore_month_pent_year = empty_df2_zscore[empty_df2_zscore.index.values == year]
-            zscore_month_pent_year.insert(0, "month", [month], True)
-            zscore_month_pent_year.insert(1, "pentad", [pentad], True)
 
-            final_pent_year_zscore_df = final_pent_year_zscore_df.append(zscore_month_pent_year)
+        Returns
+        ------
+        zscore_year_df : dataframe
+            Dataframe indexed by year showing the z-score of mean soil moisture 
+            for each pentad of each month of the specified year (or of every year).
 
-    return final_pent_year_zscore_df
+    """
+    
+    zscore_df = period_zscore(dataframe, 'pentad')
+    
+    if year is None:
+        return zscore_df
+    
+    zscore_year_df = zscore_df.loc[year:year]
+    
+    return zscore_year_df
 
 
 # In[17]:
 
 
-def zscore_plot(dataframe, timescale, title):
-    # Define plot space
-    fig, (ax1, ax2, ax3, ax4, ax5) = plt.subplots(1, 5, figsize=(40, 30), constrained_layout=True)
-
-    ax1 = plt.subplot2grid((2, 3), (0, 0), colspan=1)
-    ax2 = plt.subplot2grid((2, 3), (0, 1), colspan=1)
-    ax3 = plt.subplot2grid((2, 3), (0, 2), rowspan=1)
-    ax4 = plt.subplot2grid((2, 3), (1, 0))
-    ax5 = plt.subplot2grid((2, 3), (1, 1))
+def zscore_figure(timescale):
+    """Function that creates an empty figure for plotting z-scores at each depth 
+    as bars, with one subplot per depth.  The bars are added by draw_zscore_bars, 
+    so the same figure can be drawn again for other stations or years.
 
-    # Define figure title
-    fig.suptitle(title, fontsize=40)
+        Parameters
+        ----------
+        timescale : str
+            Label of the x axes (e.g. "Year" or "Month").
 
-    # 5cm depth subplot
-    ax1.bar(dataframe.index.values,
-             dataframe['sm_5cm'],
-             color=(dataframe['sm_5cm'] > 0).map({True: 'b',
-                                                        False: 'r'}))
 
-    ax1.set_title('Depth: 5cm', fontsize = 40)
-    ax1.set_ylabel('Z-Score Soil Moisture', fontsize = 20.0)
-    ax1.set_xlabel(timescale, fontsize = 20)
+        Returns
+        ------
+        figure : dictionary
+            Dictionary holding the matplotlib figure ('fig'), one axes per depth 
+            ('axes') and their bars ('bars', None until first drawn).
 
-    # 10cm depth subplot
-    ax2.bar(dataframe.index.values,
-             dataframe['sm_10cm'],
-             color=(dataframe['sm_10cm'] > 0).map({True: 'b',
-                                                        False: 'r'}))
+    """
+    
+    # Define plot space: three depths on the top row and two below
+    fig = plt.figure(figsize=(40, 30), constrained_layout=True)
+    grid = fig.add_gridspec(2, 3)
+    axes = [fig.add_subplot(grid[0, 0]), fig.add_subplot(grid[0, 1]), fig.add_subplot(grid[0, 2]),
+            fig.add_subplot(grid[1, 0]), fig.add_subplot(grid[1, 1])]
+    
+    for ax, (color, label) in zip(axes, depth_plot_styles.values()):
+        ax.set_title('Depth: '+label, fontsize = 40)
+        ax.set_ylabel('Z-Score Soil Moisture', fontsize = 20.0)
+        ax.set_xlabel(timescale, fontsize = 20)
+    
+    return {'fig': fig, 'axes': axes, 'bars': None, 'index': None}
 
-    ax2.set_title('Depth: 10cm', fontsize = 40)
-    ax2.set_ylabel('Z-Score Soil Moisture', fontsize = 20.0)
-    ax2.set_xlabel(timescale, fontsize = 20)
 
-    # 20cm depth subplot
-    ax3.bar(dataframe.index.values,
-             dataframe['sm_20cm'],
-             color=(dataframe['sm_20cm'] > 0).map({True: 'b',
-                                                        False: 'r'}))
+def draw_zscore_bars(figure, dataframe, title):
+    """Function that draws the z-score of each depth on a figure from 
+    zscore_figure, with positive values in blue and negative values in red.  If 
+    the figure was drawn before with the same x values, the existing bars are 
+    given the new heights and colors instead of being created again.  The axis 
+    limits are fitted to the new values on every draw.
 
-    ax3.set_title('Depth: 20cm', fontsize = 40)
-    ax3.set_ylabel('Z-Score Soil Moisture', fontsize = 20.0)
-    ax3.set_xlabel(timescale, fontsize = 20)
+        Parameters
+        ----------
+        figure : dictionary
+            Figure from zscore_figure.
 
-    # 50cm depth subplot
-    ax4.bar(dataframe.index.values,
-             dataframe['sm_50cm'],
-             color=(dataframe['sm_50cm'] > 0).map({True: 'b',
-                                                        False: 'r'}))
+        dataframe : dataframe
+            Dataframe with a z-score column for each depth, indexed by the values 
+            of the x axis.
 
-    ax4.set_title('Depth: 50cm', fontsize = 40)
-    ax4.set_ylabel('Z-Score Soil Moisture', fontsize = 20.0)
-    ax4.set_xlabel(timescale, fontsize = 20)
+        title : str
+            Title of the figure.
 
-    # 100cm depth subplot
-    ax5.bar(dataframe.index.values,
-             dataframe['sm_100cm'],
-             color=(dataframe['sm_100cm'] > 0).map({True: 'b',
-                                                        False: 'r'}))
 
-    ax5.set_title('Depth: 100cm', fontsize = 40)
-    ax5.set_ylabel('Z-Score Soil Moisture', fontsize = 20.0)
-    ax5.set_xlabel(timescale, fontsize = 20)
+        Returns
+        ------
+        No physical return; the figure is updated.
 
-    plt.show()
+    """
     
+    x_values = dataframe.index.values
+    redraw = figure['bars'] is None or not np.array_equal(figure['index'], x_values)
     
-# In[18]:
-
-
-def monthly_mean_zscore(dataframe, year):
+    if redraw and figure['bars'] is not None:
+        for bars in figure['bars']:
+            bars.remove()
+    
+    if redraw:
+        figure['bars'] = []
+    
+    for number, (ax, depth) in enumerate(zip(figure['axes'], depth_plot_styles)):
+        values = dataframe[depth].to_numpy(dtype=float)
+        colors = np.where(values > 0, 'b', 'r')
+        
+        if redraw:
+            figure['bars'].append(ax.bar(x_values, values, color=colors))
+        else:
+            for bar, value, color in zip(figure['bars'][number], values, colors):
+                bar.set_height(value)
+                bar.set_facecolor(color)
+        
+        _fit_limits(ax, [edge for bar in figure['bars'][number]
+                         for edge in (bar.get_x(), bar.get_x() + bar.get_width())])
     
-    month_list = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+    figure['index'] = x_values
+    
+    # Define figure title
+    figure['fig'].suptitle(title, fontsize=40)
 
-    years_list_all = (1997, 1998, 1999, 2000, 2001, 2002, 2003, 2004, 2005, 
-                      2006, 2007, 2008, 2009, 2010, 2011, 2012, 2013, 
-                      2014, 2015, 2016, 2017, 2018, 2019, 2020)
 
-    monthly_mean_zscore_df = pd.DataFrame()
-    station_nan_cleaned_mean_df = pd.DataFrame()
+@instrumented
+def zscore_plot(dataframe, timescale, title, path=None):
+    """Function that plots the z-score of each depth (5cm, 10cm, 20cm, 50cm, 100cm) 
+    as bars, with positive values in blue and negative values in red.
 
-    for month in month_list:
+        Parameters
+        ----------
+        dataframe : dataframe
+            Dataframe with a z-score column for each depth, indexed by year or month.
 
-        station_sm_month = dataframe[dataframe["month"] == month]
+        timescale : str
+            Label of the x axes (e.g. "Year" or "Month").
 
-        for x in years_list_all:
+        title : str
+            Title of the figure.
 
-            station_sm_month_year = station_sm_month[station_sm_month["year"] == x]
+        path : str, optional
+            File to save the plot to (e.g. .png or .svg) instead of displaying it.
 
-            if station_sm_month_year['day'].size > 15:
 
-                monthly_nan_analysis(station_sm_month_year)
+        Returns
+        ------
+        No physical return.  Will output a plot of the z-scores at each depth.
 
-                station_sm_month_year_mean = station_sm_month_year.groupby(
-                                ["month"])[["sm_5cm", "sm_10cm", "sm_20cm", "sm_50cm", "sm_100cm"]].mean()
+    """
+    
+    figure = zscore_figure(timescale)
+    draw_zscore_bars(figure, dataframe, title)
+    
+    if path is None:
+        plt.show()
+    else:
+        save_figure(figure['fig'], path)
+    
+    
+# In[18]:
 
-                station_sm_month_year_mean.insert(0, "year", [x], True)
 
-                station_nan_cleaned_mean_df = station_nan_cleaned_mean_df.append(station_sm_month_year_mean)
+@instrumented
+def monthly_mean_zscore(dataframe, year=None):
+    """Function that takes an input dataframe of raw soil moisture data and a 
+    specified year and returns the z-score of each monthly mean soil moisture 
+    for that year, standardized against the same month of every year on 
+    record.  If no year is specified, z-scores for every year are 
+    returned from the same climatology.
 
-            else:
-                data = {'year': [x], 'sm_5cm':[np.nan], 'sm_10cm':[np.nan], 'sm_20cm':[np.nan], 'sm_50cm':[np.nan], 'sm_100cm':[np.nan]}
-                filler_nan_df = pd.DataFrame(data, index=[month])
-                station_nan_cleaned_mean_df = station_nan_cleaned_mean_df.append(filler_nan_df)
-                #print(month, x, ': Did not contain enough data and was set as NaN')
-    
-    for y in month_list:
-                
-        station_cleaned_month_mean = station_nan_cleaned_mean_df[station_nan_cleaned_mean_df.index.values == y]
+        Parameters
+        ----------
+        dataframe : dataframe
+            Input dataframe containing raw soil moisture data.
 
-        station_sm_month_mean = station_cleaned_month_mean.groupby(
-                    ["year"])[["sm_5cm", "sm_10cm", "sm_20cm", "sm_50cm", "sm_100cm"]].mean()
+        year : int, optional
+            Integer value for the year desired.  Defaults to every year.
 
-        station_month_zscore = station_sm_month_mean.apply(zscore, nan_policy='omit')
 
-        station_month_zscore_year = station_month_zscore[station_month_zscore.index.values == year]
-        
-        station_month_zscore_year.insert(0, "month", [y], True)
-        
-        monthly_mean_zscore_df = monthly_mean_zscore_df.append(station_month_zscore_year)
-        
+        Returns
+        ------
+        monthly_mean_zscore_df : dataframe
+            Dataframe indexed by month showing the year and the z-score of mean 
+            soil moisture for each month of the specified year (or of every year).
+
+    """
+    
+    monthly_mean_zscore_df = period_zscore(dataframe, 'month')
+    
+    if year is not None:
+        monthly_mean_zscore_df = monthly_mean_zscore_df.loc[year:year]
+    
     monthly_mean_zscore_df = monthly_mean_zscore_df.reset_index()
 
     monthly_mean_zscore_df = monthly_mean_zscore_df.set_index('month')
                 
-    return monthly_mean_zscore_df
\ No newline at end of file
+    return monthly_mean_zscore_df
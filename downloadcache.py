@@ -0,0 +1,621 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[1]:
+
+
+# Import necessary libraries
+import os
+import json
+import time
+import atexit
+import weakref
+import shutil
+import hashlib
+import itertools
+import http.client
+import tempfile
+import threading
+import warnings
+import urllib.error
+import urllib.parse
+import urllib.request
+from instrumentation import note
+
+
+# In[2]:
+
+
+# Default location of the download cache and how long (in seconds) a download is trusted
+# before it is revalidated against the server
+default_cache_dir = os.path.join(os.path.expanduser('~'), 'earth-analytics', 'data', 'soil-moisture-cache')
+default_ttl = 6 * 60 * 60
+default_max_bytes = 2 * 1024 ** 3
+
+# How long (in seconds) files brought up to date by DownloadCache.update are trusted before
+# they are downloaded again in full to check their earlier contents
+default_verify_interval = 7 * 24 * 60 * 60
+
+
+# In[3]:
+
+
+class ConnectionPool:
+    """Thread-safe pool of keep-alive HTTP(S) connections, so repeated downloads
+    from the same host reuse an open connection instead of connecting again.
+
+        Parameters
+        ----------
+        max_idle : int, optional
+            Maximum number of idle connections kept open for each host.
+
+        timeout : int or float, optional
+            Number of seconds to wait for the server before giving up.
+
+    """
+
+    def __init__(self, max_idle=8, timeout=60):
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self.connections_opened = 0
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def request(self, url, headers=None, max_redirects=5):
+        """Function that sends a GET request for a url over a pooled connection.
+
+            Parameters
+            ----------
+            url : str
+                Url to request.
+
+            headers : dict, optional
+                Extra request headers.
+
+            max_redirects : int, optional
+                Maximum number of redirects to follow.
+
+
+            Returns
+            ------
+            response : http.client.HTTPResponse
+                Response whose body must be read (or the response closed) before 
+                it is passed to release().
+
+            connection : http.client.HTTPConnection
+                Connection the response was received on.
+
+        """
+
+        for attempt in range(max_redirects + 1):
+            parts = urllib.parse.urlsplit(url)
+            path = parts.path or '/'
+            if parts.query:
+                path += '?' + parts.query
+
+            response, connection = self._send(parts, path, headers or {})
+
+            if response.status in (301, 302, 303, 307, 308) and response.getheader('Location'):
+                response.read()
+                self.release(connection, response)
+                url = urllib.parse.urljoin(url, response.getheader('Location'))
+                continue
+
+            return response, connection
+
+        raise urllib.error.HTTPError(url, response.status, 'Too many redirects', response.headers, None)
+
+    def release(self, connection, response):
+        """Function that returns a connection to the pool once its response has been read."""
+
+        if response.will_close or not response.isclosed():
+            connection.close()
+            return
+
+        with self._lock:
+            idle = self._idle.setdefault((type(connection), connection.host.lower(), connection.port), [])
+            if len(idle) < self.max_idle:
+                idle.append(connection)
+                return
+
+        connection.close()
+
+    def close(self):
+        """Function that closes every idle connection."""
+
+        with self._lock:
+            for idle in self._idle.values():
+                for connection in idle:
+                    connection.close()
+            self._idle = {}
+
+    def _send(self, parts, path, headers):
+        connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        key = (connection_class, parts.hostname, parts.port or connection_class.default_port)
+
+        with self._lock:
+            idle = self._idle.get(key, [])
+            connection = idle.pop() if idle else None
+
+        # A reused connection may have been closed by the server, so retry once on a new one
+        if connection is not None:
+            try:
+                connection.request('GET', path, headers=headers)
+                return connection.getresponse(), connection
+            except (http.client.HTTPException, OSError):
+                connection.close()
+
+        connection = connection_class(parts.netloc, timeout=self.timeout)
+        with self._lock:
+            self.connections_opened += 1
+
+        try:
+            connection.request('GET', path, headers=headers)
+            return connection.getresponse(), connection
+        except BaseException:
+            connection.close()
+            raise
+
+
+# In[4]:
+
+
+class DownloadCache:
+    """Persistent on-disk cache of downloaded files keyed by url.  Downloaded
+    files are stored under the sha256 hash of their contents, so identical files
+    are only stored once.  Once a download is older than "ttl" seconds it is
+    revalidated with a conditional request (ETag/Last-Modified), which transfers
+    nothing when the file on the server has not changed.  The least recently used
+    files are evicted when the cache grows larger than "max_bytes".  Access
+    times are kept in memory and written to the cache index with its next
+    change (or by flush, which also runs when Python exits), so cache hits never
+    wait on the disk.
+
+        Parameters
+        ----------
+        cache_dir : str, optional
+            Directory that holds the cached files and the cache index.
+
+        ttl : int or float, optional
+            Number of seconds a download is used without revalidation.
+
+        max_bytes : int, optional
+            Maximum total size of the cached files in bytes.
+
+        offline : bool, optional
+            Never contact the server; only files already in the cache are returned.
+
+        timeout : int or float, optional
+            Number of seconds to wait for the server before giving up.
+
+        pool : ConnectionPool, optional
+            Pool of keep-alive connections used for downloads.
+
+        verify_interval : int or float, optional
+            Number of seconds after a file's last full download that update 
+            downloads it in full again (see update).
+
+    """
+
+    def __init__(self, cache_dir=default_cache_dir, ttl=default_ttl,
+                 max_bytes=default_max_bytes, offline=False, timeout=60, pool=None,
+                 verify_interval=default_verify_interval):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.verify_interval = verify_interval
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.timeout = timeout
+        self.pool = ConnectionPool(timeout=timeout) if pool is None else pool
+        self.index_path = os.path.join(cache_dir, 'index.json')
+        self.blob_dir = os.path.join(cache_dir, 'blobs')
+        self.hits = 0
+        self.transfers = 0
+        self._lock = threading.Lock()
+        self._index = None
+        self._unsaved = False
+
+        # Access times not yet written are saved when Python exits, without keeping the cache alive
+        flush = weakref.WeakMethod(self.flush)
+        atexit.register(lambda: flush() is not None and flush()())
+
+    def get(self, url):
+        """Function that returns the path to a local copy of the file at a url,
+        downloading it only if it is missing from the cache or has changed on
+        the server.
+
+            Parameters
+            ----------
+            url : str
+                Url of the file to download.
+
+
+            Returns
+            ------
+            path : str
+                Path to the cached copy of the file.
+
+        """
+
+        entry = self.entry(url)
+
+        if entry is not None and (self.offline or time.time() - entry['fetched'] < self.ttl):
+            path = self._hit(url)
+            # The entry may have been evicted by another thread since it was looked up
+            return self.get(url) if path is None else path
+
+        if self.offline:
+            raise FileNotFoundError(url + ' is not in the download cache and the cache is offline')
+
+        headers = {}
+        if entry is not None:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+
+        try:
+            status, response_headers, download = self._fetch(url, headers)
+        except (urllib.error.URLError, http.client.HTTPException, OSError) as error:
+            # Serve a stale copy rather than failing when the server cannot be reached
+            path = None if entry is None else self._hit(url)
+            if path is None:
+                raise
+            warnings.warn('Could not revalidate ' + url + ' (' + str(error) + '); using cached copy')
+            return path
+
+        if status == 304:
+            self._revalidated(url)
+            path = self._hit(url)
+            return self.get(url) if path is None else path
+
+        return self._register(url, download, response_headers)
+
+    def update(self, url, overlap=64 * 1024, verify=None):
+        """Function that brings the cached copy of a file that only grows at the end
+        up to date, transferring only the newly added bytes.  A range request asks
+        the server for the end of the file, starting "overlap" bytes before the end
+        of the cached copy; the overlapping bytes must be unchanged, otherwise the
+        earlier contents of the file were revised and it is downloaded in full.
+        Servers that do not support range requests send the whole file, which is
+        compared with the cached copy locally instead.
+
+        Only the overlapping bytes are checked, so a revision earlier in the file
+        is not seen when new bytes are appended.  The appended copy is therefore
+        stored without the server's ETag/Last-Modified, so the next revalidation 
+        by get downloads it in full, and once the last full download is older 
+        than "verify_interval" (or "verify" is True) update downloads the whole 
+        file and compares it with the cached copy instead of appending.  When the
+        server cannot be reached the cached copy is used, as it is by get.
+
+            Parameters
+            ----------
+            url : str
+                Url of the file to update.
+
+            overlap : int, optional
+                Number of already cached bytes requested again to check for revisions.
+
+            verify : bool, optional
+                Download the whole file (True) or only its end (False).  By default 
+                the whole file is downloaded once the last full download is older 
+                than "verify_interval".
+
+
+            Returns
+            ------
+            path : str
+                Path to the cached copy of the file.
+
+            appended_from : int or None
+                Byte position where newly appended data starts (equal to the file
+                size if nothing was added), or None if the file was downloaded for
+                the first time or its earlier contents changed.
+
+        """
+
+        entry = self.entry(url)
+
+        if entry is None:
+            return self.get(url), None
+
+        if self.offline:
+            path = self._hit(url)
+            return (self.get(url), None) if path is None else (path, entry['size'])
+
+        if verify is None:
+            verify = time.time() - entry.get('verified', entry['fetched']) >= self.verify_interval
+
+        old_size = entry['size']
+        start = max(old_size - overlap, 0)
+
+        # Without a range the server sends the whole file, which is compared with the cached copy
+        headers = {} if verify else {'Range': 'bytes=' + str(start) + '-'}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+
+        try:
+            status, response_headers, download, unchanged = self._fetch_end(url, headers, entry, start)
+        except (urllib.error.URLError, http.client.HTTPException, OSError) as error:
+            # Keep using the cached copy, as get does, when the server cannot be reached
+            path = self._hit(url)
+            if path is None:
+                raise
+            warnings.warn('Could not update ' + url + ' (' + str(error) + '); using cached copy')
+            return path, old_size
+
+        if status == 304:
+            self._revalidated(url)
+            path = self._hit(url)
+            return (self.get(url), None) if path is None else (path, old_size)
+
+        # The earlier contents changed (or the file is shorter), so the whole file is downloaded
+        if download is None:
+            if not verify:
+                return self.update(url, verify=True)[0], None
+            self.invalidate(url)
+            return self.get(url), None
+
+        # Only a whole downloaded file may be revalidated against the server's validators
+        path = self._register(url, download, response_headers, full=status == 200)
+
+        return path, old_size if unchanged else None
+
+    def verify(self, url):
+        """Function that downloads the whole file at a url again and compares it
+        with the cached copy (see update).
+
+            Parameters
+            ----------
+            url : str
+                Url of the file to verify.
+
+
+            Returns
+            ------
+            path : str
+                Path to the cached copy of the file.
+
+            appended_from : int or None
+                Byte position where newly appended data starts, or None if the 
+                earlier contents of the file changed (or it was not cached).
+
+        """
+
+        return self.update(url, verify=True)
+
+    def entry(self, url):
+        """Function that returns the cache index entry for a url (blob name, size,
+        ETag, Last-Modified and fetch, full download and access times), or None if 
+        it is not cached."""
+
+        with self._lock:
+            self._load_index()
+            entry = self._index.get(url)
+
+            if entry is not None and not os.path.exists(os.path.join(self.blob_dir, entry['blob'])):
+                del self._index[url]
+                entry = None
+
+            return None if entry is None else dict(entry)
+
+    def invalidate(self, url):
+        """Function that removes a url from the cache so the next request downloads it again."""
+
+        with self._lock:
+            self._load_index()
+            if self._index.pop(url, None) is not None:
+                self._remove_unused_blobs()
+                self._save_index()
+
+    def clear(self):
+        """Function that removes every file from the cache."""
+
+        with self._lock:
+            shutil.rmtree(self.cache_dir, ignore_errors=True)
+            self._index = {}
+            self._unsaved = False
+
+    def size(self):
+        """Function that returns the total size in bytes of the cached files."""
+
+        with self._lock:
+            self._load_index()
+            return sum(entry['size'] for entry in self._unique_blobs().values())
+
+    def _hit(self, url):
+        # Path to the cached copy of url, or None if it was evicted since it was looked up
+        with self._lock:
+            entry = self._index.get(url)
+            if entry is None:
+                return None
+
+            entry['accessed'] = time.time()
+            self.hits += 1
+            note(cache='hit')
+            self._unsaved = True
+
+            return os.path.join(self.blob_dir, entry['blob'])
+
+    def _revalidated(self, url):
+        with self._lock:
+            entry = self._index.get(url)
+            if entry is not None:
+                entry['fetched'] = entry['verified'] = time.time()
+                self._save_index()
+
+    def _register(self, url, download, response_headers, full=True):
+        blob, temp_path = download
+
+        with self._lock:
+            # Files are only moved into place while the index is locked, so eviction
+            # can never remove a file that is about to be registered
+            os.replace(temp_path, os.path.join(self.blob_dir, blob))
+
+            # A file partly made of earlier downloads may not match the server's version of
+            # it, so it keeps no validators and the time of its last full download
+            previous = self._index.get(url, {})
+            self._index[url] = {'blob': blob,
+                                'size': os.path.getsize(os.path.join(self.blob_dir, blob)),
+                                'etag': response_headers.get('ETag') if full else None,
+                                'last_modified': response_headers.get('Last-Modified') if full else None,
+                                'fetched': time.time(),
+                                'verified': time.time() if full else previous.get('verified', 
+                                                                                  previous.get('fetched', 0)),
+                                'accessed': time.time()}
+            self.transfers += 1
+            note(cache='transfer', bytes=self._index[url]['size'])
+            self._evict()
+            self._save_index()
+
+            return os.path.join(self.blob_dir, blob)
+
+    def _fetch(self, url, headers):
+        # Download the file at url into the blob directory
+        response, connection = self.pool.request(url, headers)
+
+        try:
+            if response.status == 304:
+                response.read()
+                return 304, response.headers, None
+
+            if response.status != 200:
+                raise urllib.error.HTTPError(url, response.status, response.reason, response.headers, None)
+
+            return response.status, response.headers, self._store(self._read_chunks(response), url)
+        finally:
+            self.pool.release(connection, response)
+
+    def _fetch_end(self, url, headers, entry, start):
+        # Download the end of the file at url (or all of it) and check it against the cached copy
+        old_path = os.path.join(self.blob_dir, entry['blob'])
+        old_size = entry['size']
+        response, connection = self.pool.request(url, headers)
+
+        try:
+            if response.status == 304:
+                response.read()
+                return 304, response.headers, None, True
+
+            if response.status == 416:
+                # The file is now shorter than the cached copy
+                response.read()
+                return 416, response.headers, None, False
+
+            if response.status == 206:
+                with open(old_path, 'rb') as old_file:
+                    old_file.seek(start)
+                    unchanged = response.read(old_size - start) == old_file.read()
+
+                content_range = response.getheader('Content-Range', '')
+                if not (unchanged and content_range.startswith('bytes ' + str(start) + '-')):
+                    response.read()
+                    return 206, response.headers, None, False
+
+                return 206, response.headers, self._store(itertools.chain(self._read_chunks(old_path),
+                                                                          self._read_chunks(response)), url), True
+
+            if response.status == 200:
+                # The whole file was sent (or the server ignored the range), so compare its start locally
+                prefix = response.read(old_size)
+                unchanged = hashlib.sha256(prefix).hexdigest() == os.path.splitext(entry['blob'])[0]
+                return 200, response.headers, self._store(itertools.chain([prefix], self._read_chunks(response)),
+                                                          url), unchanged
+
+            raise urllib.error.HTTPError(url, response.status, response.reason, response.headers, None)
+        finally:
+            self.pool.release(connection, response)
+
+    def _read_chunks(self, source, chunk_size=1024 * 1024):
+        # Read a response or a file path in chunks
+        if isinstance(source, str):
+            with open(source, 'rb') as source_file:
+                yield from iter(lambda: source_file.read(chunk_size), b'')
+        else:
+            yield from iter(lambda: source.read(chunk_size), b'')
+
+    def _store(self, chunks, url):
+        # Write chunks of a file into the blob directory while hashing them
+        os.makedirs(self.blob_dir, exist_ok=True)
+        extension = os.path.splitext(urllib.parse.urlsplit(url).path)[1]
+        digest = hashlib.sha256()
+
+        file_handle, temp_path = tempfile.mkstemp(dir=self.blob_dir, suffix='.part')
+        try:
+            with os.fdopen(file_handle, 'wb') as temp_file:
+                for chunk in chunks:
+                    digest.update(chunk)
+                    temp_file.write(chunk)
+
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+        return digest.hexdigest() + extension, temp_path
+
+    def flush(self):
+        """Function that writes access times kept in memory to the cache index."""
+
+        with self._lock:
+            if self._unsaved:
+                self._save_index()
+
+    def _load_index(self):
+        if self._index is not None:
+            return
+
+        try:
+            with open(self.index_path) as index_file:
+                self._index = json.load(index_file)
+        except (OSError, ValueError):
+            self._index = {}
+
+    def _save_index(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        temp_path = self.index_path + '.part'
+
+        with open(temp_path, 'w') as index_file:
+            json.dump(self._index, index_file, indent=1)
+
+        os.replace(temp_path, self.index_path)
+        self._unsaved = False
+
+    def _unique_blobs(self):
+        # Most recent access of each blob, as several urls may share the same contents
+        blobs = {}
+        for entry in self._index.values():
+            if entry['blob'] not in blobs or entry['accessed'] > blobs[entry['blob']]['accessed']:
+                blobs[entry['blob']] = entry
+        return blobs
+
+    def _evict(self):
+        # Remove the least recently used files until the cache fits within max_bytes
+        blobs = sorted(self._unique_blobs().values(), key=lambda entry: entry['accessed'])
+        total_size = sum(entry['size'] for entry in blobs)
+
+        # The most recently used file is always kept, even if it is larger than max_bytes
+        for entry in blobs[:-1]:
+            if total_size <= self.max_bytes:
+                break
+
+            for url in [url for url, value in self._index.items() if value['blob'] == entry['blob']]:
+                del self._index[url]
+            total_size -= entry['size']
+
+        self._remove_unused_blobs()
+
+    def _remove_unused_blobs(self):
+        if not os.path.isdir(self.blob_dir):
+            return
+
+        used_blobs = {entry['blob'] for entry in self._index.values()}
+        for blob in os.listdir(self.blob_dir):
+            if blob not in used_blobs and not blob.endswith('.part'):
+                os.remove(os.path.join(self.blob_dir, blob))
+
+
+# In[5]:
+
+
+# Cache shared by every download in a session
+default_cache = DownloadCache()
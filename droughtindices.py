@@ -0,0 +1,414 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[1]:
+
+
+# Import necessary libraries
+import numpy as np
+import pandas as pd
+import customfunctions
+from crossstation import correlation_from_sums
+from instrumentation import instrumented
+
+
+# In[2]:
+
+
+# Columns of a table of drought index values, one row per station, index and date
+index_columns = ['station', 'index', 'date', 'value']
+
+# Columns of the table of lagged correlations returned by compare_indices
+comparison_columns = ['station', 'timescale', 'depth', 'index', 'lag', 'correlation', 'periods']
+
+# Number of csv rows read at a time, and number of time steps read at a time from gridded files
+default_chunksize = 100000
+default_time_block = 365
+
+# Largest lag (in periods) and minimum number of periods with both values for a correlation
+default_max_lag = 6
+default_min_periods = 10
+
+# Functions returning the z-score table of each timescale the indices are compared on
+zscore_functions = {'month': customfunctions.monthly_mean_zscore,
+                    'decad': customfunctions.decad_zscore,
+                    'pentad': customfunctions.pentad_zscore}
+
+
+# In[3]:
+
+
+def _daily_sums(index_df):
+    # Sum and number of values of each station, index and day, which can be added up across chunks
+    index_df = index_df.dropna(subset=['date', 'value'])
+    grouped = index_df.groupby(['station', 'index', 'date'], sort=False, observed=True)['value']
+
+    return pd.DataFrame({'total': grouped.sum(), 'count': grouped.count()})
+
+
+def _combine(partial_sums):
+    if not partial_sums:
+        return pd.DataFrame(columns=index_columns)
+
+    sums = pd.concat(partial_sums).groupby(level=['station', 'index', 'date']).sum()
+    index_df = (sums['total'] / sums['count']).rename('value').reset_index()
+
+    return index_df.sort_values(['station', 'index', 'date'], ignore_index=True)[index_columns]
+
+
+@instrumented
+def read_index_csv(path, station_name=None, date_column='date', station_column='station',
+                   chunksize=default_chunksize):
+    """Function that reads drought index values (e.g. LERI, PDSI, SPEI or EDDI
+    exported for station locations) from a csv file, "chunksize" rows at a
+    time, so the file never has to fit in memory.  The file can be in long
+    format, with "index" and "value" columns, or in wide format, with one column
+    per index named after it.  Values given more than once for the same station,
+    index and day are averaged.
+
+        Parameters
+        ----------
+        path : str
+            Path to the csv file.
+
+        station_name : str, optional
+            Station the values belong to, for files without a station column.
+
+        date_column : str, optional
+            Name of the date column.
+
+        station_column : str, optional
+            Name of the station column.
+
+        chunksize : int, optional
+            Number of rows read at a time.  Defaults to "default_chunksize".
+
+
+        Returns
+        ------
+        index_df : dataframe
+            Dataframe with station, index, date and value columns (see "index_columns").
+    """
+
+    partial_sums = []
+
+    for chunk in pd.read_csv(path, chunksize=chunksize):
+        if station_column not in chunk.columns:
+            if station_name is None:
+                raise ValueError('A station name is needed for files without a "' + station_column + '" column')
+            chunk[station_column] = station_name
+
+        if 'index' not in chunk.columns:
+            value_columns = [column for column in chunk.columns if column not in (date_column, station_column)]
+            chunk = chunk.melt(id_vars=[station_column, date_column], value_vars=value_columns,
+                               var_name='index', value_name='value')
+
+        chunk = pd.DataFrame({'station': chunk[station_column].astype(str),
+                              'index': chunk['index'].astype(str),
+                              'date': pd.to_datetime(chunk[date_column], errors='coerce').dt.normalize(),
+                              'value': pd.to_numeric(chunk['value'], errors='coerce')})
+
+        partial_sums.append(_daily_sums(chunk))
+
+    return _combine(partial_sums)
+
+
+@instrumented
+def read_index_netcdf(path, variable, stations, index_name=None, lat_name='lat', lon_name='lon',
+                      time_name='time', time_block=default_time_block):
+    """Function that extracts drought index values at station locations from a
+    gridded NetCDF file (or any file xarray can open), using the grid cell
+    nearest each station.  The file is opened lazily and read "time_block"
+    time steps at a time, so only the values at the stations are ever held in
+    memory.  Needs the optional xarray package (and a NetCDF backend such as
+    netCDF4 or h5netcdf).
+
+        Parameters
+        ----------
+        path : str
+            Path to the gridded file.
+
+        variable : str
+            Name of the variable holding the index values.
+
+        stations : dictionary
+            Latitude and longitude of each station, e.g. {'Nunn #2017': (40.9, -104.7)}.
+
+        index_name : str, optional
+            Name to give the index.  Defaults to the variable name.
+
+        lat_name, lon_name, time_name : str, optional
+            Names of the latitude, longitude and time coordinates.
+
+        time_block : int, optional
+            Number of time steps read at a time.  Defaults to "default_time_block".
+
+
+        Returns
+        ------
+        index_df : dataframe
+            Dataframe with station, index, date and value columns (see "index_columns").
+    """
+
+    try:
+        import xarray as xr
+    except ImportError:
+        raise ImportError('Reading gridded drought index files needs the xarray package '
+                          '(e.g. conda install xarray netcdf4)')
+
+    station_names = list(stations)
+    latitudes = xr.DataArray([stations[name][0] for name in station_names], dims='station')
+    longitudes = xr.DataArray([stations[name][1] for name in station_names], dims='station')
+
+    partial_sums = []
+
+    with xr.open_dataset(path) as dataset:
+        # Nearest grid cell of every station, selected together; nothing is read yet
+        points = dataset[variable].sel({lat_name: latitudes, lon_name: longitudes}, method='nearest')
+        points = points.transpose(time_name, 'station')
+
+        for start in range(0, points.sizes[time_name], time_block):
+            block = points.isel({time_name: slice(start, start + time_block)})
+            values = np.asarray(block.values, dtype='float64')
+            dates = pd.to_datetime(np.asarray(block[time_name].values)).normalize()
+
+            partial_sums.append(_daily_sums(pd.DataFrame({
+                'station': np.tile(np.array(station_names, dtype=object), len(dates)),
+                'index': index_name or variable,
+                'date': np.repeat(dates, len(station_names)),
+                'value': values.ravel()})))
+
+    return _combine(partial_sums)
+
+
+# In[4]:
+
+
+def _full_index(years, timescale):
+    group_columns = customfunctions.timescale_rules[timescale][0]
+    group_lists = {'year': years, 'month': customfunctions.month_list_all,
+                   'decad': customfunctions.decad_list_all, 'pentad': customfunctions.pentad_list_all}
+
+    return pd.MultiIndex.from_product([group_lists[column] for column in group_columns], names=group_columns)
+
+
+@instrumented
+def index_periods(index_df, timescale):
+    """Function that averages drought index values over each month, decad or
+    pentad, matching the periods of the soil moisture z-scores.  Periods with no
+    value of an index are left out.
+
+        Parameters
+        ----------
+        index_df : dataframe
+            Dataframe of index values (see "index_columns").
+
+        timescale : str
+            Timescale of the periods ('month', 'decad' or 'pentad').
+
+
+        Returns
+        ------
+        period_df : dataframe
+            Dataframe indexed by station, year, month and (for decads and pentads)
+            period with a column for each index.
+    """
+
+    dates = pd.DatetimeIndex(index_df['date'])
+    day = dates.day.to_numpy()
+
+    keys = {'station': index_df['station'].to_numpy(), 'year': dates.year.to_numpy(),
+            'month': np.asarray(customfunctions.month_list_all, dtype=object)[dates.month.to_numpy() - 1],
+            'decad': np.asarray(customfunctions.decad_list_all, dtype=object)[np.minimum((day - 1) // 10, 2)],
+            'pentad': np.asarray(customfunctions.pentad_list_all, dtype=object)[np.minimum((day - 1) // 5, 5)]}
+
+    group_columns = ['station'] + customfunctions.timescale_rules[timescale][0]
+    grouped = pd.DataFrame({**{column: keys[column] for column in group_columns},
+                            'index': index_df['index'].to_numpy(), 'value': index_df['value'].to_numpy()})
+
+    period_df = grouped.groupby(group_columns + ['index'], sort=False)['value'].mean().unstack('index')
+    period_df.columns.name = None
+
+    return period_df
+
+
+def zscore_table(dataframe, timescale):
+    """Function that returns the z-scores of a station's month, decad or pentad
+    means (from customfunctions.monthly_mean_zscore, decad_zscore or
+    pentad_zscore) indexed by year, month and (for decads and pentads) period."""
+
+    zscore_df = zscore_functions[timescale](dataframe)
+
+    if timescale == 'month':
+        zscore_df = zscore_df.reset_index().set_index(['year', 'month'])
+    else:
+        zscore_df = zscore_df.set_index(['month', timescale], append=True)
+
+    return zscore_df[list(customfunctions.depth_list_all)]
+
+
+# In[5]:
+
+
+def lagged_cross_correlation(first, second, max_lag, min_periods=default_min_periods):
+    """Function that calculates the correlation of every series of "first" with
+    every series of "second", for every group (e.g. station) and every lag from
+    -"max_lag" to "max_lag" time steps, over the time steps on which both have
+    data.  The correlation at lag k is the correlation of the first series at
+    time t with the second at time t + k.  Every group and pair of series is
+    calculated at once with one set of batched matrix products per lag.
+
+        Parameters
+        ----------
+        first : array
+            Array with shape (group, time, series), with NaN for missing values.
+
+        second : array
+            Array with shape (group, time, series) on the same time steps.
+
+        max_lag : int
+            Largest lag in time steps.
+
+        min_periods : int, optional
+            Minimum number of time steps with both values.  Defaults to
+            "default_min_periods".
+
+
+        Returns
+        ------
+        correlation : array
+            Correlations with shape (group, lag, first series, second series).
+
+        count : array
+            Number of time steps used for each correlation, with the same shape.
+    """
+
+    centred = []
+    for values in (first, second):
+        # Each series is centred on its mean, so the sums stay small
+        valid = ~np.isnan(values)
+        total = np.where(valid, values, 0.0).sum(axis=1, keepdims=True)
+        count = valid.sum(axis=1, keepdims=True)
+        centre = np.divide(total, count, out=np.zeros_like(total), where=count > 0)
+        centred.append((np.where(valid, values - centre, 0.0), valid.astype('float64')))
+
+    (values_a, valid_a), (values_b, valid_b) = centred
+    length = first.shape[1]
+    max_lag = min(max_lag, max(length - 1, 0))
+
+    sums = []
+    for lag in range(-max_lag, max_lag + 1):
+        if lag >= 0:
+            part_a, part_b = slice(0, length - lag), slice(lag, length)
+        else:
+            part_a, part_b = slice(-lag, length), slice(0, length + lag)
+
+        a, mask_a = values_a[:, part_a].transpose(0, 2, 1), valid_a[:, part_a].transpose(0, 2, 1)
+        b, mask_b = values_b[:, part_b], valid_b[:, part_b]
+
+        sums.append([mask_a @ mask_b, a @ mask_b, mask_a @ b, (a ** 2) @ mask_b, mask_a @ b ** 2, a @ b])
+
+    count, sum_a, sum_b, squares_a, squares_b, products = np.array(sums).transpose(1, 2, 0, 3, 4)
+    correlation = correlation_from_sums(count, sum_a, sum_b, squares_a, squares_b, products, min_periods)
+
+    return correlation, np.round(count).astype('int64')
+
+
+@instrumented
+def compare_indices(dictionary, index_df, station_names=None, timescales=tuple(zscore_functions),
+                    max_lag=default_max_lag, min_periods=default_min_periods):
+    """Function that compares the soil moisture z-scores of each station and
+    depth with each drought index at that station: the correlation of the
+    z-scores with the index values averaged over the same months, decads or
+    pentads, for every lag from -"max_lag" to "max_lag" periods.  A positive lag
+    means the index follows soil moisture.  All stations, depths, indices and
+    lags of a timescale are calculated together (see lagged_cross_correlation).
+
+        Parameters
+        ----------
+        dictionary : dictionary
+            Dictionary of station dataframes (e.g. imports.soil_moisture_dict).
+
+        index_df : dataframe
+            Dataframe of index values (see read_index_csv and read_index_netcdf).
+
+        station_names : list, optional
+            Stations to compare.  Defaults to every station of the dictionary
+            with index values.
+
+        timescales : list, optional
+            Timescales to compare on ('month', 'decad' and/or 'pentad').
+
+        max_lag : int, optional
+            Largest lag in periods.  Defaults to "default_max_lag".
+
+        min_periods : int, optional
+            Minimum number of periods with both values.  Defaults to
+            "default_min_periods".
+
+
+        Returns
+        ------
+        comparison_df : dataframe
+            Dataframe with one row per station, timescale, depth, index and lag
+            (see "comparison_columns"), including the number of periods used.
+    """
+
+    if station_names is None:
+        index_stations = set(index_df['station'])
+        station_names = [station_name for station_name in dictionary if station_name in index_stations]
+
+    if hasattr(dictionary, 'load'):
+        dictionary.load(station_names)
+
+    depths = list(customfunctions.depth_list_all)
+    index_names = sorted(set(index_df['index']))
+    index_years = pd.DatetimeIndex(index_df['date']).year
+
+    tables = []
+
+    for timescale in timescales:
+        zscores = {station_name: zscore_table(dictionary[station_name], timescale) for station_name in station_names}
+        period_df = index_periods(index_df, timescale)
+
+        # Every station is put on the same sequence of periods, covering both data sets
+        years = [year for table in zscores.values() for year in table.index.get_level_values(0)]
+        years += list(index_years)
+        if not years or not station_names:
+            continue
+        full_index = _full_index(list(range(min(years), max(years) + 1)), timescale)
+
+        first = np.stack([zscores[station_name].reindex(full_index).to_numpy(dtype='float64')
+                          for station_name in station_names])
+        second = np.stack([_station_periods(period_df, station_name, full_index, index_names)
+                           for station_name in station_names])
+
+        correlation, count = lagged_cross_correlation(first, second, max_lag, min_periods)
+        lags = np.arange(-(correlation.shape[1] // 2), correlation.shape[1] // 2 + 1)
+
+        # One row per station, depth, index and lag
+        correlation, count = correlation.transpose(0, 2, 3, 1), count.transpose(0, 2, 3, 1)
+        shape = correlation.shape
+        tables.append(pd.DataFrame({'station': np.repeat(np.array(station_names, dtype=object), np.prod(shape[1:])),
+                                    'timescale': timescale,
+                                    'depth': np.tile(np.repeat(np.array(depths, dtype=object), shape[2] * shape[3]),
+                                                     shape[0]),
+                                    'index': np.tile(np.repeat(np.array(index_names, dtype=object), shape[3]),
+                                                     shape[0] * shape[1]),
+                                    'lag': np.tile(lags, np.prod(shape[:3])),
+                                    'correlation': correlation.ravel(),
+                                    'periods': count.ravel()}, columns=comparison_columns))
+
+    if not tables:
+        return pd.DataFrame(columns=comparison_columns)
+
+    return pd.concat(tables, ignore_index=True)
+
+
+def _station_periods(period_df, station_name, full_index, index_names):
+    if station_name not in period_df.index.get_level_values(0):
+        return np.full((len(full_index), len(index_names)), np.nan)
+
+    station_df = period_df.xs(station_name, level=0).reindex(columns=index_names)
+
+    return station_df.reindex(full_index).to_numpy(dtype='float64')
@@ -0,0 +1,385 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[1]:
+
+
+# Import necessary libraries
+import os
+import numpy as np
+import pandas as pd
+import customfunctions
+from imports import station_schema_version, daily_to_df
+from downloadcache import default_cache
+from snapshots import default_snapshot_dir, snapshot_path, save_snapshot, load_snapshot
+from instrumentation import instrumented, stage, note
+from stationindex import station_index
+
+
+# In[2]:
+
+
+# Number of hourly csv rows read at a time
+default_chunksize = 500000
+
+# Minimum number of valid hourly readings of a depth for its daily mean to be used
+default_min_hours = 18
+
+# Bits of the daily coverage flag of each depth (see HourlyAccumulator.daily)
+hourly_flags = {'no_data': 1, 'few_hours': 2}
+
+# Version of the daily layout built from hourly files; increase this whenever
+# HourlyAccumulator.daily changes so that any saved hourly snapshots are rebuilt
+hourly_schema_version = 1
+
+
+# In[3]:
+
+
+class HourlyAccumulator:
+    """Running daily sums of hourly soil moisture readings for one station.  For
+    every day it keeps the number of readings and the number and sum of valid
+    (non-NaN) readings of each depth, so hourly files are reduced to days as
+    they are read rather than after every row is in memory.  Chunks can be added
+    in any order (a day split across two chunks or files is simply added to),
+    and accumulators built from different files of the same station are
+    combined with merge.
+
+        Parameters
+        ----------
+        depths : list, optional
+            Names of the depth columns.  Defaults to customfunctions.depth_list_all.
+
+    """
+
+    def __init__(self, depths=customfunctions.depth_list_all):
+        self.depths = list(depths)
+        self.rows = 0
+        self.skipped = 0
+        self.sums = None
+
+    def add(self, chunk, date_column='date', date_format=None):
+        """Function that adds a chunk of hourly readings, with a date (or date and
+        time) column and a column for each depth.  Rows whose date cannot be read
+        are skipped and counted in "skipped".
+
+            Parameters
+            ----------
+            chunk : dataframe
+                Hourly readings to add.
+
+            date_column : str, optional
+                Name of the column holding the date or time of each reading.
+
+            date_format : str, optional
+                Format of the date column (e.g. '%Y-%m-%d %H:%M'), which makes
+                reading it faster.  Inferred by default.
+
+
+            Returns
+            ------
+            accumulator : HourlyAccumulator
+                This accumulator, so calls can be chained.
+        """
+
+        times = pd.to_datetime(chunk[date_column], format=date_format, errors='coerce').to_numpy()
+        valid_time = ~np.isnat(times)
+        days = times[valid_time].astype('datetime64[D]').astype('int64')
+
+        # Each reading's day is numbered within the chunk, and every sum is one bincount over those numbers
+        chunk_days, positions = np.unique(days, return_inverse=True)
+        positions = positions.ravel()
+        columns = {'rows': np.bincount(positions, minlength=len(chunk_days))}
+
+        for depth in self.depths:
+            values = chunk[depth].to_numpy(dtype='float64')[valid_time]
+            valid = ~np.isnan(values)
+            columns['count_' + depth] = np.bincount(positions, weights=valid, minlength=len(chunk_days))
+            columns['total_' + depth] = np.bincount(positions, weights=np.where(valid, values, 0.0),
+                                                    minlength=len(chunk_days))
+
+        self._add_sums(pd.DataFrame(columns, index=pd.Index(chunk_days, name='day')))
+
+        self.rows += int(valid_time.sum())
+        self.skipped += int(len(chunk) - valid_time.sum())
+
+        return self
+
+    def _add_sums(self, sums):
+        if self.sums is None:
+            self.sums = sums
+        else:
+            self.sums = self.sums.add(sums, fill_value=0)
+
+    def merge(self, other):
+        """Function that combines this accumulator with another one holding other
+        readings of the same station and returns the combined accumulator.
+
+            Parameters
+            ----------
+            other : HourlyAccumulator
+                Accumulator to combine with.
+
+
+            Returns
+            ------
+            accumulator : HourlyAccumulator
+                Combined accumulator; neither input is changed.
+        """
+
+        if other.depths != self.depths:
+            raise ValueError('Only accumulators with the same depths can be merged')
+
+        accumulator = HourlyAccumulator(self.depths)
+        accumulator.rows = self.rows + other.rows
+        accumulator.skipped = self.skipped + other.skipped
+        accumulator.sums = self.sums
+
+        if other.sums is not None:
+            accumulator._add_sums(other.sums)
+
+        return accumulator
+
+    def daily(self, min_hours=default_min_hours):
+        """Function that calculates daily mean soil moisture from the accumulated
+        readings, in the layout of imports.csv_to_df (so every function of
+        customfunctions works on it unchanged), with a coverage table for the
+        same days.  A depth's daily mean is set as NaN unless it has at least
+        "min_hours" valid readings that day.
+
+            Parameters
+            ----------
+            min_hours : int or dictionary, optional
+                Minimum number of valid readings per day, for every depth or as a
+                dictionary by depth (depths left out use "default_min_hours").
+
+
+            Returns
+            ------
+            output_dataframe : dataframe
+                Dataframe of daily soil moisture for each day with readings, in
+                date order.
+
+            coverage_df : dataframe
+                Dataframe with a row for each row of "output_dataframe", showing the
+                number of readings ("hours"), and for each depth the number of valid
+                readings ("<depth>_hours") and the coverage flag ("<depth>_flag",
+                made of the bits of "hourly_flags"; 0 where the mean was used).
+        """
+
+        if not isinstance(min_hours, dict):
+            min_hours = {depth: min_hours for depth in self.depths}
+
+        sums = self.sums
+        if sums is None:
+            sums = pd.DataFrame(0, index=pd.Index([], dtype='int64', name='day'),
+                                columns=['rows'] + ['count_' + depth for depth in self.depths]
+                                + ['total_' + depth for depth in self.depths])
+        sums = sums.sort_index()
+
+        dates = pd.DatetimeIndex(sums.index.to_numpy().astype('int64').astype('datetime64[D]'))
+        daily = pd.DataFrame({'year': dates.year.to_numpy().astype('int16'),
+                              'month': dates.month.to_numpy().astype('int8'),
+                              'day': dates.day.to_numpy().astype('int8'),
+                              'doy': dates.dayofyear.to_numpy().astype('int16')})
+        coverage_df = pd.DataFrame({'hours': sums['rows'].to_numpy().astype('int32')})
+
+        for depth in self.depths:
+            count = sums['count_' + depth].to_numpy()
+            enough = count >= min_hours.get(depth, default_min_hours)
+
+            with np.errstate(invalid='ignore', divide='ignore'):
+                mean = sums['total_' + depth].to_numpy() / count
+
+            daily[depth] = np.where(enough, mean, np.nan).astype('float32')
+            coverage_df[depth + '_hours'] = count.astype('int32')
+            coverage_df[depth + '_flag'] = np.where(count == 0, hourly_flags['no_data'],
+                                                    np.where(enough, 0, hourly_flags['few_hours'])).astype('uint8')
+
+        return daily, coverage_df
+
+
+# In[4]:
+
+
+@instrumented
+def accumulate_hourly_csv(path_to_data, depths=customfunctions.depth_list_all, date_column='date',
+                          date_format=None, chunksize=default_chunksize, accumulator=None):
+    """Function that reads an hourly station csv file "chunksize" rows at a time
+    and adds each chunk to an HourlyAccumulator, so the file is reduced to daily
+    sums without ever holding all of its rows in memory.
+
+        Parameters
+        ----------
+        path_to_data : str
+            Path to an hourly station csv file.
+
+        depths : list, optional
+            Depth columns to read.  Defaults to customfunctions.depth_list_all.
+
+        date_column : str, optional
+            Name of the column holding the date and time of each reading.
+
+        date_format : str, optional
+            Format of the date column.  Inferred by default.
+
+        chunksize : int, optional
+            Number of rows read at a time.  Defaults to "default_chunksize".
+
+        accumulator : HourlyAccumulator, optional
+            Accumulator to add the readings to (e.g. one holding earlier files of
+            the same station).  A new one is created by default.
+
+
+        Returns
+        ------
+        accumulator : HourlyAccumulator
+            Accumulator holding the file's readings.
+    """
+
+    if accumulator is None:
+        accumulator = HourlyAccumulator(depths)
+
+    dtypes = {depth: 'float32' for depth in accumulator.depths}
+    dtypes[date_column] = str
+
+    for chunk in pd.read_csv(path_to_data, usecols=[date_column] + list(accumulator.depths), dtype=dtypes,
+                             chunksize=chunksize):
+        accumulator.add(chunk, date_column, date_format)
+
+    return accumulator
+
+
+@instrumented
+def hourly_csv_to_df(path_to_data, station_name, min_hours=default_min_hours, date_column='date',
+                     date_format=None, chunksize=default_chunksize):
+    """Function that takes a path to an hourly station csv file and imports it
+    as daily data in the layout of imports.csv_to_df (see accumulate_hourly_csv
+    and HourlyAccumulator.daily).
+
+        Parameters
+        ----------
+        path_to_data : str
+            Path to an hourly station csv file.
+
+        station_name : str
+            Name of the station for the data being imported.
+
+        min_hours : int or dictionary, optional
+            Minimum number of valid readings per day, for every depth or by depth.
+
+        date_column : str, optional
+            Name of the column holding the date and time of each reading.
+
+        date_format : str, optional
+            Format of the date column.  Inferred by default.
+
+        chunksize : int, optional
+            Number of rows read at a time.  Defaults to "default_chunksize".
+
+
+        Returns
+        ------
+        output_dataframe : dataframe
+            Dataframe containing the daily station data.
+
+        coverage_df : dataframe
+            Daily coverage of the hourly readings (see HourlyAccumulator.daily).
+    """
+
+    accumulator = accumulate_hourly_csv(path_to_data, customfunctions.depth_list_all, date_column, date_format,
+                                        chunksize)
+    daily, coverage_df = accumulator.daily(min_hours)
+
+    return daily_to_df(daily, station_name), coverage_df
+
+
+# In[5]:
+
+
+def hourly_url_to_df(url, station_name, dictionary, cache=None, snapshot_dir=default_snapshot_dir,
+                     min_hours=default_min_hours, date_column='date', date_format=None, coverage=None):
+    """Function that takes a url to an hourly csv file and downloads and imports
+    it as daily data using hourly_csv_to_df, in the same way url_to_df does for
+    daily files: downloads are kept in the local cache, and the daily dataframe
+    and its coverage are saved as a snapshot that is rebuilt when the file or
+    "min_hours" changes.
+
+        Parameters
+        ----------
+        url : url to csv file
+            Input url to an hourly csv file.
+
+        station_name : str
+            Name of the station for the data being imported and downloaded.
+
+        dictionary : dictionary
+            Dictionary for the created dataframe to be exported to.
+
+        cache : DownloadCache, optional
+            Download cache to use.  Defaults to the shared cache in downloadcache.py.
+
+        snapshot_dir : str, optional
+            Directory to save station snapshots to.  Set as None to always parse
+            the csv file.
+
+        min_hours : int or dictionary, optional
+            Minimum number of valid readings per day, for every depth or by depth.
+
+        date_column : str, optional
+            Name of the column holding the date and time of each reading.
+
+        date_format : str, optional
+            Format of the date column.  Inferred by default.
+
+        coverage : dictionary, optional
+            Dictionary for the daily coverage of the station to be exported to.
+
+        Returns
+        ------
+        No physical return; Returns the daily dataframe to the input dictionary
+        specified (and its coverage to "coverage").
+    """
+
+    if cache is None:
+        cache = default_cache
+
+    with stage('hourly_url_to_df', station_name):
+        with stage('download', station_name):
+            path_to_data = cache.get(url)
+
+        versions = {'schema': station_schema_version, 'hourly': hourly_schema_version,
+                    'source': os.path.basename(path_to_data), 'min_hours': min_hours}
+        station_snapshot = None if snapshot_dir is None else snapshot_path(snapshot_dir, station_name + ' hourly')
+        saved_dataframe = None
+
+        if station_snapshot is not None:
+            with stage('load_snapshot', station_name):
+                saved_dataframe = load_snapshot(station_snapshot, versions)
+                note(snapshot='miss' if saved_dataframe is None else 'hit')
+
+        if saved_dataframe is None:
+            with stage('read_csv', station_name):
+                output_dataframe, coverage_df = hourly_csv_to_df(path_to_data, station_name, min_hours,
+                                                                 date_column, date_format)
+                note(rows_out=len(output_dataframe))
+
+            # The daily dataframe and its coverage are saved side by side in one snapshot
+            if station_snapshot is not None:
+                with stage('save_snapshot', station_name, len(output_dataframe)):
+                    save_snapshot(pd.concat([output_dataframe, coverage_df], axis=1), station_snapshot, versions)
+
+        else:
+            coverage_columns = ['hours'] + [column for depth in customfunctions.depth_list_all
+                                            for column in (depth + '_hours', depth + '_flag')]
+            output_dataframe = saved_dataframe.drop(columns=coverage_columns)
+            coverage_df = saved_dataframe[coverage_columns]
+
+        note(rows_out=len(output_dataframe))
+
+        station_index(output_dataframe)
+
+        dictionary.update({station_name: output_dataframe})
+
+        if coverage is not None:
+            coverage.update({station_name: coverage_df})
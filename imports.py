@@ -5,11 +5,19 @@
 
 
 # Import necessary libraries
+import io
 import os
-import earthpy as et
 import warnings
+import numpy as np
 import pandas as pd
-import earthpy.plot as ep
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from downloadcache import default_cache
+from snapshots import default_snapshot_dir, snapshot_path, save_snapshot, load_snapshot
+from instrumentation import stage, note
+from stationindex import station_index
 
 # Ignore warnings
 warnings.simplefilter('ignore')
@@ -18,12 +26,159 @@ warnings.simplefilter('ignore')
 # In[2]:
 
 
-def url_to_df(url, station_name, dictionary):
-    """Function that takes a url to a csv file and downloads and 
-    imports the data contained at the url. Then, it changes the station name 
-    in the new dataframe to an input name given (ideally the name of the station),
-    removes any unnecessary columns of data, and changes the month names from int 
-    to str month name format.
+# Version of the dataframe layout built by csv_to_df; increase this whenever csv_to_df 
+# changes so that any saved station snapshots are rebuilt
+station_schema_version = 2
+
+# Columns read from each station csv file, and the compact data type each is stored as.  Dates are 
+# read as nullable integers so that blank fields are read as missing (see daily_to_df)
+station_csv_dtypes = {'year': 'Int16', 'month': 'Int8', 'day': 'Int8', 'doy': 'Int16',
+                      'sm_5cm': 'float32', 'sm_10cm': 'float32', 'sm_20cm': 'float32', 
+                      'sm_50cm': 'float32', 'sm_100cm': 'float32'}
+
+month_names = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+decad_names = ['decad0', 'decad1', 'decad2']
+pentad_names = ['pentad0', 'pentad1', 'pentad2', 'pentad3', 'pentad4', 'pentad5']
+
+
+def csv_to_df(path_to_data, station_name):
+    """Function that takes a path to a downloaded station csv file and imports 
+    the data it contains.  Only the needed columns are read, using compact data 
+    types (float32 soil moisture, small integers for dates and categoricals for 
+    station, month, decad and pentad).  The station name is set to an input name 
+    given (ideally the name of the station), the month is stored by its 3-letter 
+    name and the decad and pentad of each day are added.
+
+        Parameters
+        ----------
+        path_to_data : str
+            Path to a station csv file.
+
+        station_name : str
+            Name of the station for the data being imported.
+
+        Returns
+        ------
+        output_dataframe : dataframe
+            Dataframe containing the cleaned station data.
+    """
+    
+    dataframe = pd.read_csv(path_to_data, usecols=list(station_csv_dtypes), dtype=station_csv_dtypes)
+    
+    return daily_to_df(dataframe, station_name)
+
+
+def daily_to_df(dataframe, station_name):
+    """Function that takes a dataframe of daily station data with numeric year, 
+    month, day and doy columns and a column for each depth (as read from a 
+    station csv file) and returns it in the layout built by csv_to_df.  Year, 
+    day and doy are stored as small integers, or as float32 (NaN where missing) 
+    if a field is blank; a missing or invalid month or day (outside 1..12 or 
+    1..31) gives a missing month, decad and pentad.
+
+        Parameters
+        ----------
+        dataframe : dataframe
+            Dataframe of daily station data.
+
+        station_name : str
+            Name of the station for the data.
+
+        Returns
+        ------
+        output_dataframe : dataframe
+            Dataframe containing the cleaned station data.
+    """
+    
+    month = dataframe['month'].to_numpy(dtype='int64', na_value=0)
+    day = dataframe['day'].to_numpy(dtype='int64', na_value=0)
+    valid_month = (month >= 1) & (month <= 12)
+    valid_day = valid_month & (day >= 1) & (day <= 31)
+    
+    # Categorical codes are calculated directly; -1 marks a missing value
+    station_codes = np.zeros(len(dataframe), dtype='int8')
+    month_codes = np.where(valid_month, month - 1, -1)
+    decad_codes = np.where(valid_day, np.minimum((day - 1) // 10, 2), -1)
+    pentad_codes = np.where(valid_day, np.minimum((day - 1) // 5, 5), -1)
+    
+    output_dataframe = pd.DataFrame({
+        'Station ID': pd.Categorical.from_codes(station_codes, [station_name]),
+        'year': _date_values(dataframe['year']),
+        'month': pd.Categorical.from_codes(month_codes.astype('int8'), month_names, ordered=True),
+        'day': _date_values(dataframe['day']),
+        'doy': _date_values(dataframe['doy']),
+        'sm_5cm': dataframe['sm_5cm'],
+        'sm_10cm': dataframe['sm_10cm'],
+        'sm_20cm': dataframe['sm_20cm'],
+        'sm_50cm': dataframe['sm_50cm'],
+        'sm_100cm': dataframe['sm_100cm'],
+        'decad': pd.Categorical.from_codes(decad_codes.astype('int8'), decad_names, ordered=True),
+        'pentad': pd.Categorical.from_codes(pentad_codes.astype('int8'), pentad_names, ordered=True)})
+    
+    return output_dataframe
+
+
+def _date_values(values):
+    # Compact integers, or float32 with NaN where the column has missing values
+    if values.isna().any():
+        return values.astype('float32').to_numpy()
+    
+    return values.to_numpy(dtype=getattr(values.dtype, 'numpy_dtype', values.dtype))
+
+
+# In[3]:
+
+
+def memory_report(path_to_data, station_name):
+    """Function that measures how much memory csv_to_df saves for a station csv 
+    file, compared with reading every column at the default data types and 
+    storing the station name and month as text.
+
+        Parameters
+        ----------
+        path_to_data : str
+            Path to a station csv file.
+
+        station_name : str
+            Name of the station for the data being imported.
+
+        Returns
+        ------
+        report : dataframe
+            Dataframe showing the bytes used by each column (and in total) with 
+            default data types and with csv_to_df, and the percent reduction.
+    """
+    
+    default_dataframe = pd.read_csv(path_to_data)
+    
+    default_dataframe['Station ID'] = station_name
+    
+    default_dataframe = default_dataframe[['Station ID', 'year', 'month', 'day', 'doy',
+                                           'sm_5cm', 'sm_10cm', 'sm_20cm', 'sm_50cm', 'sm_100cm']].copy()
+    
+    default_dataframe['month'] = default_dataframe['month'].map(dict(enumerate(month_names, 1)))
+    default_dataframe['decad'] = pd.cut(default_dataframe['day'], bins=[0, 10, 20, 31], labels=decad_names)
+    default_dataframe['pentad'] = pd.cut(default_dataframe['day'], bins=[0, 5, 10, 15, 20, 25, 31], 
+                                         labels=pentad_names)
+    
+    report = pd.DataFrame({'default_bytes': default_dataframe.memory_usage(index=False, deep=True),
+                           'lean_bytes': csv_to_df(path_to_data, station_name).memory_usage(index=False, deep=True)})
+    
+    report.loc['total'] = report.sum()
+    report['reduction_pct'] = 100 * (1 - report['lean_bytes'] / report['default_bytes'])
+    
+    return report
+
+
+# In[4]:
+
+
+def url_to_df(url, station_name, dictionary, cache=None, snapshot_dir=default_snapshot_dir):
+    """Function that takes a url to a csv file and downloads and imports the 
+    data contained at the url using csv_to_df.  Downloads are kept in a local 
+    cache and only transferred again when the file on the server has changed. 
+    The imported dataframe is saved as a binary snapshot, so later imports of 
+    the same file load the snapshot instead of parsing the csv again.
 
         Parameters
         ----------
@@ -36,92 +191,443 @@ def url_to_df(url, station_name, dictionary):
         dictionary : dictionary
             Empty dictionary for the created dataframes to be exported to.
 
+        cache : DownloadCache, optional
+            Download cache to use.  Defaults to the shared cache in downloadcache.py.
+
+        snapshot_dir : str, optional
+            Directory to save station snapshots to.  Set as None to always parse 
+            the csv file.
+
         Returns
         ------
         No physical return; Returns any newly created dataframes to the input 
         empty dictionary specified.
     """
     
-    path_to_data = os.path.join(et.data.get_data(url=url))
+    if cache is None:
+        cache = default_cache
+    
+    with stage('url_to_df', station_name):
+        with stage('download', station_name):
+            path_to_data = cache.get(url)
+        
+        if snapshot_dir is None:
+            with stage('read_csv', station_name):
+                output_dataframe = csv_to_df(path_to_data, station_name)
+                note(rows_out=len(output_dataframe))
+        
+        else:
+            # Cached files are named after a hash of their contents, which identifies the source version
+            versions = {'schema': station_schema_version, 'source': os.path.basename(path_to_data)}
+            station_snapshot = snapshot_path(snapshot_dir, station_name)
+            
+            with stage('load_snapshot', station_name):
+                output_dataframe = load_snapshot(station_snapshot, versions)
+                note(snapshot='miss' if output_dataframe is None else 'hit')
+            
+            # Rebuild the snapshot if it is missing or stale
+            if output_dataframe is None:
+                with stage('read_csv', station_name):
+                    output_dataframe = csv_to_df(path_to_data, station_name)
+                    note(rows_out=len(output_dataframe))
+                
+                with stage('save_snapshot', station_name, len(output_dataframe)):
+                    save_snapshot(output_dataframe, station_snapshot, versions)
+        
+        note(rows_out=len(output_dataframe))
+        
+        # The index of the station's periods is built once here and reused by every analysis
+        station_index(output_dataframe)
+        
+        dictionary.update({station_name: output_dataframe})
+
+
+# In[5]:
+
+
+def update_station(url, station_name, dictionary, cache=None, snapshot_dir=default_snapshot_dir):
+    """Function that brings a station's saved snapshot up to date with the csv 
+    file at a url.  SCAN csv files only grow at the end, so only the newly 
+    published days are downloaded (with a range request) and imported, then 
+    appended to the saved data.  If the earlier contents of the file were 
+    revised upstream, or there is no snapshot to append to, the whole file is 
+    imported again with url_to_df instead.
+
+        Parameters
+        ----------
+        url : url to csv file
+            Input url to a csv file.
+
+        station_name : str
+            Name of the station for the data being imported and downloaded.
+
+        dictionary : dictionary
+            Dictionary for the updated dataframe to be exported to.
+
+        cache : DownloadCache, optional
+            Download cache to use.  Defaults to the shared cache in downloadcache.py.
+
+        snapshot_dir : str, optional
+            Directory station snapshots are saved to.  Set as None to always import 
+            the whole csv file.
+
+        Returns
+        ------
+        new_rows : int or None
+            Number of days appended, or None if the whole file was imported again.
+    """
+    
+    if cache is None:
+        cache = default_cache
     
-    dataframe = pd.read_csv(path_to_data)
+    with stage('update_station', station_name):
+        new_rows = _append_new_days(url, station_name, dictionary, cache, snapshot_dir)
+        note(rows_out=new_rows)
     
-    dataframe['Station ID'] = station_name
+    return new_rows
+
+
+def _append_new_days(url, station_name, dictionary, cache, snapshot_dir):
+    # The saved snapshot must match the cached copy of the file for new days to be appended to it
+    entry = cache.entry(url)
+    station_dataframe = None
+    
+    if entry is not None and snapshot_dir is not None:
+        station_dataframe = load_snapshot(snapshot_path(snapshot_dir, station_name), 
+                                          {'schema': station_schema_version, 'source': entry['blob']})
+    
+    path_to_data, appended_from = cache.update(url)
+    
+    if station_dataframe is None or appended_from is None:
+        url_to_df(url, station_name, dictionary, cache, snapshot_dir)
+        return None
     
-    output_dataframe = dataframe[['Station ID', 'year', 'month', 'day', 'doy',
-                                  'sm_5cm', 'sm_10cm', 'sm_20cm', 'sm_50cm', 'sm_100cm']]
+    with open(path_to_data, 'rb') as data_file:
+        header = data_file.readline()
+        data_file.seek(appended_from - 1)
+        line_end = data_file.read(1)
+        new_data = data_file.read()
     
-    output_dataframe['month'].replace({1: "Jan", 2: "Feb", 3: "Mar", 
-                                  4: "Apr", 5: "May", 6: "Jun", 
-                                  7: "Jul", 8: "Aug", 9: "Sep", 
-                                  10: "Oct", 11: "Nov", 12: "Dec"}, 
-                                 inplace=True)
+    if not new_data.strip():
+        dictionary.update({station_name: station_dataframe})
+        return 0
     
-    cut_labels = ['decad0', 'decad1', 'decad2']
-    cut_bins = [0, 10, 20, 31]
-    output_dataframe['decad'] = pd.cut(output_dataframe['day'], bins=cut_bins, labels=cut_labels)
+    new_dataframe = csv_to_df(io.BytesIO(header + new_data), station_name)
     
-    cut_labels = ['pentad0', 'pentad1', 'pentad2', 'pentad3', 'pentad4', 'pentad5']
-    cut_bins = [0, 5, 10, 15, 20, 25, 31]
-    output_dataframe['pentad'] = pd.cut(output_dataframe['day'], bins=cut_bins, labels=cut_labels)
+    # New days must start on a new line and follow the last day already imported
+    last_day = tuple(station_dataframe[['year', 'doy']].iloc[-1]) if len(station_dataframe) else (0, 0)
+    first_new_day = tuple(new_dataframe[['year', 'doy']].iloc[0]) if len(new_dataframe) else (0, 0)
+    
+    if line_end != b'\n' or first_new_day <= last_day:
+        url_to_df(url, station_name, dictionary, cache, snapshot_dir)
+        return None
+    
+    output_dataframe = pd.concat([station_dataframe, new_dataframe], ignore_index=True)
+    station_index(output_dataframe)
+    
+    save_snapshot(output_dataframe, snapshot_path(snapshot_dir, station_name), 
+                  {'schema': station_schema_version, 'source': os.path.basename(path_to_data)})
     
     dictionary.update({station_name: output_dataframe})
+    
+    return len(new_dataframe)
 
 
-# In[3]:
+# In[6]:
 
 
-# Create target dictionary for storage of site data
-soil_moisture_dict = {}
+def bulk_url_to_df(stations, dictionary, cache=None, snapshot_dir=default_snapshot_dir, max_workers=8, 
+                   update=False):
+    """Function that takes a list of (url, station name) pairs and downloads and 
+    imports every station concurrently with url_to_df.  Downloads share a pool 
+    of keep-alive connections, and each csv file is imported as soon as it 
+    arrives.  A station that fails to download or import is reported and 
+    skipped without stopping the other stations.
 
+        Parameters
+        ----------
+        stations : list
+            List of (url, station name) tuples.
 
-# In[4]:
+        dictionary : dictionary
+            Dictionary for the created dataframes to be exported to.  Stations 
+            are added in the order they are listed.
+
+        cache : DownloadCache, optional
+            Download cache to use.  Defaults to the shared cache in downloadcache.py.
+
+        snapshot_dir : str, optional
+            Directory to save station snapshots to.  Set as None to always parse 
+            the csv files.
+
+        max_workers : int, optional
+            Maximum number of stations downloaded at the same time.
+
+        update : bool, optional
+            Use update_station to only import the days published since each 
+            station was last imported.
+
+
+        Returns
+        ------
+        failures : dictionary
+            Dictionary of the exception raised for each station that failed.
+    """
+    
+    import_function = update_station if update else url_to_df
+    
+    station_dataframes = {}
+    failures = {}
+    
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(import_function, url, station_name, station_dataframes, cache, snapshot_dir): station_name 
+                   for url, station_name in stations}
+        
+        for future in as_completed(futures):
+            station_name = futures[future]
+            
+            try:
+                future.result()
+            except Exception as error:
+                failures[station_name] = error
+                print(station_name, ': Download or import failed and was skipped -', error)
+    
+    for url, station_name in stations:
+        if station_name in station_dataframes:
+            dictionary[station_name] = station_dataframes[station_name]
+    
+    return failures
+
+
+# In[7]:
+
+
+class StationRegistry(Mapping):
+    """Dictionary-like collection of SCAN stations that only downloads and 
+    imports a station's data the first time it is accessed.  Registering a 
+    station just records its url, so creating the registry is instant no matter 
+    how many stations it lists.  Imported dataframes are kept for later access, 
+    and the least recently used ones can be released to bound memory use.
+
+        Parameters
+        ----------
+        cache : DownloadCache, optional
+            Download cache to use.  Defaults to the shared cache in downloadcache.py.
+
+        snapshot_dir : str, optional
+            Directory to save station snapshots to.  Set as None to always parse 
+            the csv files.
+
+        max_loaded : int, optional
+            Maximum number of station dataframes kept in memory.
+
+        max_bytes : int, optional
+            Maximum total memory (in bytes) of the station dataframes kept in memory.
+
+    """
+    
+    def __init__(self, cache=None, snapshot_dir=default_snapshot_dir, max_loaded=None, max_bytes=None):
+        self.cache = cache
+        self.snapshot_dir = snapshot_dir
+        self.max_loaded = max_loaded
+        self.max_bytes = max_bytes
+        self.stations = OrderedDict()
+        self._loaded = OrderedDict()
+        self._loaded_bytes = {}
+        self._loading = {}
+        self._lock = threading.Lock()
+    
+    def register(self, station_name, url, **metadata):
+        """Function that adds a station to the registry without downloading it.
+
+            Parameters
+            ----------
+            station_name : str
+                Name of the station (ideally the name of the station and its SCAN number).
 
+            url : str
+                Url to the station's csv file.
+
+            **metadata
+                Any other information to keep about the station (e.g. state).
+
+        """
+        
+        with self._lock:
+            self.stations[station_name] = dict(metadata, url=url)
+            self._release(station_name)
+    
+    def __getitem__(self, station_name):
+        if station_name not in self.stations:
+            raise KeyError(station_name)
+        
+        with self._lock:
+            if station_name in self._loaded:
+                self._loaded.move_to_end(station_name)
+                return self._loaded[station_name]
+            
+            station_lock = self._loading.setdefault(station_name, threading.Lock())
+        
+        # Only one thread imports a station; any others wait for it to finish
+        with station_lock:
+            with self._lock:
+                if station_name in self._loaded:
+                    self._loaded.move_to_end(station_name)
+                    return self._loaded[station_name]
+            
+            station_dataframe = {}
+            url_to_df(self.stations[station_name]['url'], station_name, station_dataframe, 
+                      self.cache, self.snapshot_dir)
+            
+            with self._lock:
+                self._store(station_name, station_dataframe[station_name])
+            
+            return station_dataframe[station_name]
+    
+    def __iter__(self):
+        return iter(list(self.stations))
+    
+    def __len__(self):
+        return len(self.stations)
+    
+    def __repr__(self):
+        return 'StationRegistry(' + str(len(self)) + ' stations, ' + str(len(self._loaded)) + ' loaded)'
+    
+    def loaded(self):
+        """Function that returns the names of the stations currently held in memory."""
+        
+        with self._lock:
+            return list(self._loaded)
+    
+    def load(self, station_names=None, max_workers=8):
+        """Function that imports several stations at once with bulk_url_to_df, 
+        skipping any that are already in memory.
+
+            Parameters
+            ----------
+            station_names : list, optional
+                Names of the stations to import.  Defaults to every registered station.
+
+            max_workers : int, optional
+                Maximum number of stations downloaded at the same time.
+
+
+            Returns
+            ------
+            failures : dictionary
+                Dictionary of the exception raised for each station that failed.
+        """
+        
+        if station_names is None:
+            station_names = list(self.stations)
+        
+        with self._lock:
+            stations = [(self.stations[station_name]['url'], station_name) for station_name in station_names 
+                        if station_name not in self._loaded]
+        
+        station_dataframes = {}
+        failures = bulk_url_to_df(stations, station_dataframes, self.cache, self.snapshot_dir, max_workers)
+        
+        with self._lock:
+            for station_name, station_dataframe in station_dataframes.items():
+                self._store(station_name, station_dataframe)
+        
+        return failures
+    
+    def refresh(self, station_names=None, max_workers=8):
+        """Function that brings stations up to date with update_station, only 
+        importing the days published since each station was last imported.
+
+            Parameters
+            ----------
+            station_names : list, optional
+                Names of the stations to update.  Defaults to every registered station.
+
+            max_workers : int, optional
+                Maximum number of stations downloaded at the same time.
+
+
+            Returns
+            ------
+            failures : dictionary
+                Dictionary of the exception raised for each station that failed.
+        """
+        
+        if station_names is None:
+            station_names = list(self.stations)
+        
+        stations = [(self.stations[station_name]['url'], station_name) for station_name in station_names]
+        
+        station_dataframes = {}
+        failures = bulk_url_to_df(stations, station_dataframes, self.cache, self.snapshot_dir, max_workers, 
+                                  update=True)
+        
+        with self._lock:
+            for station_name, station_dataframe in station_dataframes.items():
+                self._store(station_name, station_dataframe)
+        
+        return failures
+    
+    def release(self, station_name):
+        """Function that removes a station's dataframe from memory; it is imported again on next access."""
+        
+        with self._lock:
+            self._release(station_name)
+    
+    def _store(self, station_name, station_dataframe):
+        self._loaded[station_name] = station_dataframe
+        self._loaded_bytes[station_name] = int(station_dataframe.memory_usage(deep=True).sum())
+        
+        # Release the least recently used stations, always keeping the newest one
+        while len(self._loaded) > 1 and (
+                (self.max_loaded is not None and len(self._loaded) > self.max_loaded) or 
+                (self.max_bytes is not None and sum(self._loaded_bytes.values()) > self.max_bytes)):
+            self._release(next(iter(self._loaded)))
+    
+    def _release(self, station_name):
+        self._loaded.pop(station_name, None)
+        self._loaded_bytes.pop(station_name, None)
+
+
+# In[8]:
+
+
+# Register the url and name of every station; data is only downloaded when a station is first used
+soil_moisture_dict = StationRegistry()
 
-# Download and import data for each site using function
 # Bushland, TX: 2006
-url_to_df(
-    "http://nationalsoilmoisture.com/test/VWC_QAQC/scan/2006.csv", "Bushland #2006", soil_moisture_dict)
+soil_moisture_dict.register("Bushland #2006", "http://nationalsoilmoisture.com/test/VWC_QAQC/scan/2006.csv")
 
 # Nunn, Colorado: 2017
-url_to_df(
-    "http://nationalsoilmoisture.com/test/VWC_QAQC/scan/2017.csv", "Nunn #2017", soil_moisture_dict)
+soil_moisture_dict.register("Nunn #2017", "http://nationalsoilmoisture.com/test/VWC_QAQC/scan/2017.csv")
 
 # Fort Assiniboine, Montana: 2019
-url_to_df(
-    "http://nationalsoilmoisture.com/test/VWC_QAQC/scan/2019.csv", "Fort Assiniboine #2019", soil_moisture_dict)
+soil_moisture_dict.register("Fort Assiniboine #2019", "http://nationalsoilmoisture.com/test/VWC_QAQC/scan/2019.csv")
 
 # Mandan, North Dakota: 2020
-url_to_df(
-    "http://nationalsoilmoisture.com/test/VWC_QAQC/scan/2020.csv", "Mandan #2020", soil_moisture_dict)
+soil_moisture_dict.register("Mandan #2020", "http://nationalsoilmoisture.com/test/VWC_QAQC/scan/2020.csv")
 
 # Lind, Washington: 2021
-url_to_df(
-    "http://nationalsoilmoisture.com/test/VWC_QAQC/scan/2021.csv", "Lind #2021", soil_moisture_dict)
+soil_moisture_dict.register("Lind #2021", "http://nationalsoilmoisture.com/test/VWC_QAQC/scan/2021.csv")
 
 # Beasley Lake, Mississippi: 2032
-url_to_df(
-    "http://nationalsoilmoisture.com/test/VWC_QAQC/scan/2032.csv", "Beasley Lake #2032", soil_moisture_dict)
+soil_moisture_dict.register("Beasley Lake #2032", "http://nationalsoilmoisture.com/test/VWC_QAQC/scan/2032.csv")
 
 # Eastview Farm, Tennessee: 2077
-url_to_df(
-    "http://nationalsoilmoisture.com/test/VWC_QAQC/scan/2077.csv", "Eastview Farm #2077", soil_moisture_dict)
+soil_moisture_dict.register("Eastview Farm #2077", "http://nationalsoilmoisture.com/test/VWC_QAQC/scan/2077.csv")
 
 # Mammoth Cave, Kentucky: 2079
-url_to_df(
-    "http://nationalsoilmoisture.com/test/VWC_QAQC/scan/2079.csv", "Mammoth Cave #2079", soil_moisture_dict)
+soil_moisture_dict.register("Mammoth Cave #2079", "http://nationalsoilmoisture.com/test/VWC_QAQC/scan/2079.csv")
 
 # Abrams, Kansas: 2092
-url_to_df(
-    "http://nationalsoilmoisture.com/test/VWC_QAQC/scan/2092.csv", "Abrams #2092", soil_moisture_dict)
+soil_moisture_dict.register("Abrams #2092", "http://nationalsoilmoisture.com/test/VWC_QAQC/scan/2092.csv")
 
 
-# In[7]:
+# In[9]:
 
 
 # List of all stations:
-station_list = ["Bushland #2006", "Nunn #2017", "Fort Assiniboine #2019", "Mandan #2020",
-                "Lind #2021", "Beasley Lake #2032", "Eastview Farm #2077", "Mammoth Cave #2079", "Abrams #2092"]
+station_list = list(soil_moisture_dict)
 
 
 # In[ ]:
@@ -0,0 +1,270 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[1]:
+
+
+# Import necessary libraries
+import os
+import json
+import time
+import functools
+import threading
+import tracemalloc
+import contextlib
+import pandas as pd
+
+
+# In[2]:
+
+
+# Instrumentation is off until enable is called; while it is off every hook returns at once
+_enabled = False
+_trace_memory = False
+_started_tracemalloc = False
+_records = []
+_records_lock = threading.Lock()
+_stacks = threading.local()
+_start = time.perf_counter()
+
+
+# In[3]:
+
+
+def enable(trace_memory=False):
+    """Function that starts recording a stage record for every instrumented
+    function and block (see stage and instrumented).  Records are kept in
+    memory for the current process until they are exported or cleared.
+
+        Parameters
+        ----------
+        trace_memory : bool, optional
+            Also record the peak memory allocated in each stage, using tracemalloc.
+            This slows the stages down noticeably, and the peaks of stages running 
+            at the same time in different threads include each other's memory.
+
+    """
+
+    global _enabled, _trace_memory, _started_tracemalloc
+
+    _trace_memory = trace_memory
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _started_tracemalloc = True
+
+    _enabled = True
+
+
+def disable():
+    """Function that stops recording stages (records already made are kept)."""
+
+    global _enabled, _trace_memory, _started_tracemalloc
+
+    _enabled = False
+    _trace_memory = False
+
+    # Only stop memory tracing if it was started by enable
+    if _started_tracemalloc:
+        tracemalloc.stop()
+        _started_tracemalloc = False
+
+
+def is_enabled():
+    """Function that returns whether stages are being recorded."""
+
+    return _enabled
+
+
+def clear():
+    """Function that removes every record made so far."""
+
+    with _records_lock:
+        del _records[:]
+
+
+def records():
+    """Function that returns a copy of every completed stage record."""
+
+    with _records_lock:
+        return [dict(record) for record in _records]
+
+
+# In[4]:
+
+
+def _stack():
+    if not hasattr(_stacks, 'stack'):
+        _stacks.stack = []
+    return _stacks.stack
+
+
+@contextlib.contextmanager
+def _recorded_stage(name, station, rows_in):
+    stack = _stack()
+    record = {'stage': name, 'station': station, 'rows_in': rows_in, 'rows_out': None,
+              'depth': len(stack), 'thread': threading.get_ident(),
+              'process': os.getpid(), 'start': time.perf_counter() - _start}
+
+    if _trace_memory:
+        current, peak = tracemalloc.get_traced_memory()
+        if stack:
+            stack[-1]['_peak'] = max(stack[-1]['_peak'], peak)
+        record['_memory_start'] = current
+        record['_peak'] = current
+        tracemalloc.reset_peak()
+
+    stack.append(record)
+
+    try:
+        yield record
+    finally:
+        stack.pop()
+        record['seconds'] = time.perf_counter() - _start - record['start']
+
+        if _trace_memory and tracemalloc.is_tracing():
+            peak = max(tracemalloc.get_traced_memory()[1], record.pop('_peak'))
+            record['peak_bytes'] = peak - record.pop('_memory_start')
+            if stack:
+                stack[-1]['_peak'] = max(stack[-1]['_peak'], peak)
+        else:
+            record.pop('_peak', None)
+            record.pop('_memory_start', None)
+
+        with _records_lock:
+            _records.append(record)
+
+
+def stage(name, station=None, rows_in=None):
+    """Function that records a block of code as a stage, used in a with
+    statement.  The record yielded can be given more details, e.g.
+    record['rows_out'] = len(output).  When instrumentation is disabled a
+    shared empty context is returned and nothing is recorded.
+
+        Parameters
+        ----------
+        name : str
+            Name of the stage (e.g. 'read_csv').
+
+        station : str, optional
+            Name of the station being processed.
+
+        rows_in : int, optional
+            Number of rows going into the stage.
+
+
+        Returns
+        ------
+        context : context manager
+            Context manager yielding the stage record (or None when disabled).
+    """
+
+    if not _enabled:
+        return _disabled_stage
+
+    return _recorded_stage(name, station, rows_in)
+
+
+_disabled_stage = contextlib.nullcontext()
+
+
+def note(**details):
+    """Function that adds details (e.g. cache='hit') to the innermost stage
+    being recorded in the current thread.  Does nothing when instrumentation
+    is disabled or no stage is being recorded."""
+
+    if not _enabled:
+        return
+
+    stack = _stack()
+    if stack:
+        stack[-1].update(details)
+
+
+def _station_name(dataframe):
+    try:
+        station_ids = dataframe['Station ID']
+    except (KeyError, TypeError, IndexError):
+        return None
+
+    if isinstance(station_ids.dtype, pd.CategoricalDtype):
+        categories = station_ids.cat.categories
+        return str(categories[0]) if len(categories) == 1 else None
+
+    return str(station_ids.iloc[0]) if len(station_ids) else None
+
+
+def instrumented(function):
+    """Decorator that records every call of a function as a stage named after
+    the function.  If the first argument is a station dataframe, the station
+    name and number of rows are recorded, and the number of rows returned is
+    recorded for dataframe results.  When instrumentation is disabled the
+    function is called directly."""
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if not _enabled:
+            return function(*args, **kwargs)
+
+        dataframe = args[0] if args else None
+        is_frame = isinstance(dataframe, (pd.DataFrame, pd.Series))
+
+        with _recorded_stage(function.__name__, _station_name(dataframe) if is_frame else None,
+                             len(dataframe) if is_frame else None) as record:
+            result = function(*args, **kwargs)
+            if isinstance(result, (pd.DataFrame, pd.Series)):
+                record['rows_out'] = len(result)
+
+        return result
+
+    return wrapper
+
+
+# In[5]:
+
+
+def summary():
+    """Function that summarizes the records by stage.
+
+        Returns
+        ------
+        summary_df : dataframe
+            Dataframe indexed by stage showing the number of calls, total, mean
+            and longest time in seconds, rows in and out and the largest peak memory.
+    """
+
+    records_df = pd.DataFrame(records(), columns=['stage', 'seconds', 'rows_in', 'rows_out', 'peak_bytes'])
+
+    summary_df = records_df.groupby('stage').agg(calls=('seconds', 'size'), total_seconds=('seconds', 'sum'),
+                                                 mean_seconds=('seconds', 'mean'), max_seconds=('seconds', 'max'),
+                                                 rows_in=('rows_in', 'sum'), rows_out=('rows_out', 'sum'),
+                                                 peak_bytes=('peak_bytes', 'max'))
+
+    return summary_df.sort_values('total_seconds', ascending=False)
+
+
+def export_json(path):
+    """Function that saves every record to a json file, one object per stage
+    with its start time (seconds since the module was imported) and duration."""
+
+    with open(path, 'w') as json_file:
+        json.dump(records(), json_file, indent=1, default=str)
+
+
+def export_trace(path):
+    """Function that saves every record as a trace file in the Chrome trace
+    event format, which can be opened as a timeline or flame chart in
+    chrome://tracing, https://ui.perfetto.dev or https://www.speedscope.app."""
+
+    events = []
+
+    for record in records():
+        details = {key: value for key, value in record.items()
+                   if key not in ('stage', 'start', 'seconds', 'process', 'thread', 'depth') and value is not None}
+        name = record['stage'] if record['station'] is None else record['stage'] + ' (' + record['station'] + ')'
+        events.append({'name': name, 'cat': record['stage'], 'ph': 'X',
+                       'ts': record['start'] * 1e6, 'dur': record['seconds'] * 1e6,
+                       'pid': record['process'], 'tid': record['thread'], 'args': details})
+
+    with open(path, 'w') as trace_file:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, trace_file, default=str)
+
@@ -0,0 +1,310 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[1]:
+
+
+# Import necessary libraries
+import numpy as np
+import pandas as pd
+import customfunctions
+import rolling
+
+
+# In[2]:
+
+
+# Number of calendar days on each side of a day whose values are included in its
+# climatology on the 'doy' timescale (a 15 day window)
+default_half_window = 7
+
+# Upper percentile of each drought category of the U.S. Drought Monitor (D4 to D0);
+# values above the last limit are not in drought
+drought_categories = {'D4': 2, 'D3': 5, 'D2': 10, 'D1': 20, 'D0': 30}
+
+
+# In[3]:
+
+
+class PercentileClimatology:
+    """Sorted climatological samples of soil moisture for one station, used to
+    turn values into empirical percentiles.  The sample of every period (a
+    month, decad or pentad of the year, or a calendar day) and depth is sorted
+    once when the climatology is built, so the percentile of any value is found
+    with a binary search, and whole tables of values are ranked at once.
+    Percentiles are mid-rank percentiles: the percentage of the sample below
+    the value, counting values equal to it as half below.
+
+        Parameters
+        ----------
+        timescale : str
+            Timescale of the periods ('month', 'decad', 'pentad' or 'doy').
+
+        depths : list, optional
+            Names of the depth columns.  Defaults to customfunctions.depth_list_all.
+
+    """
+
+    def __init__(self, timescale, depths=customfunctions.depth_list_all):
+        self.timescale = timescale
+        self.depths = list(depths)
+        self.periods = []
+        self._period_codes = {}
+        # Sorted sample of every period, one after the other, and where each period starts
+        self.values = {depth: np.zeros(0) for depth in self.depths}
+        self.offsets = {depth: np.zeros(1, dtype='int64') for depth in self.depths}
+
+    @classmethod
+    def from_dataframe(cls, dataframe, timescale, base_years=None, half_window=default_half_window):
+        """Function that builds the climatology of a station dataframe.  On the
+        'month', 'decad' and 'pentad' timescales the sample of a period is its
+        mean in every year (see customfunctions.period_mean); on the 'doy'
+        timescale the sample of a calendar day is every daily value within
+        "half_window" days of it, in every year.
+
+            Parameters
+            ----------
+            dataframe : dataframe
+                Input dataframe containing raw soil moisture data.
+
+            timescale : str
+                Timescale of the periods ('month', 'decad', 'pentad' or 'doy').
+
+            base_years : list, optional
+                Years to include.  Defaults to every year on record.
+
+            half_window : int, optional
+                Number of days on each side of a calendar day (only used on the
+                'doy' timescale).  Defaults to "default_half_window".
+
+
+            Returns
+            ------
+            climatology : PercentileClimatology
+                Climatology of the station.
+        """
+
+        if timescale != 'doy':
+            return cls.from_period_means(customfunctions.period_mean(dataframe, timescale, years=base_years),
+                                         timescale)
+
+        daily_df = rolling.daily_series(dataframe)
+        if base_years is not None:
+            daily_df = daily_df[daily_df.index.year.isin(list(base_years))]
+
+        # Every value is added to the sample of each calendar day within half_window days of its own
+        calendar_days = rolling.calendar_days(daily_df.index)
+        shifts = np.arange(-half_window, half_window + 1)
+        periods = ((calendar_days[np.newaxis, :] - 1 + shifts[:, np.newaxis]) % 365 + 1).ravel()
+
+        climatology = cls(timescale, daily_df.columns)
+        climatology._set_samples(list(range(1, 366)), periods - 1,
+                                 {depth: np.tile(daily_df[depth].to_numpy(dtype='float64'), len(shifts))
+                                  for depth in climatology.depths})
+
+        return climatology
+
+    @classmethod
+    def from_period_means(cls, sm_period_mean, timescale):
+        """Function that builds a climatology from a table of period means, as
+        returned by customfunctions.period_mean.
+
+            Parameters
+            ----------
+            sm_period_mean : dataframe
+                Dataframe of period means indexed by year, month and (for decads
+                and pentads) period.
+
+            timescale : str
+                Timescale of the periods ('month', 'decad' or 'pentad').
+
+
+            Returns
+            ------
+            climatology : PercentileClimatology
+                Climatology of the period means.
+        """
+
+        period_index = sm_period_mean.index.droplevel(0).unique()
+        codes = period_index.get_indexer(sm_period_mean.index.droplevel(0))
+
+        climatology = cls(timescale, sm_period_mean.columns)
+        climatology._set_samples(list(period_index), codes,
+                                 {depth: sm_period_mean[depth].to_numpy(dtype='float64')
+                                  for depth in climatology.depths})
+
+        return climatology
+
+    def _set_samples(self, periods, codes, samples):
+        self.periods = periods
+        self._period_codes = {period: code for code, period in enumerate(periods)}
+
+        for depth, values in samples.items():
+            valid = ~np.isnan(values)
+            # Sorted by period, then by value within each period
+            order = np.lexsort((values[valid], codes[valid]))
+            self.values[depth] = values[valid][order]
+            self.offsets[depth] = np.searchsorted(codes[valid][order], np.arange(len(periods) + 1))
+
+    def period_codes(self, periods):
+        """Function that returns the position of each period in "periods" (-1 for
+        a period that is not in the climatology)."""
+
+        return np.array([self._period_codes.get(period, -1) for period in periods], dtype='int64')
+
+    def percentile(self, period, values):
+        """Function that returns the percentile of soil moisture values for each
+        depth against the sample of one period.
+
+            Parameters
+            ----------
+            period : tuple or int
+                Period the values belong to, e.g. ('Jul', 'decad1'), 'Jul' or a
+                calendar day (1 to 365).
+
+            values : list, array or Series
+                Soil moisture for each depth, or an array with one row of depth
+                values per value to rank.
+
+
+            Returns
+            ------
+            percentiles : Series or array
+                Percentile of the values for each depth.
+        """
+
+        if isinstance(values, pd.Series):
+            values = values.reindex(self.depths)
+
+        values = np.asarray(values, dtype='float64')
+        rows = np.atleast_2d(values)
+        codes = self.period_codes([period] * len(rows))
+
+        ranked = np.column_stack([self._rank(depth, codes, rows[:, column])
+                                  for column, depth in enumerate(self.depths)])
+
+        if values.ndim == 1:
+            return pd.Series(ranked[0], index=self.depths)
+
+        return ranked
+
+    def _rank(self, depth, codes, values):
+        sample, offsets = self.values[depth], self.offsets[depth]
+        percentiles = np.full(len(values), np.nan)
+
+        # Values are ranked one period at a time, with one binary search of the period's
+        # sorted sample for all of them
+        for code in np.unique(codes[codes >= 0]):
+            rows = np.flatnonzero((codes == code) & ~np.isnan(values))
+            period_sample = sample[offsets[code]:offsets[code + 1]]
+
+            if len(rows) == 0 or len(period_sample) == 0:
+                continue
+
+            below = np.searchsorted(period_sample, values[rows], side='left')
+            not_above = np.searchsorted(period_sample, values[rows], side='right')
+            percentiles[rows] = 100 * (below + not_above) / (2 * len(period_sample))
+
+        return percentiles
+
+    def rank(self, table):
+        """Function that returns the percentile of every value of a table against
+        the climatology.
+
+            Parameters
+            ----------
+            table : dataframe
+                Dataframe of soil moisture with a column for each depth: period means
+                indexed like customfunctions.period_mean on the 'month', 'decad' and
+                'pentad' timescales, or daily values indexed by date (see
+                rolling.daily_series) on the 'doy' timescale.
+
+
+            Returns
+            ------
+            percentile_df : dataframe
+                Dataframe with the same index and columns as "table" showing the
+                percentile of each value.
+        """
+
+        if self.timescale == 'doy':
+            codes = rolling.calendar_days(table.index) - 1
+        else:
+            codes = self.period_codes(table.index.droplevel(0))
+
+        percentile_df = pd.DataFrame(index=table.index)
+        for depth in table.columns:
+            percentile_df[depth] = self._rank(depth, codes, table[depth].to_numpy(dtype='float64'))
+
+        return percentile_df
+
+    def sample_sizes(self):
+        """Function that returns the number of values in the sample of every
+        period and depth as a dataframe indexed by period."""
+
+        return pd.DataFrame({depth: np.diff(self.offsets[depth]) for depth in self.depths},
+                            index=pd.Index(self.periods, tupleize_cols=False))
+
+    def save(self, path):
+        """Function that saves the climatology to a .npz file."""
+
+        np.savez(path, timescale=self.timescale, depths=np.array(self.depths),
+                 periods=np.array([repr(period) for period in self.periods]),
+                 **{'values_' + depth: self.values[depth] for depth in self.depths},
+                 **{'offsets_' + depth: self.offsets[depth] for depth in self.depths})
+
+    @classmethod
+    def load(cls, path):
+        """Function that loads a climatology saved with save."""
+
+        with np.load(path) as saved:
+            climatology = cls(str(saved['timescale']), [str(depth) for depth in saved['depths']])
+            climatology.periods = [_period(period) for period in saved['periods']]
+            climatology._period_codes = {period: code for code, period in enumerate(climatology.periods)}
+
+            for depth in climatology.depths:
+                climatology.values[depth] = saved['values_' + depth]
+                climatology.offsets[depth] = saved['offsets_' + depth]
+
+        return climatology
+
+
+def _period(text):
+    # Periods are saved as their repr: a month name, a tuple of names or a calendar day
+    text = str(text)
+    if text.startswith('('):
+        return tuple(part.strip(" '") for part in text.strip('()').split(',') if part.strip())
+    if text.startswith("'"):
+        return text.strip("'")
+    return int(text)
+
+
+# In[4]:
+
+
+def classify(percentile_df):
+    """Function that classifies percentiles into the drought categories of the
+    U.S. Drought Monitor ("drought_categories").
+
+        Parameters
+        ----------
+        percentile_df : dataframe
+            Dataframe of percentiles (see PercentileClimatology.rank).
+
+
+        Returns
+        ------
+        category_df : dataframe
+            Dataframe with the same index and columns showing the drought category
+            ('D4' to 'D0') of each value; values not in drought or without a
+            percentile are set as None.
+    """
+
+    names = np.array(list(drought_categories) + [None], dtype=object)
+    limits = np.array(list(drought_categories.values()), dtype='float64')
+
+    values = percentile_df.to_numpy(dtype='float64')
+    categories = names[np.searchsorted(limits, values, side='left')]
+    categories[np.isnan(values)] = None
+
+    return pd.DataFrame(categories, index=percentile_df.index, columns=percentile_df.columns)
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[1]:
+
+
+# Import necessary libraries
+import matplotlib.pyplot as plt
+import customfunctions
+
+
+# In[2]:
+
+
+# Figure layout of each plot type: (function creating the figure, its arguments, function drawing it)
+plot_types = {'yearly': (customfunctions.depth_line_figure, ("Yearly Mean Soil Moisture", "Year"),
+                         customfunctions.draw_depth_lines),
+              'monthly': (customfunctions.depth_line_figure, ("Monthly Mean Soil Moisture", "Month"),
+                          customfunctions.draw_depth_lines),
+              'daily': (customfunctions.depth_line_figure, ("Daily Mean Soil Moisture", "Julian Day"),
+                        customfunctions.draw_depth_lines),
+              'zscore_year': (customfunctions.zscore_figure, ("Year",), customfunctions.draw_zscore_bars),
+              'zscore_month': (customfunctions.zscore_figure, ("Month",), customfunctions.draw_zscore_bars)}
+
+# Figures already created in this process, reused for every plot of the same type
+_templates = {}
+
+
+# In[3]:
+
+
+def render(plot_type, dataframe, title, path):
+    """Function that draws a plot without displaying it and saves it to a file
+    (e.g. .png or .svg).  Each process keeps one figure per plot type and only
+    updates its lines or bars for every later plot, so rendering many stations
+    and years does not create and lay out a new figure each time.
+
+        Parameters
+        ----------
+        plot_type : str
+            Type of plot (a key of plot_types).
+
+        dataframe : dataframe
+            Dataframe with a column for each depth, indexed by the values of the x axis.
+
+        title : str
+            Title of the plot.
+
+        path : str
+            File to save the plot to; the format is given by the extension.
+
+
+        Returns
+        ------
+        No physical return; the plot is saved to the specified path.
+    """
+
+    create_figure, arguments, draw = plot_types[plot_type]
+
+    if plot_type not in _templates:
+        _templates[plot_type] = create_figure(*arguments)
+
+    figure = _templates[plot_type]
+
+    try:
+        draw(figure, dataframe, title)
+
+        # Constrained layout starts from the current position of each axes, so every axes is
+        # put back in its grid cell first; otherwise a reused figure is laid out from the last
+        # plot's positions and its labels and titles can end up clipped
+        for ax in figure['fig'].axes:
+            ax.set_position(ax.get_subplotspec().get_position(figure['fig']))
+            ax.set_in_layout(True)
+
+        figure['fig'].savefig(path)
+    except Exception:
+        # Start from a clean figure next time rather than one left half drawn
+        plt.close(_templates.pop(plot_type)['fig'])
+        raise
+
+
+def close_templates():
+    """Function that closes every figure kept by render in this process."""
+
+    while _templates:
+        plot_type, figure = _templates.popitem()
+        plt.close(figure['fig'])
+
@@ -0,0 +1,460 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[1]:
+
+
+# Import necessary libraries
+import io
+import os
+import sys
+import json
+import hashlib
+import argparse
+import contextlib
+import pandas as pd
+import matplotlib.pyplot as plt
+import customfunctions
+import plotrender
+from stationindex import station_index
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+
+# In[2]:
+
+
+# Default location of the exported csv files and plots
+default_output_dir = os.path.join(os.path.expanduser('~'), 'earth-analytics', 'usgs-nccasc-soil-moisture',
+                                  'soil-moisture-export-csvs')
+
+# Bump this whenever a product is calculated or drawn differently, so every output is regenerated
+products_version = 2
+
+# Default file format of the plots ('png' or 'svg')
+default_plot_format = 'png'
+
+
+# In[3]:
+
+
+def _monthly_timeseries_zscore(dataframe, month):
+    sm_month_zscore = customfunctions.zscore_period_means(customfunctions.period_mean(dataframe, 'month'))
+
+    return sm_month_zscore.xs(month, level='month')
+
+
+def _monthly_zscore(dataframe, year):
+    return customfunctions.monthly_mean_zscore(dataframe, year)
+
+
+# Every product: (file name ending, scope, kind, function returning the table or saving the plot).
+# Products with a 'month' or 'year' scope are made for each month or year requested.
+product_table = {
+    'raw_sm': ('_raw_sm.csv', 'station', 'csv',
+               lambda df, station_name, period: df),
+    'annual_mean': ('_annual_mean.csv', 'station', 'csv',
+                    lambda df, station_name, period: customfunctions.yearly_avg_sm(df)),
+    'annual_zscore': ('_annual_zscore.csv', 'station', 'csv',
+                      lambda df, station_name, period: customfunctions.period_zscore(df, 'year')),
+    'monthly_mean_all': ('_monthly_mean_all.csv', 'station', 'csv',
+                         lambda df, station_name, period: customfunctions.monthly_mean_all_years(df)),
+    'doy_mean_all_years': ('_doy_mean_all_years.csv', 'station', 'csv',
+                           lambda df, station_name, period: customfunctions.daily_avg_all_years(df)),
+    'monthly_timeseries': ('_monthly_timeseries_{period}.csv', 'month', 'csv',
+                           lambda df, station_name, period: customfunctions.yearly_mean_month(df, period)),
+    'zscore_monthly_timeseries': ('_zscore_monthly_timeseries_{period}.csv', 'month', 'csv',
+                                  lambda df, station_name, period: _monthly_timeseries_zscore(df, period)),
+    'monthly_mean': ('_monthly_mean_{period}.csv', 'year', 'csv',
+                     lambda df, station_name, period: customfunctions.monthly_mean(df, period)),
+    'zscore_monthly': ('_{period}_zscore_monthly_timeseries.csv', 'year', 'csv',
+                       lambda df, station_name, period: _monthly_zscore(df, period)),
+    'daily_mean': ('_daily_mean_{period}.csv', 'year', 'csv',
+                   lambda df, station_name, period: customfunctions.daily_avg(df, period)),
+    'decad_mean': ('_decad_mean_{period}.csv', 'year', 'csv',
+                   lambda df, station_name, period: customfunctions.decad_mean(df, period)),
+    'decad_zscore': ('_decad_zscore_{period}.csv', 'year', 'csv',
+                     lambda df, station_name, period: customfunctions.decad_zscore(df, period)),
+    'pentad_mean': ('_pentad_mean_{period}.csv', 'year', 'csv',
+                    lambda df, station_name, period: customfunctions.pentad_mean(df, period)),
+    'pentad_zscore': ('_pentad_zscore_{period}.csv', 'year', 'csv',
+                      lambda df, station_name, period: customfunctions.pentad_zscore(df, period)),
+    'annual_mean_plot': ('_annual_mean.{format}', 'station', 'plot',
+                         lambda df, station_name, period, path: plotrender.render(
+                             'yearly', customfunctions.yearly_avg_sm(df), station_name, path)),
+    'annual_zscore_plot': ('_annual_zscore.{format}', 'station', 'plot',
+                           lambda df, station_name, period, path: plotrender.render(
+                               'zscore_year', customfunctions.period_zscore(df, 'year'),
+                               "Standardized Annual Mean Soil Moisture\nStation: "+station_name, path)),
+    'zscore_monthly_timeseries_plot': ('_zscore_monthly_timeseries_{period}.{format}', 'month', 'plot',
+                                       lambda df, station_name, period, path: plotrender.render(
+                                           'zscore_year', _monthly_timeseries_zscore(df, period),
+                                           "Standardized Annual ("+period+") Mean Soil Moisture\nStation: "+station_name,
+                                           path)),
+    'monthly_mean_plot': ('_monthly_mean_{period}.{format}', 'year', 'plot',
+                          lambda df, station_name, period, path: plotrender.render(
+                              'monthly', customfunctions.monthly_mean(df, period),
+                              station_name+"\n Year: "+str(period), path)),
+    'zscore_monthly_plot': ('_{period}_zscore_monthly_timeseries.{format}', 'year', 'plot',
+                            lambda df, station_name, period, path: plotrender.render(
+                                'zscore_month', _monthly_zscore(df, period),
+                                "Standardized Monthly Mean Soil Moisture\nStation: "+station_name+" \nYear: "+str(period),
+                                path)),
+    'daily_mean_plot': ('_daily_mean_{period}.{format}', 'year', 'plot',
+                        lambda df, station_name, period, path: plotrender.render(
+                            'daily', customfunctions.daily_avg(df, period),
+                            station_name+"\n Year: "+str(period), path)),
+}
+
+
+# In[4]:
+
+
+def source_version(dataframe):
+    """Function that returns a fingerprint of a station dataframe's contents,
+    which changes whenever any value in the station data changes.
+
+        Parameters
+        ----------
+        dataframe : dataframe
+            Input dataframe containing raw soil moisture data.
+
+
+        Returns
+        ------
+        version : str
+            Hash of the dataframe's values.
+    """
+
+    row_hashes = pd.util.hash_pandas_object(dataframe, index=False).to_numpy()
+    column_names = ','.join(map(str, dataframe.columns)).encode('utf-8')
+
+    return hashlib.sha256(column_names + row_hashes.tobytes()).hexdigest()
+
+
+def station_products(station_name, years, months=customfunctions.month_list_all, product_names=None,
+                     plot_format=default_plot_format):
+    """Function that lists every product to make for a station as
+    (file name, product name, period) tuples.
+
+        Parameters
+        ----------
+        station_name : str
+            Name of the station.
+
+        years : list
+            Years to make the yearly products for.
+
+        months : list, optional
+            3-letter month names to make the month of year products for.
+
+        product_names : list, optional
+            Products to make (keys of product_table).  Defaults to every product.
+
+        plot_format : str, optional
+            File format of the plots ('png' or 'svg').
+
+
+        Returns
+        ------
+        products : list
+            List of (file name, product name, period) tuples.
+    """
+
+    products = []
+
+    for product_name, (ending, scope, kind, function) in product_table.items():
+        if product_names is not None and product_name not in product_names:
+            continue
+
+        periods = {'station': [None], 'month': months, 'year': years}[scope]
+
+        for period in periods:
+            products.append((station_name + ending.format(period=period, format=plot_format), product_name, period))
+
+    return products
+
+
+def product_key(source, product_name, period):
+    """Function that returns the key a product is recorded under in the
+    manifest: a hash of the station data version, the product parameters and
+    products_version.  A product is only made again when its key changes."""
+
+    parameters = json.dumps([products_version, source, product_name, period])
+
+    return hashlib.sha256(parameters.encode('utf-8')).hexdigest()
+
+
+# In[5]:
+
+
+def make_products(dataframe, station_name, products, output_dir):
+    """Function that makes a list of products for one station and saves them
+    to the output directory.  Each file is written under a temporary name and
+    renamed when complete, so an interrupted run never leaves a partial file.
+
+        Parameters
+        ----------
+        dataframe : dataframe
+            Input dataframe containing raw soil moisture data.
+
+        station_name : str
+            Name of the station.
+
+        products : list
+            List of (file name, product name, period) tuples from station_products.
+
+        output_dir : str
+            Directory to save the products to.
+
+
+        Returns
+        ------
+        results : list
+            List of (file name, exception or None) tuples, one for each product.
+    """
+
+    results = []
+
+    for file_name, product_name, period in products:
+        ending, scope, kind, function = product_table[product_name]
+        path = os.path.join(output_dir, file_name)
+        root, extension = os.path.splitext(path)
+        temp_path = root + '.part-' + str(os.getpid()) + extension
+
+        try:
+            # Keep the missing data messages out of the progress report
+            with contextlib.redirect_stdout(io.StringIO()):
+                if kind == 'csv':
+                    function(dataframe, station_name, period).to_csv(temp_path)
+                else:
+                    function(dataframe, station_name, period, temp_path)
+            os.replace(temp_path, path)
+            results.append((file_name, None))
+        except Exception as error:
+            results.append((file_name, error))
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    return results
+
+
+def _start_worker():
+    # Worker processes draw plots without a display, reusing one figure per plot type
+    plt.switch_backend('Agg')
+
+
+# In[6]:
+
+
+def load_manifest(output_dir):
+    """Function that loads the manifest of product keys from the output directory."""
+
+    try:
+        with open(os.path.join(output_dir, 'manifest.json')) as manifest_file:
+            return json.load(manifest_file)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(manifest, output_dir):
+    """Function that saves the manifest of product keys to the output directory."""
+
+    temp_path = os.path.join(output_dir, 'manifest.json.part-' + str(os.getpid()))
+
+    with open(temp_path, 'w') as manifest_file:
+        json.dump(manifest, manifest_file, indent=1, sort_keys=True)
+
+    os.replace(temp_path, os.path.join(output_dir, 'manifest.json'))
+
+
+# In[7]:
+
+
+def regenerate(dictionary, station_names=None, years=None, months=customfunctions.month_list_all,
+               product_names=None, output_dir=default_output_dir, max_workers=None, force=False,
+               plot_format=default_plot_format):
+    """Function that makes every csv and plot product for the chosen stations
+    and years, skipping any product that is already up to date: its file
+    exists and neither the station data, the product parameters nor
+    products_version have changed since it was made.  Products are made in
+    parallel on a pool of processes, one task per station (split into a few
+    tasks when there are fewer stations than processes, so each station's
+    dataframe is only sent to the processes a few times), and each process
+    reuses its plot figures (see plotrender.py).
+
+        Parameters
+        ----------
+        dictionary : dictionary
+            Dictionary (or StationRegistry) of station dataframes.
+
+        station_names : list, optional
+            Stations to make products for.  Defaults to every station.
+
+        years : list, optional
+            Years to make the yearly products for.  Defaults to every year on record
+            at each station.
+
+        months : list, optional
+            3-letter month names to make the month of year products for.
+
+        product_names : list, optional
+            Products to make (keys of product_table).  Defaults to every product.
+
+        output_dir : str, optional
+            Directory to save the products to.
+
+        max_workers : int, optional
+            Number of worker processes.  Defaults to the number of cores.
+
+        force : bool, optional
+            Make every product even if it is up to date.
+
+        plot_format : str, optional
+            File format of the plots ('png' or 'svg').
+
+
+        Returns
+        ------
+        summary : dictionary
+            Dictionary with the lists of 'made', 'skipped' and 'failed' file names.
+    """
+
+    if station_names is None:
+        station_names = list(dictionary)
+
+    os.makedirs(output_dir, exist_ok=True)
+
+    manifest = load_manifest(output_dir)
+    summary = {'made': [], 'skipped': [], 'failed': []}
+
+    # Stations in a registry are downloaded together rather than one at a time
+    if hasattr(dictionary, 'load'):
+        dictionary.load(station_names)
+
+    max_workers = max_workers or os.cpu_count()
+    stations = []
+
+    for station_name in station_names:
+        try:
+            station_dataframe = dictionary[station_name]
+        except Exception as error:
+            print(station_name, ': Download or import failed and was skipped -', error)
+            summary['failed'].append(station_name)
+            continue
+
+        source = source_version(station_dataframe)
+        station_years = station_index(station_dataframe).record_years() if years is None else years
+        stale = []
+
+        for file_name, product_name, period in station_products(station_name, station_years, months, product_names,
+                                                                plot_format):
+            key = product_key(source, product_name, period)
+
+            if not force and manifest.get(file_name) == key and os.path.exists(os.path.join(output_dir, file_name)):
+                summary['skipped'].append(file_name)
+                continue
+
+            stale.append((file_name, product_name, period, key))
+
+        if stale:
+            stations.append((station_name, station_dataframe, stale))
+
+    # Each station's dataframe is sent to the workers once per task, so a station's products
+    # are only split into more than one task when there are fewer stations than workers
+    tasks_per_station = -(-max_workers // len(stations)) if stations else 1
+
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_start_worker) as executor:
+        futures = {}
+
+        for station_name, station_dataframe, stale in stations:
+            periods = list(dict.fromkeys(product[2] for product in stale))
+
+            # Products for the same period stay in the same task
+            for number in range(min(tasks_per_station, len(periods))):
+                task_periods = set(periods[number::tasks_per_station])
+                products = [product for product in stale if product[2] in task_periods]
+
+                future = executor.submit(make_products, station_dataframe, station_name,
+                                         [product[:3] for product in products], output_dir)
+                futures[future] = {product[0]: product[3] for product in products}
+
+        for future in as_completed(futures):
+            keys = futures[future]
+
+            try:
+                results = future.result()
+            except Exception as error:
+                results = [(file_name, error) for file_name in keys]
+
+            for file_name, error in results:
+                if error is None:
+                    manifest[file_name] = keys[file_name]
+                    summary['made'].append(file_name)
+                    print(file_name, ': made')
+                else:
+                    manifest.pop(file_name, None)
+                    summary['failed'].append(file_name)
+                    print(file_name, ': Failed -', error)
+
+    save_manifest(manifest, output_dir)
+
+    return summary
+
+
+# In[8]:
+
+
+def _parse_years(values):
+    years = []
+
+    for value in values:
+        if '-' in value:
+            first, last = value.split('-')
+            years.extend(range(int(first), int(last) + 1))
+        else:
+            years.append(int(value))
+
+    return years
+
+
+def main(arguments=None):
+    """Command line entry point, e.g.
+    python products.py --stations "Nunn #2017" --years 2000-2020 --workers 4"""
+
+    parser = argparse.ArgumentParser(description='Make the soil moisture csv and plot products '
+                                                 'for SCAN stations, skipping any that are up to date.')
+    parser.add_argument('--stations', nargs='+', help='station names (default: every station in imports.py)')
+    parser.add_argument('--years', nargs='+', help='years or ranges of years, e.g. 2000 2005-2010 '
+                                                   '(default: every year on record)')
+    parser.add_argument('--months', nargs='+', default=list(customfunctions.month_list_all),
+                        help='3-letter month names for the month of year products')
+    parser.add_argument('--products', nargs='+', choices=list(product_table),
+                        help='products to make (default: every product)')
+    parser.add_argument('--output', default=default_output_dir, help='directory to save the products to')
+    parser.add_argument('--workers', type=int, help='number of worker processes (default: number of cores)')
+    parser.add_argument('--plot-format', default=default_plot_format, choices=['png', 'svg'],
+                        help='file format of the plots')
+    parser.add_argument('--force', action='store_true', help='make every product even if it is up to date')
+    arguments = parser.parse_args(arguments)
+
+    plt.switch_backend('Agg')
+
+    # The station list lives in imports.py
+    from imports import soil_moisture_dict
+
+    years = _parse_years(arguments.years) if arguments.years else None
+
+    summary = regenerate(soil_moisture_dict, arguments.stations, years, arguments.months,
+                         arguments.products, arguments.output, arguments.workers, arguments.force,
+                         arguments.plot_format)
+
+    print(len(summary['made']), 'made,', len(summary['skipped']), 'up to date,',
+          len(summary['failed']), 'failed')
+
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
+
@@ -0,0 +1,322 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[1]:
+
+
+# Import necessary libraries
+import numpy as np
+import pandas as pd
+import customfunctions
+from instrumentation import instrumented
+
+
+# In[2]:
+
+
+# Lengths in days of the rolling windows calculated by default (weekly, monthly and seasonal)
+rolling_windows = (7, 30, 90)
+
+# Minimum number of years a calendar day needs in the climatology for an anomaly to be calculated
+default_min_years = 3
+
+
+# In[3]:
+
+
+def day_numbers(dataframe):
+    """Function that returns the number of days since 1970-01-01 of each row of
+    a station dataframe, from its year and day of year, and whether the row's
+    year and day of year are valid."""
+
+    year = dataframe['year'].to_numpy(dtype='int64', na_value=-1)
+    doy = dataframe['doy'].to_numpy(dtype='int64', na_value=0)
+    valid = (year >= 0) & (doy >= 1) & (doy <= 366)
+
+    first_days = (year - 1970).astype('datetime64[Y]').astype('datetime64[D]').astype('int64')
+
+    return first_days + doy - 1, valid
+
+
+def _calendar(first_day, last_day):
+    return pd.DatetimeIndex(np.arange(first_day, last_day + 1).astype('datetime64[D]'), name='date')
+
+
+@instrumented
+def daily_series(dataframe, depths=customfunctions.depth_list_all):
+    """Function that takes an input dataframe of raw soil moisture data and
+    returns its soil moisture on a continuous daily calendar, from the first to
+    the last day on record.  Days missing from the station file are set as NaN,
+    so rolling windows always cover the same number of calendar days.
+
+        Parameters
+        ----------
+        dataframe : dataframe
+            Input dataframe containing raw soil moisture data.
+
+        depths : list, optional
+            Depth columns to include.  Defaults to customfunctions.depth_list_all.
+
+
+        Returns
+        ------
+        daily_df : dataframe
+            Dataframe indexed by date showing soil moisture for each depth.
+
+    """
+
+    days, valid = day_numbers(dataframe)
+    days = days[valid]
+    values = np.column_stack([dataframe[depth].to_numpy(dtype='float64')[valid] for depth in depths])
+
+    if len(days) == 0:
+        return pd.DataFrame(columns=list(depths), index=_calendar(0, -1), dtype='float64')
+
+    first_day = days.min()
+    series = np.full((days.max() - first_day + 1, len(depths)), np.nan)
+    series[days - first_day] = values
+
+    return pd.DataFrame(series, index=_calendar(first_day, days.max()), columns=list(depths))
+
+
+@instrumented
+def daily_matrix(dictionary, station_names=None, depths=customfunctions.depth_list_all):
+    """Function that puts the daily soil moisture of many stations on one common
+    calendar (from the first to the last day of any station), with one column per
+    station and depth, so every rolling calculation runs on all of them at once.
+
+        Parameters
+        ----------
+        dictionary : dictionary
+            Dictionary of station dataframes (e.g. imports.soil_moisture_dict).
+
+        station_names : list, optional
+            Stations to include.  Defaults to every station in the dictionary.
+
+        depths : list, optional
+            Depth columns to include.  Defaults to customfunctions.depth_list_all.
+
+
+        Returns
+        ------
+        daily_df : dataframe
+            Dataframe indexed by date with a (station, depth) column for each
+            station and depth.
+
+    """
+
+    if station_names is None:
+        station_names = list(dictionary)
+
+    if hasattr(dictionary, 'load'):
+        dictionary.load(station_names)
+
+    stations = []
+    for station_name in station_names:
+        station_dataframe = dictionary[station_name]
+        days, valid = day_numbers(station_dataframe)
+        stations.append((days[valid],
+                         [station_dataframe[depth].to_numpy(dtype='float64')[valid] for depth in depths]))
+
+    columns = pd.MultiIndex.from_product([list(station_names), list(depths)], names=['station', 'depth'])
+    all_days = [days for days, values in stations if len(days)]
+
+    if not all_days:
+        return pd.DataFrame(columns=columns, index=_calendar(0, -1), dtype='float64')
+
+    first_day = min(days.min() for days in all_days)
+    last_day = max(days.max() for days in all_days)
+
+    matrix = np.full((last_day - first_day + 1, len(columns)), np.nan)
+    for number, (days, values) in enumerate(stations):
+        matrix[days - first_day, number * len(depths):(number + 1) * len(depths)] = np.column_stack(values)
+
+    return pd.DataFrame(matrix, index=_calendar(first_day, last_day), columns=columns)
+
+
+# In[4]:
+
+
+def _window_sums(values, window):
+    # Sum and number of valid values in the window ending on each day, from cumulative sums
+    valid = ~np.isnan(values)
+
+    # Values are centred on each column's mean first, so the cumulative sums stay small
+    # and the differences between them lose no precision over long records
+    centre = np.zeros(values.shape[1])
+    has_data = valid.any(axis=0)
+    centre[has_data] = np.nanmean(values[:, has_data], axis=0)
+
+    cumulative_sum = np.zeros((len(values) + 1, values.shape[1]))
+    cumulative_count = np.zeros((len(values) + 1, values.shape[1]), dtype='int64')
+    np.cumsum(np.where(valid, values - centre, 0.0), axis=0, out=cumulative_sum[1:])
+    np.cumsum(valid, axis=0, out=cumulative_count[1:])
+
+    stops = np.arange(1, len(values) + 1)
+    starts = np.maximum(stops - window, 0)
+
+    return cumulative_sum[stops] - cumulative_sum[starts], cumulative_count[stops] - cumulative_count[starts], centre
+
+
+@instrumented
+def rolling_mean(daily_df, window, min_valid=None):
+    """Function that calculates the mean soil moisture of the "window" days
+    ending on each day, for every column of a daily dataframe (see daily_series
+    and daily_matrix).  Means are taken from cumulative sums, so the time taken
+    only depends on the length of the record, not on the window.  A mean is only
+    calculated when the window contains at least "min_valid" valid (non-NaN) values.
+
+        Parameters
+        ----------
+        daily_df : dataframe
+            Dataframe of soil moisture on a continuous daily calendar.
+
+        window : int
+            Number of days in each window.
+
+        min_valid : int, optional
+            Minimum number of valid values in a window.  Defaults to more than half
+            of the window.
+
+
+        Returns
+        ------
+        rolling_df : dataframe
+            Dataframe with the same index and columns as "daily_df" showing the
+            rolling mean soil moisture.
+
+    """
+
+    if min_valid is None:
+        min_valid = window // 2 + 1
+
+    values = daily_df.to_numpy(dtype='float64')
+
+    if len(values) == 0:
+        return daily_df.astype('float64')
+
+    window_sum, window_count, centre = _window_sums(values, window)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rolling_values = np.where(window_count >= max(min_valid, 1), window_sum / window_count + centre, np.nan)
+
+    return pd.DataFrame(rolling_values, index=daily_df.index, columns=daily_df.columns)
+
+
+def calendar_days(index):
+    """Function that returns the day of year (1 to 365) of every date of a
+    DatetimeIndex, with 29 February counted as 28 February so each calendar day
+    has the same number in every year."""
+
+    doy = index.dayofyear.to_numpy()
+    leap_day_or_later = index.is_leap_year & (doy >= 60)
+
+    return doy - leap_day_or_later
+
+
+@instrumented
+def rolling_anomaly(daily_df, window, min_valid=None, min_years=default_min_years, base_years=None,
+                    rolling_df=None):
+    """Function that calculates standardized anomalies (z-scores) of the rolling
+    mean soil moisture (see rolling_mean) of every column of a daily dataframe.
+    Each day is compared with the rolling means of the same calendar day in every
+    year of the climatology; standard deviations are population standard
+    deviations (ddof=0), matching the z-scores from customfunctions.
+
+        Parameters
+        ----------
+        daily_df : dataframe
+            Dataframe of soil moisture on a continuous daily calendar.
+
+        window : int
+            Number of days in each window.
+
+        min_valid : int, optional
+            Minimum number of valid values in a window.  Defaults to more than half
+            of the window.
+
+        min_years : int, optional
+            Minimum number of years with a rolling mean on a calendar day for its
+            anomalies to be calculated.  Defaults to "default_min_years".
+
+        base_years : list, optional
+            Years the climatology is calculated from.  Defaults to every year.
+
+        rolling_df : dataframe, optional
+            Rolling means of "daily_df" for this window and "min_valid", if already
+            calculated with rolling_mean; otherwise they are calculated here.
+
+
+        Returns
+        ------
+        anomaly_df : dataframe
+            Dataframe with the same index and columns as "daily_df" showing the
+            anomaly of the rolling mean soil moisture.
+
+    """
+
+    if rolling_df is None:
+        rolling_df = rolling_mean(daily_df, window, min_valid)
+
+    rolling_values = rolling_df.to_numpy()
+    day_of_year = calendar_days(rolling_df.index)
+
+    base_values = rolling_values
+    if base_years is not None:
+        base_values = np.where(rolling_df.index.year.isin(list(base_years))[:, np.newaxis], rolling_values, np.nan)
+
+    # Count, mean and spread of the rolling means of each calendar day, in one grouped pass
+    grouped = pd.DataFrame(base_values).groupby(day_of_year)
+    count = grouped.count().reindex(day_of_year).to_numpy()
+    mean = grouped.mean().reindex(day_of_year).to_numpy()
+    std = grouped.std(ddof=0).reindex(day_of_year).to_numpy()
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        anomaly = np.where((count >= min_years) & (std > 0), (rolling_values - mean) / std, np.nan)
+
+    return pd.DataFrame(anomaly, index=daily_df.index, columns=daily_df.columns)
+
+
+@instrumented
+def rolling_suite(daily_df, windows=rolling_windows, min_valid=None, min_years=default_min_years,
+                  base_years=None):
+    """Function that calculates the rolling mean and anomaly of every column of
+    a daily dataframe for several windows (see rolling_mean and rolling_anomaly).
+    The rolling means of each window are calculated once and used for both.
+
+        Parameters
+        ----------
+        daily_df : dataframe
+            Dataframe of soil moisture on a continuous daily calendar.
+
+        windows : list, optional
+            Window lengths in days.  Defaults to "rolling_windows".
+
+        min_valid : dict or int, optional
+            Minimum number of valid values in a window, for every window or by
+            window length.  Defaults to more than half of each window.
+
+        min_years : int, optional
+            Minimum number of years for an anomaly (see rolling_anomaly).
+
+        base_years : list, optional
+            Years the climatology is calculated from.  Defaults to every year.
+
+
+        Returns
+        ------
+        suite_df : dataframe
+            Dataframe indexed by date with a ('mean' or 'zscore', window, ...)
+            column for each statistic, window and column of "daily_df".
+
+    """
+
+    results = {}
+
+    for window in windows:
+        window_min_valid = min_valid.get(window) if isinstance(min_valid, dict) else min_valid
+        results[('mean', window)] = rolling_mean(daily_df, window, window_min_valid)
+        results[('zscore', window)] = rolling_anomaly(daily_df, window, window_min_valid, min_years, base_years,
+                                                      rolling_df=results[('mean', window)])
+
+    return pd.concat(results, axis=1, names=['statistic', 'window'])
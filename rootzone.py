@@ -0,0 +1,270 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[1]:
+
+
+# Import necessary libraries
+import numpy as np
+import pandas as pd
+from instrumentation import instrumented
+
+
+# In[2]:
+
+
+# Depth below the surface (cm) of the sensor measuring each soil moisture column
+sensor_depths = {'sm_5cm': 5, 'sm_10cm': 10, 'sm_20cm': 20, 'sm_50cm': 50, 'sm_100cm': 100}
+
+# Ways of weighting the sensors over a root zone, and of handling missing depths (see profile_storage)
+weighting_methods = ('trapezoid', 'layer')
+missing_policies = ('strict', 'renormalize', 'interpolate')
+
+# Minimum share of a root zone's weight that must have data for the 'renormalize' policy
+default_min_fraction = 0.5
+
+
+# In[3]:
+
+
+def depth_weights(top=0, bottom=100, method='trapezoid', depths=tuple(sensor_depths.values())):
+    """Function that returns the weight (in cm of soil) given to each sensor when
+    the soil moisture profile is integrated from "top" to "bottom" cm.  With
+    'trapezoid' weighting soil moisture varies linearly between sensors; with
+    'layer' weighting each sensor stands for the layer from halfway to the sensor
+    above to halfway to the sensor below.  Above the first sensor and below the
+    last one soil moisture is taken to be that of the nearest sensor.  The weights
+    add up to the thickness of the root zone.
+
+        Parameters
+        ----------
+        top : float, optional
+            Top of the root zone in cm below the surface.
+
+        bottom : float, optional
+            Bottom of the root zone in cm below the surface.
+
+        method : str, optional
+            'trapezoid' or 'layer'.
+
+        depths : list, optional
+            Depth of each sensor in cm, from the shallowest.  Defaults to the
+            values of "sensor_depths".
+
+
+        Returns
+        ------
+        weights : array
+            Weight of each sensor in cm.
+    """
+
+    if method not in weighting_methods:
+        raise ValueError('method must be one of ' + ', '.join(weighting_methods))
+
+    if bottom <= top:
+        raise ValueError('The bottom of the root zone must be below its top')
+
+    depths = np.asarray(depths, dtype='float64')
+    weights = np.zeros(len(depths))
+
+    if method == 'layer':
+        edges = np.concatenate([[-np.inf], (depths[1:] + depths[:-1]) / 2, [np.inf]])
+        return np.maximum(np.minimum(edges[1:], bottom) - np.maximum(edges[:-1], top), 0)
+
+    # Above the first and below the last sensor
+    weights[0] += max(min(bottom, depths[0]) - top, 0)
+    weights[-1] += max(bottom - max(top, depths[-1]), 0)
+
+    # Between each pair of sensors, the integral of the linear interpolation of the two
+    for number in range(len(depths) - 1):
+        upper, lower = depths[number], depths[number + 1]
+        start, stop = max(top, upper), min(bottom, lower)
+        if stop <= start:
+            continue
+
+        thickness = lower - upper
+        towards_lower = ((stop - upper) ** 2 - (start - upper) ** 2) / (2 * thickness)
+        weights[number] += (stop - start) - towards_lower
+        weights[number + 1] += towards_lower
+
+    return weights
+
+
+def _interpolate_depths(values, depths):
+    # Fills each missing depth by linear interpolation between the nearest depths with
+    # data above and below it (or the nearest one, at the top and bottom of the profile)
+    valid = ~np.isnan(values)
+    positions = np.arange(values.shape[-1])
+
+    above = np.maximum.accumulate(np.where(valid, positions, -1), axis=-1)
+    below = np.flip(np.minimum.accumulate(np.flip(np.where(valid, positions, len(positions)), axis=-1),
+                                          axis=-1), axis=-1)
+
+    # Without a depth on one side, the depth on the other side is used for both
+    has_above, has_below = above >= 0, below < len(positions)
+    above_index = np.clip(np.where(has_above, above, below), 0, len(positions) - 1)
+    below_index = np.clip(np.where(has_below, below, above), 0, len(positions) - 1)
+
+    above_values = np.take_along_axis(values, above_index, axis=-1)
+    below_values = np.take_along_axis(values, below_index, axis=-1)
+    above_depths, below_depths = depths[above_index], depths[below_index]
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        share = np.where(below_depths > above_depths, (depths - above_depths) / (below_depths - above_depths), 0.0)
+
+    return np.where(valid, values, above_values + share * (below_values - above_values))
+
+
+def profile_storage(values, weights, missing='renormalize', min_fraction=default_min_fraction,
+                    depths=tuple(sensor_depths.values())):
+    """Function that integrates volumetric soil moisture (%) over a root zone,
+    giving the water it stores in mm, for any array whose last axis is depth
+    (e.g. the rows of a station dataframe or a station x day x depth array from
+    crossstation.station_cube), in one array operation.
+
+        Parameters
+        ----------
+        values : array
+            Volumetric soil moisture (%) with depth as the last axis.
+
+        weights : array
+            Weight of each depth in cm (see depth_weights).
+
+        missing : str, optional
+            How missing depths are handled: 'strict' sets the storage as NaN when
+            any depth with weight is missing; 'renormalize' scales the storage of
+            the depths with data up to the whole root zone, when they carry at least
+            "min_fraction" of its weight; 'interpolate' fills missing depths from
+            the depths above and below first.
+
+        min_fraction : float, optional
+            Minimum share of the weight with data for the 'renormalize' policy.
+
+        depths : list, optional
+            Depth of each sensor in cm, used by the 'interpolate' policy.
+
+
+        Returns
+        ------
+        storage : array
+            Water stored in the root zone in mm, with the shape of "values"
+            without its last axis.
+    """
+
+    if missing not in missing_policies:
+        raise ValueError('missing must be one of ' + ', '.join(missing_policies))
+
+    values = np.asarray(values, dtype='float64')
+    weights = np.asarray(weights, dtype='float64')
+
+    if missing == 'interpolate':
+        values = _interpolate_depths(values, np.asarray(depths, dtype='float64'))
+
+    valid = ~np.isnan(values)
+    used = weights > 0
+
+    # % of each cm of soil is 0.1 mm of water per cm
+    storage = np.where(valid, values, 0.0) @ (weights / 10)
+    weight_with_data = valid @ weights
+
+    if missing == 'renormalize':
+        fraction = weight_with_data / weights.sum()
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(fraction >= max(min_fraction, 1e-12), storage / fraction, np.nan)
+
+    complete = (valid | ~used).all(axis=-1)
+
+    return np.where(complete, storage, np.nan)
+
+
+# In[4]:
+
+
+def storage_column(top=0, bottom=100):
+    """Function that returns the name of the root zone storage column from
+    "top" to "bottom" cm (e.g. 'rz_0_100cm')."""
+
+    return 'rz_{:g}_{:g}cm'.format(top, bottom)
+
+
+@instrumented
+def root_zone_storage(dataframe, top=0, bottom=100, method='trapezoid', missing='renormalize',
+                      min_fraction=default_min_fraction):
+    """Function that takes an input dataframe of raw soil moisture data and
+    calculates the water stored in a root zone (mm) on every row (see
+    depth_weights and profile_storage).
+
+        Parameters
+        ----------
+        dataframe : dataframe
+            Input dataframe containing raw soil moisture data.
+
+        top, bottom : float, optional
+            Top and bottom of the root zone in cm below the surface.
+
+        method : str, optional
+            'trapezoid' or 'layer' weighting (see depth_weights).
+
+        missing : str, optional
+            'strict', 'renormalize' or 'interpolate' (see profile_storage).
+
+        min_fraction : float, optional
+            Minimum share of the weight with data for the 'renormalize' policy.
+
+
+        Returns
+        ------
+        storage : Series
+            Root zone storage in mm, with the index of the dataframe.
+    """
+
+    depths = list(sensor_depths)
+    weights = depth_weights(top, bottom, method)
+    values = np.column_stack([dataframe[depth].to_numpy(dtype='float64') for depth in depths])
+
+    return pd.Series(profile_storage(values, weights, missing, min_fraction), index=dataframe.index,
+                     name=storage_column(top, bottom))
+
+
+@instrumented
+def with_root_zone_storage(dataframe, root_zones=((0, 100),), method='trapezoid', missing='renormalize',
+                           min_fraction=default_min_fraction):
+    """Function that returns a copy of a station dataframe with a root zone
+    storage column (see root_zone_storage and storage_column) for each root zone.
+    The copy works with every aggregation and z-score of customfunctions by
+    passing the new columns as "depths", e.g.
+    customfunctions.period_mean(storage_df, 'month', depths=['rz_0_100cm']).
+
+        Parameters
+        ----------
+        dataframe : dataframe
+            Input dataframe containing raw soil moisture data.
+
+        root_zones : list, optional
+            (top, bottom) of each root zone in cm.  Defaults to 0 to 100 cm.
+
+        method : str, optional
+            'trapezoid' or 'layer' weighting (see depth_weights).
+
+        missing : str, optional
+            'strict', 'renormalize' or 'interpolate' (see profile_storage).
+
+        min_fraction : float, optional
+            Minimum share of the weight with data for the 'renormalize' policy.
+
+
+        Returns
+        ------
+        storage_df : dataframe
+            Copy of the dataframe with a storage column for each root zone.
+    """
+
+    depths = list(sensor_depths)
+    values = np.column_stack([dataframe[depth].to_numpy(dtype='float64') for depth in depths])
+
+    # Every root zone's weights are applied to the same array of values
+    columns = {storage_column(top, bottom): profile_storage(values, depth_weights(top, bottom, method),
+                                                            missing, min_fraction)
+               for top, bottom in root_zones}
+
+    return dataframe.assign(**columns)
@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[1]:
+
+
+# Import necessary libraries
+import os
+import re
+import json
+import shutil
+import hashlib
+import tempfile
+import threading
+import numpy as np
+import pandas as pd
+
+
+# In[2]:
+
+
+# Default location of the processed station snapshots
+default_snapshot_dir = os.path.join(os.path.expanduser('~'), 'earth-analytics', 'data', 'soil-moisture-snapshots')
+
+# Held while a snapshot replaces the previous one, so threads saving the same station take turns
+_replace_lock = threading.Lock()
+
+
+# In[3]:
+
+
+def snapshot_path(snapshot_dir, station_name):
+    """Function that returns the directory a station's snapshot is stored in.
+    Station names are made file-system safe, with a short hash so that
+    different names can never share a directory.
+
+        Parameters
+        ----------
+        snapshot_dir : str
+            Directory containing every station snapshot.
+
+        station_name : str
+            Name of the station.
+
+
+        Returns
+        ------
+        path : str
+            Path to the station's snapshot directory.
+    """
+
+    safe_name = re.sub(r'[^A-Za-z0-9_-]+', '_', station_name).strip('_')
+    name_hash = hashlib.sha256(station_name.encode('utf-8')).hexdigest()[:8]
+
+    return os.path.join(snapshot_dir, safe_name + '-' + name_hash)
+
+
+# In[4]:
+
+
+def save_snapshot(dataframe, path, versions):
+    """Function that saves a dataframe as a columnar binary snapshot: one
+    NumPy .npy file per column plus a meta.json file holding the column
+    types, categories and the versions the snapshot was built from.  The
+    dataframe index is not saved.
+
+        Parameters
+        ----------
+        dataframe : dataframe
+            Dataframe to save.
+
+        path : str
+            Directory to save the snapshot to.  Any existing snapshot is replaced.
+
+        versions : dictionary
+            Versions (e.g. schema and source data versions) the dataframe was
+            built from; load_snapshot only returns the snapshot if they match.
+
+
+        Returns
+        ------
+        No physical return; the snapshot is written to the specified path.
+    """
+
+    # Every call writes to its own directory, so threads saving the same station never share one
+    parent_dir = os.path.dirname(os.path.abspath(path))
+    os.makedirs(parent_dir, exist_ok=True)
+    temp_path = tempfile.mkdtemp(dir=parent_dir, prefix=os.path.basename(path) + '.part-')
+
+    try:
+        _write_columns(dataframe, temp_path, versions)
+    except BaseException:
+        shutil.rmtree(temp_path, ignore_errors=True)
+        raise
+
+    with _replace_lock:
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(temp_path, path)
+
+
+def _write_columns(dataframe, temp_path, versions):
+    columns = []
+
+    for number, column in enumerate(dataframe.columns):
+        values = dataframe[column]
+        column_meta = {'name': column, 'file': 'column' + str(number) + '.npy'}
+
+        if isinstance(values.dtype, np.dtype) and values.dtype.kind in 'biufmM':
+            column_meta['kind'] = 'array'
+            array = values.to_numpy()
+        
+        # Text and categorical columns are saved as integer codes plus their categories
+        else:
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                column_meta['kind'] = 'category'
+            else:
+                column_meta['kind'] = 'text'
+                column_meta['dtype'] = str(values.dtype)
+            categorical = pd.Categorical(values)
+            column_meta['categories'] = categorical.categories.tolist()
+            column_meta['ordered'] = bool(categorical.ordered)
+            array = categorical.codes
+
+        np.save(os.path.join(temp_path, column_meta['file']), array, allow_pickle=False)
+        columns.append(column_meta)
+
+    meta = {'versions': versions, 'rows': len(dataframe), 'columns': columns}
+
+    with open(os.path.join(temp_path, 'meta.json'), 'w') as meta_file:
+        json.dump(meta, meta_file, indent=1)
+
+
+# In[5]:
+
+
+def load_snapshot(path, versions):
+    """Function that loads a dataframe saved with save_snapshot.  Column files
+    are memory-mapped rather than parsed, so loading needs no text processing.
+
+        Parameters
+        ----------
+        path : str
+            Directory the snapshot was saved to.
+
+        versions : dictionary
+            Versions the snapshot must have been built from.
+
+
+        Returns
+        ------
+        dataframe : dataframe or None
+            The saved dataframe, or None if there is no snapshot or it was built
+            from different versions (so it is stale and should be rebuilt).
+    """
+
+    try:
+        with open(os.path.join(path, 'meta.json')) as meta_file:
+            meta = json.load(meta_file)
+    except (OSError, ValueError):
+        return None
+
+    if meta['versions'] != versions:
+        return None
+
+    data = {}
+
+    for column_meta in meta['columns']:
+        array = np.load(os.path.join(path, column_meta['file']), mmap_mode='r', allow_pickle=False)
+
+        if column_meta['kind'] == 'array':
+            data[column_meta['name']] = array
+        else:
+            categorical = pd.Categorical.from_codes(array, column_meta['categories'],
+                                                    ordered=column_meta['ordered'])
+            if column_meta['kind'] == 'category':
+                data[column_meta['name']] = categorical
+            else:
+                data[column_meta['name']] = pd.Series(categorical).astype(column_meta['dtype'])
+
+    dataframe = pd.DataFrame(data, columns=[column_meta['name'] for column_meta in meta['columns']])
+
+    return dataframe
@@ -0,0 +1,337 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[1]:
+
+
+# Import necessary libraries
+import weakref
+import numpy as np
+import pandas as pd
+
+
+# In[2]:
+
+
+# Names of the months and of the periods within a month, in order
+month_names = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+
+period_names = {'decad': ('decad0', 'decad1', 'decad2'),
+                'pentad': ('pentad0', 'pentad1', 'pentad2', 'pentad3', 'pentad4', 'pentad5')}
+
+# Indexes already built, by the id of the station dataframe they belong to
+_station_indexes = {}
+
+
+# In[3]:
+
+
+def _codes(values, categories):
+    if isinstance(values.dtype, pd.CategoricalDtype) and tuple(values.cat.categories) == categories:
+        return values.cat.codes.to_numpy().astype('int64')
+
+    return pd.Categorical(values, categories=categories).codes.astype('int64')
+
+
+class StationIndex:
+    """Index of the rows of one station dataframe by year, month, decad and
+    pentad.  It is built once per station (see station_index) and maps every
+    period that contains data to the range of rows it covers, so a period's
+    rows are found with one lookup instead of comparing whole columns.  Station
+    files are in date order, so each range is a slice of the dataframe; rows
+    out of order are sorted by date once, when the index is built.
+
+        Parameters
+        ----------
+        dataframe : dataframe
+            Input dataframe containing raw soil moisture data.
+
+    """
+
+    def __init__(self, dataframe):
+        self.rows = len(dataframe)
+
+        year, month, day, date_key = _date_columns(dataframe)
+        valid_day = (day >= 1) & (day <= 31)
+        decad = np.where(valid_day, np.minimum((day - 1) // 10, 2), -1)
+        pentad = np.where(valid_day, np.minimum((day - 1) // 5, 5), -1)
+
+        # The date of every row the index was built from, to check it still matches its dataframe
+        self.date_key = date_key
+
+        # Positions of the rows in date order, or None if they already are
+        if np.all(date_key[1:] >= date_key[:-1]):
+            self.order = None
+        else:
+            self.order = np.argsort(date_key, kind='stable')
+            year, month, decad, pentad = year[self.order], month[self.order], decad[self.order], pentad[self.order]
+
+        self.years = np.unique(year[year >= 0])
+
+        # Start and stop row (in date order) of every period, with its key columns
+        self.periods = {'year': self._ranges([year]),
+                        'month': self._ranges([year, month]),
+                        'decad': self._ranges([year, month, decad]),
+                        'pentad': self._ranges([year, month, pentad])}
+
+        # Runs of rows with the same year, month and pentad (including rows with an
+        # invalid day); every period above is made of whole runs
+        self.segments = self._ranges([year, month, pentad], keep_invalid=True)[1]
+
+        self._lookup = {}
+
+    @staticmethod
+    def _ranges(columns, keep_invalid=False):
+        length = len(columns[0])
+
+        if length == 0:
+            empty = np.zeros(0, dtype='int64')
+            return [empty for column in columns], empty, empty
+
+        changes = np.zeros(length, dtype=bool)
+        changes[0] = True
+        for column in columns:
+            changes[1:] |= column[1:] != column[:-1]
+
+        starts = np.flatnonzero(changes)
+        stops = np.append(starts[1:], length)
+
+        # Rows with a missing year belong to no period, and rows with a missing month or an
+        # invalid day to no period below a year
+        valid = np.ones(len(starts), dtype=bool)
+        if not keep_invalid:
+            for column in columns:
+                valid &= column[starts] >= 0
+
+        return [column[starts][valid] for column in columns], starts[valid], stops[valid]
+
+    def record_years(self):
+        """Function that returns every year from the first to the last year with data."""
+
+        if len(self.years) == 0:
+            return []
+
+        return list(range(int(self.years[0]), int(self.years[-1]) + 1))
+
+    def period_index(self, timescale):
+        """Function that returns the index (year, and month and decad or pentad
+        names, where applicable) of every period of a timescale that contains data.
+
+            Parameters
+            ----------
+            timescale : str
+                Timescale of the periods ('year', 'month', 'decad' or 'pentad').
+
+
+            Returns
+            ------
+            index : Index or MultiIndex
+                Index of the periods, in date order.
+        """
+
+        keys, starts, stops = self.periods[timescale]
+
+        if timescale == 'year':
+            return pd.Index(keys[0], name='year')
+
+        arrays = [keys[0], np.asarray(month_names, dtype=object)[keys[1]]]
+        if timescale in period_names:
+            arrays.append(np.asarray(period_names[timescale], dtype=object)[keys[2]])
+
+        return pd.MultiIndex.from_arrays(arrays, names=['year', 'month', timescale][:len(arrays)])
+
+    def positions(self, year, month=None, period=None, timescale=None):
+        """Function that returns the positions of the rows of one period in the
+        station dataframe, for use with dataframe.iloc.
+
+            Parameters
+            ----------
+            year : int
+                Year of the period.
+
+            month : str, optional
+                3-letter month name of the period.
+
+            period : str, optional
+                Decad or pentad name of the period (e.g. 'decad1').
+
+            timescale : str, optional
+                'decad' or 'pentad'; only needed when a period is given.
+
+
+            Returns
+            ------
+            rows : slice or array
+                Slice (or array of positions, if the rows were not in date order)
+                of the period's rows; empty if the period contains no data.
+        """
+
+        if period is not None:
+            timescale = timescale or period.rstrip('0123456789')
+            key = (year, month_names.index(month), period_names[timescale].index(period))
+        elif month is not None:
+            timescale, key = 'month', (year, month_names.index(month))
+        else:
+            timescale, key = 'year', (year,)
+
+        if timescale not in self._lookup:
+            keys, starts, stops = self.periods[timescale]
+            self._lookup[timescale] = dict(zip(zip(*[column.tolist() for column in keys]),
+                                               zip(starts.tolist(), stops.tolist())))
+
+        start, stop = self._lookup[timescale].get(key, (0, 0))
+
+        if self.order is None:
+            return slice(start, stop)
+
+        return self.order[start:stop]
+
+    def period_sums(self, dataframe, timescale, columns, years=None):
+        """Function that returns the number of rows and the number and sum of
+        valid (non-NaN) values of each column for every period of a timescale.
+        The rows are summed by run of days (see segment_sums) and every period
+        is then added up from those sums.
+
+            Parameters
+            ----------
+            dataframe : dataframe
+                Station dataframe the index was built from.
+
+            timescale : str
+                Timescale of the periods ('year', 'month', 'decad' or 'pentad').
+
+            columns : list
+                Columns to sum.
+
+            years : list, optional
+                Years to return.  Defaults to every year with data.
+
+
+            Returns
+            ------
+            index : Index or MultiIndex
+                Index of the periods (see period_index).
+
+            size : array
+                Number of rows of each period.
+
+            count : array
+                Number of valid values of each period (one column per input column).
+
+            total : array
+                Sum of the valid values of each period (one column per input column).
+        """
+
+        keys, starts, stops = self.periods[timescale]
+        index = self.period_index(timescale)
+
+        if years is not None:
+            selected = np.isin(keys[0], list(years))
+            index, starts, stops = index[selected], starts[selected], stops[selected]
+
+        size = stops - starts
+        segment_count, segment_total = self.segment_sums(dataframe, columns)
+
+        if len(starts) == 0:
+            empty = np.zeros((0, len(columns)))
+            return index, size, empty.astype('int64'), empty
+
+        # Each period is added up between its first and last run; the sums between one
+        # period and the next (runs with an invalid day, or other years) are dropped
+        edges = np.searchsorted(self.segments, np.column_stack([starts, stops]).ravel())
+
+        count = np.add.reduceat(segment_count, edges, axis=0)[::2]
+        total = np.add.reduceat(segment_total, edges, axis=0)[::2]
+
+        return index, size, count, total
+
+    def segment_sums(self, dataframe, columns):
+        """Function that returns the number and sum of valid (non-NaN) values of
+        each column for every run of days in the same year, month and pentad.
+        This is the only step that reads the values.  It is done on every call,
+        rather than kept with the index, so that values changed in place (e.g.
+        set to NaN, rescaled or recalculated under the same column name) are
+        always used.
+
+            Parameters
+            ----------
+            dataframe : dataframe
+                Station dataframe the index was built from.
+
+            columns : list
+                Columns to sum.
+
+
+            Returns
+            ------
+            count : array
+                Number of valid values of each run, followed by a row of zeros.
+
+            total : array
+                Sum of the valid values of each run, followed by a row of zeros.
+        """
+
+        values = np.column_stack([dataframe[column].to_numpy(dtype='float64') for column in columns])
+        if self.order is not None:
+            values = values[self.order]
+
+        valid = ~np.isnan(values)
+        values[~valid] = 0.0
+
+        # A final row of zeros lets the last period end after the last run
+        count = np.zeros((len(self.segments) + 1, len(columns)), dtype='int64')
+        total = np.zeros((len(self.segments) + 1, len(columns)))
+        if len(self.segments):
+            count[:-1] = np.add.reduceat(valid, self.segments, axis=0, dtype='int64')
+            total[:-1] = np.add.reduceat(values, self.segments, axis=0)
+
+        return count, total
+
+
+def _date_columns(dataframe):
+    # Year, month code, day and a sortable date key of every row; a missing year is -1 and
+    # a missing month or day is outside its range
+    year = dataframe['year'].to_numpy(dtype='int64', na_value=-1)
+    month = _codes(dataframe['month'], month_names)
+    day = dataframe['day'].to_numpy(dtype='int64', na_value=0)
+
+    # A missing month or day sorts before the first month or day of its year or month
+    return year, month, day, ((year * 13 + month + 1) * 256 + np.clip(day, -128, 127) + 128)
+
+
+# In[4]:
+
+
+def station_index(dataframe):
+    """Function that returns the StationIndex of a station dataframe, building
+    it the first time it is needed.  The index is kept for as long as the
+    dataframe exists, so it is built once per imported station and reused by
+    every function.  It is rebuilt if the dates of the rows have changed
+    (rows added or removed, or the year, month or day of a row edited).
+
+        Parameters
+        ----------
+        dataframe : dataframe
+            Input dataframe containing raw soil moisture data.
+
+
+        Returns
+        ------
+        index : StationIndex
+            Index of the dataframe's rows.
+    """
+
+    key = id(dataframe)
+    index = _station_indexes.get(key)
+
+    if index is not None and index[0]() is dataframe and \
+            np.array_equal(index[1].date_key, _date_columns(dataframe)[3]):
+        return index[1]
+
+    index = StationIndex(dataframe)
+
+    # The index is dropped when its dataframe is deleted, as ids are reused
+    reference = weakref.ref(dataframe, lambda reference, key=key: _station_indexes.pop(key, None))
+    _station_indexes[key] = (reference, index)
+
+    return index
@@ -0,0 +1,380 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[1]:
+
+
+# Import necessary libraries
+import numpy as np
+import pandas as pd
+import customfunctions
+from imports import station_csv_dtypes
+from downloadcache import default_cache
+from instrumentation import instrumented
+
+
+# In[2]:
+
+
+# Number of csv rows read at a time
+default_chunksize = 100000
+
+# Grouping columns of each table kept by a PeriodAccumulator: the periods of each year used by
+# customfunctions.period_mean, and the months and days of the year across all years
+accumulator_keys = {'year': ['year'],
+                    'month': ['year', 'month'],
+                    'decad': ['year', 'month', 'decad'],
+                    'pentad': ['year', 'month', 'pentad'],
+                    'month_of_year': ['month'],
+                    'doy': ['doy']}
+
+
+# In[3]:
+
+
+class PeriodAccumulator:
+    """Running sums of raw soil moisture rows for one station, from which the
+    period means of customfunctions are calculated without keeping the rows.
+    For every period (each year, month, decad and pentad of each year, and each
+    month and day of the year across all years) it keeps the number of rows and
+    the number and sum of valid (non-NaN) values of each depth.  Chunks of rows
+    can be added in any order, and accumulators built from different chunks or
+    files of the same station are combined with merge, so memory only grows with
+    the number of periods, not with the number of rows.
+
+        Parameters
+        ----------
+        depths : list, optional
+            Names of the depth columns.  Defaults to customfunctions.depth_list_all.
+
+    """
+
+    def __init__(self, depths=customfunctions.depth_list_all):
+        self.depths = list(depths)
+        self.rows = 0
+        self.tables = {}
+
+    def add(self, chunk):
+        """Function that adds a chunk of raw rows, with the columns of a station
+        csv file (numeric year, month, day and doy, and a column for each depth)
+        or of a dataframe from imports.csv_to_df.
+
+            Parameters
+            ----------
+            chunk : dataframe
+                Rows to add.
+
+
+            Returns
+            ------
+            accumulator : PeriodAccumulator
+                This accumulator, so calls can be chained.
+        """
+
+        month = chunk['month']
+        if isinstance(month.dtype, pd.CategoricalDtype) or month.dtype == object:
+            month = pd.Categorical(month, categories=customfunctions.month_list_all).codes + 1
+        month = pd.Series(month).to_numpy(dtype='int64', na_value=0)
+        day = chunk['day'].to_numpy(dtype='int64', na_value=0)
+        year = chunk['year'].to_numpy(dtype='int64', na_value=-1)
+        doy = chunk['doy'].to_numpy(dtype='int64', na_value=0)
+        valid_doy = chunk['doy'].notna().to_numpy()
+
+        # Rows with a missing month or an invalid day only count towards the periods above them,
+        # and rows with a missing year only towards the months and days of the year
+        valid_year = year >= 0
+        valid_month = (month >= 1) & (month <= 12)
+        valid_day = valid_month & (day >= 1) & (day <= 31)
+
+        columns = {'year': year, 'month': month,
+                   'decad': np.minimum((day - 1) // 10, 2), 'pentad': np.minimum((day - 1) // 5, 5),
+                   'doy': doy, 'rows': np.ones(len(chunk), dtype='int64')}
+
+        for depth in self.depths:
+            values = chunk[depth].to_numpy(dtype='float64')
+            valid = ~np.isnan(values)
+            columns['count_' + depth] = valid.astype('int64')
+            columns['total_' + depth] = np.where(valid, values, 0.0)
+
+        rows = pd.DataFrame(columns)
+        value_columns = ['rows'] + ['count_' + depth for depth in self.depths] + \
+            ['total_' + depth for depth in self.depths]
+        selections = {'year': valid_year, 'month': valid_year & valid_month, 'decad': valid_year & valid_day,
+                      'pentad': valid_year & valid_day, 'month_of_year': valid_month, 'doy': valid_doy}
+
+        for name, keys in accumulator_keys.items():
+            self._add_table(name, rows.loc[selections[name], keys + value_columns].groupby(keys).sum())
+
+        self.rows += len(chunk)
+
+        return self
+
+    def _add_table(self, name, sums):
+        if name in self.tables:
+            self.tables[name] = self.tables[name].add(sums, fill_value=0)
+        else:
+            self.tables[name] = sums
+
+    def merge(self, other):
+        """Function that combines this accumulator with another one holding other
+        rows of the same station and returns the combined accumulator.
+
+            Parameters
+            ----------
+            other : PeriodAccumulator
+                Accumulator to combine with.
+
+
+            Returns
+            ------
+            accumulator : PeriodAccumulator
+                Combined accumulator; neither input is changed.
+        """
+
+        if other.depths != self.depths:
+            raise ValueError('Only accumulators with the same depths can be merged')
+
+        accumulator = PeriodAccumulator(self.depths)
+        accumulator.rows = self.rows + other.rows
+        accumulator.tables = dict(self.tables)
+
+        for name, sums in other.tables.items():
+            accumulator._add_table(name, sums)
+
+        return accumulator
+
+    def table(self, name):
+        """Function that returns the number of rows and the number of valid and
+        NaN values of each depth for every period of a table.
+
+            Parameters
+            ----------
+            name : str
+                Table name (a key of "accumulator_keys").
+
+
+            Returns
+            ------
+            coverage_df : dataframe
+                Dataframe indexed by period with a "days" column, and a "<depth>_valid"
+                and "<depth>_nan" column for each depth.
+        """
+
+        sums = self._sums(name)
+        coverage_df = pd.DataFrame({'days': sums['rows'].astype('int64')}, index=sums.index)
+
+        for depth in self.depths:
+            coverage_df[depth + '_valid'] = sums['count_' + depth].astype('int64')
+        for depth in self.depths:
+            coverage_df[depth + '_nan'] = (sums['rows'] - sums['count_' + depth]).astype('int64')
+
+        return coverage_df
+
+    def _sums(self, name):
+        keys = accumulator_keys[name]
+        sums = self.tables.get(name)
+
+        if sums is None:
+            index = pd.MultiIndex.from_arrays([[] for key in keys], names=keys)
+            sums = pd.DataFrame(0, index=index, columns=['rows'] + ['count_' + depth for depth in self.depths]
+                                + ['total_' + depth for depth in self.depths])
+
+        sums = sums.sort_index()
+
+        # Month, decad and pentad codes are given their names, as in customfunctions
+        names = {'month': customfunctions.month_list_all, 'decad': customfunctions.decad_list_all,
+                 'pentad': customfunctions.pentad_list_all}
+        offsets = {'month': 1, 'decad': 0, 'pentad': 0}
+        arrays = []
+        for level, key in enumerate(keys):
+            values = sums.index.get_level_values(level).to_numpy().astype('int64')
+            if key in names:
+                arrays.append(np.asarray(names[key], dtype=object)[values - offsets[key]])
+            else:
+                arrays.append(values)
+
+        if len(keys) > 1:
+            sums.index = pd.MultiIndex.from_arrays(arrays, names=keys)
+        else:
+            sums.index = pd.Index(arrays[0], name=keys[0])
+
+        return sums
+
+    def _means(self, sums):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return pd.DataFrame({depth: (sums['total_' + depth] / sums['count_' + depth]).to_numpy()
+                                 for depth in self.depths}, index=sums.index)
+
+    def period_mean(self, timescale, years=None, months=None, min_days=None, max_nan=None, report_missing=False):
+        """Function that calculates mean soil moisture for each depth on a
+        specified timescale from the accumulated sums, with the same coverage
+        rules and output as customfunctions.period_mean.
+
+            Parameters
+            ----------
+            timescale : str
+                Timescale to average over ('year', 'month', 'decad' or 'pentad').
+
+            years : list, optional
+                Years to include.  Defaults to every year from the first to the last
+                year with data.
+
+            months : list, optional
+                3-letter month names to include.  Defaults to "month_list_all".
+
+            min_days : int, optional
+                A period must contain more than this number of rows.  Defaults to the
+                value in customfunctions.timescale_rules.
+
+            max_nan : int, optional
+                A depth is set as NaN when a period contains this many NaN values or
+                more.  Defaults to the value in customfunctions.timescale_rules.
+
+            report_missing : bool, optional
+                Print each period that did not contain enough data.
+
+
+            Returns
+            ------
+            sm_period_mean : dataframe
+                Dataframe indexed by year (and month and period, where applicable)
+                showing mean soil moisture for each depth.
+        """
+
+        group_columns, default_min_days, default_max_nan = customfunctions.timescale_rules[timescale]
+
+        if min_days is None:
+            min_days = default_min_days
+        if max_nan is None:
+            max_nan = default_max_nan
+
+        sums = self._sums(timescale)
+        record_years = self._sums('year').index
+
+        # Every period that should appear in the output, whether or not it contains data
+        if years is None:
+            years = list(range(int(record_years.min()), int(record_years.max()) + 1)) if len(record_years) else []
+        group_lists = {'year': years,
+                       'month': customfunctions.month_list_all if months is None else months,
+                       'decad': customfunctions.decad_list_all,
+                       'pentad': customfunctions.pentad_list_all}
+
+        if len(group_columns) == 1:
+            full_index = pd.Index(group_lists['year'], name='year')
+        else:
+            full_index = pd.MultiIndex.from_product([group_lists[column] for column in group_columns],
+                                                    names=group_columns)
+
+        sums = sums.reindex(full_index, fill_value=0)
+        sm_period_mean = self._means(sums)
+
+        # Ensure each period has enough data and few enough NaN values for an accurate mean
+        for depth in self.depths:
+            usable = (sums['rows'] > min_days) & (sums['rows'] - sums['count_' + depth] < max_nan)
+            sm_period_mean[depth] = sm_period_mean[depth].where(usable)
+
+        if report_missing:
+            for period in full_index[(sums['rows'] <= min_days).to_numpy()]:
+                if timescale == 'year':
+                    print(period, ': This year did not contain enough data and was set as NaN')
+                else:
+                    print(period[1], period[0], *period[2:], ': Did not contain enough data and was set as NaN')
+
+        return sm_period_mean
+
+    def yearly_avg_sm(self):
+        """Function that returns yearly average soil moisture for every year on
+        record, as customfunctions.yearly_avg_sm does."""
+
+        return self.period_mean('year', report_missing=True)
+
+    def monthly_mean_all_years(self):
+        """Function that returns monthly mean soil moisture across all years of
+        data, as customfunctions.monthly_mean_all_years does."""
+
+        sm_month_mean = self._means(self._sums('month_of_year'))
+        sm_month_mean.index.name = 'month'
+
+        return sm_month_mean.reindex(list(customfunctions.month_list_all))
+
+    def daily_avg_all_years(self):
+        """Function that returns average soil moisture for each Julian day of the
+        year across all years of data, as customfunctions.daily_avg_all_years does."""
+
+        return self._means(self._sums('doy'))
+
+
+# In[4]:
+
+
+@instrumented
+def accumulate_csv(path_to_data, depths=customfunctions.depth_list_all, chunksize=default_chunksize,
+                   accumulator=None):
+    """Function that reads a station csv file "chunksize" rows at a time and
+    adds each chunk to a PeriodAccumulator, so the station's period means can
+    be calculated without ever holding all of its rows in memory.
+
+        Parameters
+        ----------
+        path_to_data : str
+            Path to a station csv file.
+
+        depths : list, optional
+            Depth columns to accumulate.  Defaults to customfunctions.depth_list_all.
+
+        chunksize : int, optional
+            Number of rows read at a time.  Defaults to "default_chunksize".
+
+        accumulator : PeriodAccumulator, optional
+            Accumulator to add the rows to (e.g. one holding earlier files of the
+            same station).  A new one is created by default.
+
+
+        Returns
+        ------
+        accumulator : PeriodAccumulator
+            Accumulator holding the file's rows.
+    """
+
+    if accumulator is None:
+        accumulator = PeriodAccumulator(depths)
+
+    columns = ['year', 'month', 'day', 'doy'] + list(accumulator.depths)
+    dtypes = {column: station_csv_dtypes.get(column, 'float32') for column in columns}
+
+    for chunk in pd.read_csv(path_to_data, usecols=columns, dtype=dtypes, chunksize=chunksize):
+        accumulator.add(chunk)
+
+    return accumulator
+
+
+@instrumented
+def accumulate_url(url, depths=customfunctions.depth_list_all, chunksize=default_chunksize, cache=None):
+    """Function that downloads a station csv file into the download cache (see
+    downloadcache.py) and accumulates it in chunks (see accumulate_csv).
+
+        Parameters
+        ----------
+        url : str
+            Url to a station csv file.
+
+        depths : list, optional
+            Depth columns to accumulate.  Defaults to customfunctions.depth_list_all.
+
+        chunksize : int, optional
+            Number of rows read at a time.  Defaults to "default_chunksize".
+
+        cache : DownloadCache, optional
+            Download cache to use.  Defaults to the shared cache in downloadcache.py.
+
+
+        Returns
+        ------
+        accumulator : PeriodAccumulator
+            Accumulator holding the file's rows.
+    """
+
+    if cache is None:
+        cache = default_cache
+
+    return accumulate_csv(cache.get(url), depths, chunksize)